@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Compare building a graph from per-edge callbacks with the bulk adapters.
+
+    python benchmarks/bench_adapters.py [nodes] [edges]
+'''
+import random
+import sys
+import time
+
+from steinlib.adapters import to_igraph, to_networkx, to_scipy_sparse
+from steinlib.arrays import parse_arrays
+from steinlib.instance import SteinlibInstance
+from steinlib.parser import SteinlibParser
+
+
+def random_instance(nodes, edges, seed=0):
+    generator = random.Random(seed)
+    lines = ['33D32945 STP File, STP Format Version 1.0',
+             'SECTION Graph', 'Nodes %d' % nodes, 'Edges %d' % edges]
+    for _ in range(edges):
+        lines.append('E %d %d %d' % (generator.randint(1, nodes),
+                                     generator.randint(1, nodes),
+                                     generator.randint(1, 100)))
+    lines.extend(['END', 'EOF'])
+    return lines
+
+
+class NetworkxCallbackInstance(SteinlibInstance):
+
+    def __init__(self):
+        import networkx
+        self.network = networkx.Graph()
+
+    def graph__e(self, raw_line, tokens):
+        self.network.add_edge(tokens[0], tokens[1], weight=tokens[2])
+
+
+def timed(label, function):
+    start = time.time()
+    function()
+    print('%-32s %8.3fs' % (label, time.time() - start))
+
+
+def main(nodes, edges):
+    lines = random_instance(nodes, edges)
+    print('%d nodes, %d edges' % (nodes, edges))
+
+    timed('callbacks + networkx add_edge',
+          lambda: SteinlibParser(lines, NetworkxCallbackInstance()).parse())
+    timed('parse_arrays', lambda: parse_arrays(lines))
+
+    instance = parse_arrays(lines)
+    for label, adapter in (('to_networkx', to_networkx),
+                           ('to_igraph', to_igraph),
+                           ('to_scipy_sparse', to_scipy_sparse)):
+        try:
+            timed('  ' + label, lambda: adapter(instance))
+        except ImportError as ex:
+            print('  %-30s skipped: %s' % (label, ex))
+
+
+if __name__ == '__main__':
+    arguments = [int(value) for value in sys.argv[1:3]]
+    main(*(arguments + [100000, 500000][len(arguments):]))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+'''
+Compare the transfer of a parsed instance as pickled lists with pickling
+the arrays, in band and with protocol 5 out-of-band buffers: time and peak
+traced memory of a dumps() + loads() round trip, then the time to send the
+instance to another process through a pipe.
+
+    python benchmarks/bench_pickle.py [nodes] [edges]
+'''
+import multiprocessing
+import pickle
+import sys
+import time
+import tracemalloc
+
+from steinlib.generator import generate
+
+
+def as_lists(instance):
+    return dict((name, values.tolist()) for name, values in instance.arrays())
+
+
+def in_band(value, protocol):
+    return pickle.loads(pickle.dumps(value, protocol))
+
+
+def out_of_band(value):
+    buffers = []
+    data = pickle.dumps(value, 5, buffer_callback=buffers.append)
+    return pickle.loads(data, buffers=buffers)
+
+
+def measured(label, function):
+    tracemalloc.start()
+    start = time.time()
+    function()
+    elapsed = time.time() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print('%-34s %8.3fs %10.1f MB' % (label, elapsed, peak / 1e6))
+
+
+def receive(connection):
+    while True:
+        header = connection.recv_bytes()
+        if not header:
+            return
+        count = pickle.loads(header)
+        buffers = [connection.recv_bytes() for _ in range(count)]
+        data = connection.recv_bytes()
+        pickle.loads(data, buffers=buffers)
+        connection.send_bytes(b'ok')
+
+
+def send(connection, value, out_of_band):
+    buffers = []
+    if out_of_band:
+        data = pickle.dumps(value, 5, buffer_callback=buffers.append)
+    else:
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    connection.send_bytes(pickle.dumps(len(buffers)))
+    for buffer in buffers:
+        connection.send_bytes(buffer.raw())
+    connection.send_bytes(data)
+    connection.recv_bytes()
+
+
+def timed(label, function):
+    start = time.time()
+    function()
+    print('%-34s %8.3fs' % (label, time.time() - start))
+
+
+def main(nodes, edges):
+    instance = generate(nodes=nodes, edges=edges, terminals=100,
+                        dimensions=2, seed=0)
+    lists = as_lists(instance)
+    print('%d nodes, %d edges, %.1f MB of arrays' % (
+        nodes, edges,
+        sum(values.nbytes for _, values in instance.arrays()) / 1e6))
+
+    print('%-34s %9s %13s' % ('dumps + loads', 'time', 'peak memory'))
+    measured('lists, protocol 4', lambda: in_band(lists, 4))
+    measured('arrays, protocol 4', lambda: in_band(instance, 4))
+    measured('arrays, protocol 5 in band', lambda: in_band(instance, 5))
+    measured('arrays, protocol 5 out of band',
+             lambda: out_of_band(instance))
+
+    print('\nto another process through a pipe')
+    parent, child = multiprocessing.Pipe()
+    worker = multiprocessing.Process(target=receive, args=(child,))
+    worker.start()
+    try:
+        timed('lists', lambda: send(parent, lists, False))
+        timed('arrays, in band', lambda: send(parent, instance, False))
+        timed('arrays, out of band', lambda: send(parent, instance, True))
+    finally:
+        parent.send_bytes(b'')
+        worker.join()
+
+
+if __name__ == '__main__':
+    arguments = [int(value) for value in sys.argv[1:3]]
+    main(*(arguments + [200000, 2000000][len(arguments):]))
@@ -12,25 +12,25 @@ class MySteinlibInstance(SteinlibInstance):
     """
 
     def comment(self, raw_args, list_args):
-        print "Comment section found"
+        print("Comment section found")
 
     def comment__end(self, raw_args, list_args):
-        print "Comment section end"
+        print("Comment section end")
 
     def coordinates(self, raw_args, list_args):
-        print "Coordinates section found"
+        print("Coordinates section found")
 
     def eof(self, raw_args, list_args):
-        print "End of file found"
+        print("End of file found")
 
     def graph(self, raw_args, list_args):
-        print "Graph section found"
+        print("Graph section found")
 
     def header(self, raw_args, list_args):
-        print "Header found"
+        print("Header found")
 
     def terminals(self, raw_args, list_args):
-        print "Terminals section found"
+        print("Terminals section found")
 
 
 if __name__ == "__main__":
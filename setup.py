@@ -4,8 +4,17 @@ tests_require = [
         'cov-core',
         'mock',
         'nose2',
+        'numpy',
     ]
 
+extras_require = {
+        'arrays': ['numpy'],
+        'arrow': ['numpy', 'pyarrow'],
+        'igraph': ['numpy', 'igraph'],
+        'networkx': ['numpy', 'networkx'],
+        'scipy': ['numpy', 'scipy'],
+    }
+
 setup(name='steinlib',
       version='0.1',
       description='Python bindings for Steinlib format.',
@@ -14,6 +23,11 @@ setup(name='steinlib',
       author_email='leandron85@gmail.com',
       license='MIT',
       packages=['steinlib'],
+      python_requires='>=3.8',
       tests_require=tests_require,
+      extras_require=extras_require,
+      entry_points={
+          'console_scripts': ['steinlib=steinlib.cli:main'],
+      },
       test_suite='nose2.collector.collector',
       zip_safe=False)
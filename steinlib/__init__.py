@@ -1,2 +1,51 @@
+'''
+Python bindings for the SteinLib format.
+
+Importing the package, or the parser modules, only loads the standard
+library. The names below are imported from their modules on first access,
+so that e.g. NumPy is only loaded once an array-backed feature is used.
+'''
+import importlib
+
 __version__ = '0.1'
 __author__ = 'Leandro Nunes'
+
+_LAZY_NAMES = {
+    'SteinlibInstance': 'steinlib.instance',
+    'SteinlibParser': 'steinlib.parser',
+    'SteinlibParsingException': 'steinlib.exceptions',
+    'open_stp': 'steinlib.parser',
+    'CancellationToken': 'steinlib.parser',
+    'ParsingCancelledException': 'steinlib.exceptions',
+    'SteinlibArrays': 'steinlib.arrays',
+    'parse_arrays': 'steinlib.arrays',
+    'parse_arrays_tolerant': 'steinlib.arrays',
+    'write_stp': 'steinlib.writer',
+    'fingerprint': 'steinlib.fingerprint',
+    'find_duplicates': 'steinlib.fingerprint',
+    'InstanceCache': 'steinlib.cache',
+    'Catalog': 'steinlib.catalog',
+    'BatchLoader': 'steinlib.batch',
+    'pack': 'steinlib.batch',
+    'InstanceServer': 'steinlib.server',
+    'InstanceDelta': 'steinlib.delta',
+    'apply_delta': 'steinlib.delta',
+    'FeasibilityChecker': 'steinlib.feasibility',
+    'check_feasibility': 'steinlib.feasibility',
+    'decompose': 'steinlib.decomposition',
+    'InstanceClient': 'steinlib.server',
+}
+
+__all__ = sorted(_LAZY_NAMES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_NAMES:
+        raise AttributeError("module 'steinlib' has no attribute '%s'" % name)
+    value = getattr(importlib.import_module(_LAZY_NAMES[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_NAMES))
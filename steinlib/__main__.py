@@ -0,0 +1,6 @@
+import sys
+
+from steinlib.cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,53 @@
+'''
+Pickling of named arrays, shared by the classes that pickle their arrays
+apart from their metadata (SteinlibArrays, InstanceDelta, GraphBatch).
+
+From protocol 5 on, the arrays travel as PickleBuffer objects, that a
+``buffer_callback`` takes out of band without copies. On loading, the
+arrays are views over the buffers handed back by pickle, and are
+read-only when those buffers are (e.g. ``bytes`` received from a socket).
+'''
+import pickle
+
+import numpy as np
+
+
+def pickled_arrays(arrays, protocol):
+    '''
+    ``(name, array)`` pairs as ``(name, dtype, shape, data)`` for
+    ``__reduce_ex__()``, ``data`` being a PickleBuffer over the
+    (C-contiguous) memory of the array from protocol 5 on, and the array
+    itself before. unpickled_arrays() is the inverse.
+    '''
+    result = []
+    for name, values in arrays:
+        values = np.ascontiguousarray(values)
+        data = values
+        if protocol >= 5 and not values.dtype.hasobject:
+            data = pickle.PickleBuffer(values)
+        result.append((name, values.dtype, values.shape, data))
+    return result
+
+
+def unpickled_arrays(pickled):
+    '''
+    The ``(name, array)`` pairs of pickled_arrays(), as views over the
+    buffers handed back by pickle: read-only when they are.
+    '''
+    result = []
+    for name, dtype, shape, data in pickled:
+        if not isinstance(data, np.ndarray):
+            data = (np.frombuffer(data, dtype=dtype) if len(memoryview(data))
+                    else np.empty(0, dtype=dtype))
+        result.append((name, data.reshape(shape)))
+    return result
+
+
+def unpickle_instance(cls, pickled, metadata, attributes=None):
+    '''
+    ``cls.from_arrays()`` of pickled arrays and metadata, with the extra
+    ``attributes`` set on the result.
+    '''
+    instance = cls.from_arrays(unpickled_arrays(pickled), metadata)
+    instance.__dict__.update(attributes or {})
+    return instance
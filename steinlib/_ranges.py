@@ -0,0 +1,16 @@
+'''
+Vectorized helpers over ranges of positions, shared by the modules that
+gather CSR slices for many rows at once (spatial, pruning).
+'''
+import numpy as np
+
+
+def expand_ranges(starts, counts):
+    '''
+    Concatenation of ``arange(start, start + count)`` for every pair.
+    '''
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total, dtype=np.int64)
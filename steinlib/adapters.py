@@ -0,0 +1,121 @@
+'''
+Conversion of array-backed instances to the usual graph libraries, using
+their bulk constructors. The libraries are optional and imported on first
+use.
+
+Node ids are kept as they are: node ``n`` of the instance is node ``n`` in
+NetworkX, and vertex or row ``n`` in igraph and SciPy, where index 0 is then
+an isolated placeholder since SteinLib ids start at 1 (compacted instances,
+with ids from 0, have none).
+'''
+import numpy as np
+
+from steinlib.arrays import TERMINAL_KIND_NAMES
+
+
+def _import(module, extra):
+    try:
+        return __import__(module)
+    except ImportError:
+        raise ImportError('This conversion needs %s: pip install steinlib[%s]'
+                          % (module, extra))
+
+
+def to_networkx(instance):
+    '''
+    NetworkX graph of ``instance``: a ``Graph`` when it only has edges, a
+    ``DiGraph`` when it has arcs, with undirected edges added both ways.
+
+    Edges carry a ``weight`` attribute, terminals a ``terminal`` attribute
+    (``T``, ``TP`` or ``RootP``) and nodes with coordinates a ``pos`` tuple.
+    '''
+    nx = _import('networkx', 'networkx')
+    directed = instance.num_arcs > 0
+    graph = nx.DiGraph() if directed else nx.Graph()
+    graph.graph.update(instance.comment)
+    graph.add_nodes_from(range(instance.first_id,
+                               instance.first_id + instance.num_nodes))
+
+    edges = instance.edges
+    graph.add_weighted_edges_from(edges.tolist())
+    if directed:
+        undirected = edges[~instance.directed]
+        graph.add_weighted_edges_from(undirected[:, [1, 0, 2]].tolist())
+
+    kinds = np.array(TERMINAL_KIND_NAMES)[instance.terminal_kinds]
+    nx.set_node_attributes(
+        graph, dict(zip(instance.terminals.tolist(), kinds.tolist())),
+        'terminal')
+    nx.set_node_attributes(
+        graph, dict(zip(instance.coordinate_ids.tolist(),
+                        map(tuple, instance.coordinates.tolist()))),
+        'pos')
+    return graph
+
+
+def to_igraph(instance):
+    '''
+    igraph ``Graph`` of ``instance``, directed when it has arcs (undirected
+    edges then go both ways). Edges carry a ``weight`` attribute and
+    vertices a ``terminal`` attribute, ``None`` for non terminals.
+    '''
+    ig = _import('igraph', 'igraph')
+    tails, heads, weights = _directed_triples(instance)
+    graph = ig.Graph(n=instance.id_bound,
+                     edges=np.column_stack((tails, heads)),
+                     directed=instance.num_arcs > 0)
+    graph.es['weight'] = weights
+
+    terminal = np.full(instance.id_bound, None, dtype=object)
+    terminal[instance.terminals] = np.array(
+        TERMINAL_KIND_NAMES, dtype=object)[instance.terminal_kinds]
+    graph.vs['terminal'] = terminal.tolist()
+    return graph
+
+
+def to_scipy_sparse(instance, format='csr'):
+    '''
+    Weighted adjacency matrix of ``instance``, of shape ``(id_bound,
+    id_bound)``. Undirected edges fill both ``[u, v]`` and ``[v, u]``.
+
+    Repeated node pairs are not summed as SciPy would do: the lightest
+    weight is kept.
+    '''
+    _import('scipy', 'scipy')
+    from scipy.sparse import coo_matrix
+
+    tails, heads, weights = _directed_triples(instance)
+    if instance.num_arcs:
+        tails, heads, weights = _lightest(tails, heads, weights)
+    else:
+        tails, heads, weights = _lightest(np.minimum(tails, heads),
+                                          np.maximum(tails, heads), weights)
+        mirrored = tails != heads
+        tails, heads = (np.concatenate((tails, heads[mirrored])),
+                        np.concatenate((heads, tails[mirrored])))
+        weights = np.concatenate((weights, weights[mirrored]))
+    matrix = coo_matrix((weights, (tails, heads)),
+                        shape=(instance.id_bound, instance.id_bound))
+    return matrix.asformat(format)
+
+
+def _directed_triples(instance):
+    '''
+    ``(tails, heads, weights)`` with the undirected edges of a graph with
+    arcs given in both directions.
+    '''
+    edges = instance.edges
+    if not instance.num_arcs:
+        return edges[:, 0], edges[:, 1], edges[:, 2]
+    undirected = edges[~instance.directed]
+    return (np.concatenate((edges[:, 0], undirected[:, 1])),
+            np.concatenate((edges[:, 1], undirected[:, 0])),
+            np.concatenate((edges[:, 2], undirected[:, 2])))
+
+
+def _lightest(tails, heads, weights):
+    order = np.lexsort((weights, heads, tails))
+    tails, heads, weights = tails[order], heads[order], weights[order]
+    first = np.ones(len(tails), dtype=np.bool_)
+    first[1:] = (tails[1:] != tails[:-1]) | (heads[1:] != heads[:-1])
+    return tails[first], heads[first], weights[first]
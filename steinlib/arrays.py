@@ -0,0 +1,661 @@
+from array import array
+import json
+import sys
+
+import numpy as np
+
+from steinlib._pickling import pickled_arrays, unpickle_instance
+from steinlib.budget import as_budget, external_csr, map_spill_file
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.instance import SteinlibInstance
+from steinlib.parser import SteinlibParser
+from steinlib.section import SECTIONS
+
+
+# Terminal kinds, as stored in SteinlibArrays.terminal_kinds.
+TERMINAL = 0
+POTENTIAL_TERMINAL = 1
+ROOT = 2
+TERMINAL_KIND_NAMES = ('T', 'TP', 'RootP')
+
+PRESOLVE_VALUES = ('fixed', 'lower', 'upper', 'time', 'orgnodes', 'orgedges')
+PRESOLVE_RECORDS = {'ea': 4, 'ec': 3, 'ed': 3, 'es': 2}
+
+# Indexes built on first use by SteinlibArrays, and where they are kept.
+_CACHE_ATTRIBUTES = {
+    'csr': '_csr',
+    'edge_index': '_edge_index',
+    'fingerprint_state': '_fingerprint',
+    'point_index': '_point_index',
+    'obstacle_index': '_obstacle_index',
+}
+CACHED_INDEXES = tuple(sorted(_CACHE_ATTRIBUTES))
+
+# Name of the metadata entry of the archives written by to_npz().
+NPZ_METADATA = '__metadata__'
+
+
+class SteinlibArrays(object):
+    '''
+    Array-backed representation of a parsed STP instance.
+
+    Node ids are kept exactly as they appear in the file (SteinLib ids are
+    1-based), so arrays indexed by node id are sized by ``id_bound``.
+
+    Edges and arcs share the ``edges`` table: one ``(tail, head, weight)``
+    row per ``E`` or ``A`` record, in file order, and ``directed`` tells
+    them apart.
+
+    A compacted instance (see compacted()) has dense ids ``0..n-1`` instead,
+    and ``original_ids[i]`` is the id that node ``i`` had in the file. For
+    other instances ``original_ids`` is empty.
+
+    ``extra_records`` holds one table per bulk record of the sections
+    registered with steinlib.section.register_section(), by callback name
+    (e.g. ``node_weights__nw``). Like the presolve data, these tables are
+    kept as they are by compacted().
+
+    With a ``memory_budget`` (see steinlib.budget.MemoryBudget), the CSR
+    adjacency of an instance with more arcs than a budget chunk is built
+    out of core, into memory-mapped temporary files.
+    '''
+    array_fields = (
+        'edges',
+        'directed',
+        'terminals',
+        'terminal_kinds',
+        'coordinate_ids',
+        'coordinates',
+        'obstacles',
+        'maximum_degrees',
+        'original_ids',
+    )
+
+    def __init__(self, num_nodes=None, edges=None, directed=None,
+                 terminals=None, terminal_kinds=None, coordinate_ids=None,
+                 coordinates=None, obstacles=None, maximum_degrees=None,
+                 presolve=None, presolve_records=None, comment=None,
+                 header=None, original_ids=None, extra_records=None,
+                 memory_budget=None):
+        self.edges = _as_table(edges, 3)
+        self.directed = _as_vector(directed, np.bool_, len(self.edges))
+        self.terminals = _as_vector(terminals, np.int64)
+        self.terminal_kinds = _as_vector(terminal_kinds, np.int8,
+                                         len(self.terminals))
+        self.coordinate_ids = _as_vector(coordinate_ids, np.int64)
+        self.coordinates = _as_table(coordinates, 0)
+        self.obstacles = _as_table(obstacles, 4)
+        self.maximum_degrees = _as_vector(maximum_degrees, np.int64)
+        self.original_ids = _as_vector(original_ids, np.int64)
+        self.presolve = dict(presolve or {})
+        self.presolve_records = dict(
+            (name, _as_table((presolve_records or {}).get(name), arity))
+            for name, arity in PRESOLVE_RECORDS.items())
+        self.extra_records = dict(
+            (name, _as_table(values, 0))
+            for name, values in (extra_records or {}).items())
+        self.comment = dict(comment or {})
+        self.header = header
+        self.num_nodes = (int(num_nodes) if num_nodes is not None
+                          else self._max_node_id())
+        self.memory_budget = as_budget(memory_budget)
+        self._csr = None
+        self._edge_index = None
+        self._point_index = None
+        self._obstacle_index = None
+        self._fingerprint = None
+
+    @property
+    def num_edges(self):
+        return int(len(self.edges) - self.directed.sum())
+
+    @property
+    def num_arcs(self):
+        return int(self.directed.sum())
+
+    @property
+    def weights(self):
+        return self.edges[:, 2]
+
+    @property
+    def id_bound(self):
+        '''
+        Length of arrays indexed directly by node id.
+        '''
+        return max(self.num_nodes + self.first_id, self._max_node_id() + 1)
+
+    @property
+    def compact(self):
+        return len(self.original_ids) > 0
+
+    @property
+    def first_id(self):
+        '''
+        Id of the node of the first ``MD`` record, the ones after it going
+        on in id order: 1 as in SteinLib files, 0 once compacted.
+        '''
+        return 0 if self.compact else 1
+
+    @property
+    def root(self):
+        roots = self.terminals[self.terminal_kinds == ROOT]
+        return int(roots[0]) if len(roots) else None
+
+    def arrays(self):
+        '''
+        All the arrays of this instance, by name. Together with metadata(),
+        this is enough to rebuild the instance with from_arrays().
+        '''
+        result = [(name, getattr(self, name)) for name in self.array_fields]
+        for name in sorted(self.presolve_records):
+            result.append(('presolve_%s' % name, self.presolve_records[name]))
+        for name in sorted(self.extra_records):
+            result.append(('extra_%s' % name, self.extra_records[name]))
+        return result
+
+    def metadata(self):
+        '''
+        The non-array part of this instance, as plain Python values.
+        '''
+        return {
+            'num_nodes': self.num_nodes,
+            'presolve': dict(self.presolve),
+            'comment': dict(self.comment),
+            'header': self.header,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        '''
+        Inverse of arrays() and metadata(). Arrays are used as given, without
+        copies, so views over shared or mapped memory stay views.
+        '''
+        arrays = dict(arrays)
+        records = dict((name, arrays.pop('presolve_%s' % name, None))
+                       for name in PRESOLVE_RECORDS)
+        extra_records = dict((name[len('extra_'):], arrays.pop(name))
+                             for name in list(arrays)
+                             if name.startswith('extra_'))
+        kwargs = dict(metadata)
+        kwargs.update(arrays)
+        return cls(presolve_records=records, extra_records=extra_records,
+                   **kwargs)
+
+    def to_npz(self, path, compressed=True):
+        '''
+        Save arrays() and metadata() into a NumPy ``.npz`` archive, the
+        metadata as a JSON string so that no pickling is needed to load it.
+        '''
+        save = np.savez_compressed if compressed else np.savez
+        arrays = dict(self.arrays())
+        arrays[NPZ_METADATA] = np.array(json.dumps(self.metadata()))
+        save(path, **arrays)
+
+    @classmethod
+    def from_npz(cls, path):
+        '''
+        Load an instance saved with to_npz().
+        '''
+        with np.load(path, allow_pickle=False) as archive:
+            arrays = dict((name, archive[name]) for name in archive.files)
+        metadata = json.loads(str(arrays.pop(NPZ_METADATA)))
+        return cls.from_arrays(arrays, metadata)
+
+    def __reduce_ex__(self, protocol):
+        '''
+        Pickle only arrays() and metadata(): the indexes built on first use
+        are built again on the other side. From protocol 5 on, the arrays
+        travel as PickleBuffer objects, that a ``buffer_callback`` (as used
+        by Dask, or by pickle.dumps()) takes out of band, without copies.
+
+        Arrays loaded from out-of-band buffers are views over them, so they
+        are read-only when the buffers are: apply_delta() with ``in_place``
+        then raises, while without it the changed arrays are new copies.
+        '''
+        return (unpickle_instance,
+                (type(self), pickled_arrays(self.arrays(), protocol),
+                 self.metadata(), {'memory_budget': self.memory_budget}))
+
+    def compacted(self):
+        '''
+        Copy of this instance with the node ids remapped to ``0..n-1``, where
+        ``n`` is the number of distinct ids used by the edges, arcs,
+        terminals and coordinates, in increasing order of the original id.
+        Nodes that none of them mention are dropped.
+
+        The ids in the presolve records are left as they are.
+        '''
+        edges = self.edges
+        count = len(edges)
+        ids = np.concatenate((edges[:, 0], edges[:, 1], self.terminals,
+                              self.coordinate_ids))
+        used_ids, new_ids = np.unique(ids, return_inverse=True)
+        new_ids = new_ids.reshape(-1).astype(np.int64)
+
+        degrees = np.empty(0, dtype=np.int64)
+        if len(self.maximum_degrees):
+            records = used_ids - self.first_id
+            degrees = np.zeros(len(used_ids), dtype=np.int64)
+            known = (records >= 0) & (records < len(self.maximum_degrees))
+            degrees[known] = self.maximum_degrees[records[known]]
+
+        original_ids = (self.original_ids[used_ids] if self.compact
+                        else used_ids)
+        terminals_end = 2 * count + len(self.terminals)
+        return SteinlibArrays(
+            num_nodes=len(used_ids),
+            edges=np.column_stack((new_ids[:count], new_ids[count:2 * count],
+                                   edges[:, 2])),
+            directed=self.directed.copy(),
+            terminals=new_ids[2 * count:terminals_end],
+            terminal_kinds=self.terminal_kinds.copy(),
+            coordinate_ids=new_ids[terminals_end:],
+            coordinates=self.coordinates.copy(),
+            obstacles=self.obstacles.copy(),
+            maximum_degrees=degrees,
+            presolve=self.presolve,
+            presolve_records=self.presolve_records,
+            extra_records=self.extra_records,
+            comment=self.comment,
+            header=self.header,
+            original_ids=original_ids,
+            memory_budget=self.memory_budget)
+
+    def to_original_ids(self, ids):
+        '''
+        Ids as they were in the file. Identity unless compacted.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        return self.original_ids[ids] if self.compact else ids
+
+    def from_original_ids(self, ids):
+        '''
+        Inverse of to_original_ids(), with -1 for ids that are not nodes of
+        this instance. The forward map is a binary search over the sorted
+        ``original_ids``, so it needs no array sized by the largest id.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        if not self.compact:
+            return ids
+        positions = np.searchsorted(self.original_ids, ids)
+        positions = np.minimum(positions, len(self.original_ids) - 1)
+        found = self.original_ids[positions] == ids
+        return np.where(found, positions, -1)
+
+    def csr(self):
+        '''
+        Adjacency in compressed sparse row form, built on first use.
+
+        Returns ``(indptr, indices, edge_ids)``: the neighbours of node ``n``
+        are ``indices[indptr[n]:indptr[n + 1]]`` and ``edge_ids`` points back
+        to the matching rows of ``edges``. Undirected edges appear in both
+        directions, arcs only from tail to head.
+        '''
+        if self._csr is None:
+            self._csr = self._build_csr()
+        return self._csr
+
+    def neighbors(self, node):
+        indptr, indices, _ = self.csr()
+        return indices[indptr[node]:indptr[node + 1]]
+
+    def edge_index(self):
+        '''
+        Hash index over the node pairs of ``edges``, built on first use.
+        See steinlib.index.EdgeIndex.
+        '''
+        if self._edge_index is None:
+            from steinlib.index import EdgeIndex
+            self._edge_index = EdgeIndex(self.edges, self.directed)
+        return self._edge_index
+
+    def fingerprint_state(self):
+        '''
+        Structural fingerprint, as an updatable FingerprintState, computed
+        on first use and kept up to date by steinlib.delta. Its hexdigest()
+        is steinlib.fingerprint.fingerprint() of this instance.
+        '''
+        if self._fingerprint is None:
+            from steinlib.fingerprint import fingerprint_state
+            self._fingerprint = fingerprint_state(self)
+        return self._fingerprint
+
+    def cached_index(self, name):
+        '''
+        The index ``name`` (one of ``CACHED_INDEXES``: the results of the
+        methods of the same name) when it was already built, else None.
+        '''
+        return getattr(self, _CACHE_ATTRIBUTES[name])
+
+    def set_cached_index(self, name, value):
+        '''
+        Use ``value`` as the index ``name`` of this instance, e.g. one
+        updated along with the arrays (see steinlib.delta), or drop it with
+        None so that it is built again on use.
+        '''
+        setattr(self, _CACHE_ATTRIBUTES[name], value)
+
+    def point_index(self):
+        '''
+        Grid index over the ``DD`` coordinates, built on first use.
+        See steinlib.spatial.PointGridIndex.
+        '''
+        if self._point_index is None:
+            from steinlib.spatial import PointGridIndex
+            self._point_index = PointGridIndex(self.coordinate_ids,
+                                               self.coordinates)
+        return self._point_index
+
+    def obstacle_index(self):
+        '''
+        R-tree over the ``RR`` obstacles, built on first use. Query results
+        are rows of ``obstacles``. See steinlib.spatial.RectangleIndex.
+        '''
+        if self._obstacle_index is None:
+            from steinlib.spatial import RectangleIndex, obstacle_boxes
+            self._obstacle_index = RectangleIndex(
+                obstacle_boxes(self.obstacles))
+        return self._obstacle_index
+
+    def distances(self, metric='l2', ids=None, **kwargs):
+        '''
+        Lazy pairwise distances between the ``DD`` points, or only between
+        ``ids`` (e.g. the terminals) when given. Extra arguments go to
+        steinlib.distance.DistanceProvider.
+        '''
+        from steinlib.distance import DistanceProvider
+        coordinates = self.coordinates
+        if ids is None:
+            ids = self.coordinate_ids
+        else:
+            provider = DistanceProvider(self.coordinate_ids, coordinates)
+            coordinates = coordinates[provider.positions(ids)]
+        return DistanceProvider(ids, coordinates, metric, **kwargs)
+
+    def to_shared_memory(self):
+        '''
+        Export into a shared memory block that other processes can attach to
+        without copies. See steinlib.shared.SharedInstanceBlock.
+        '''
+        from steinlib.shared import SharedInstanceBlock
+        return SharedInstanceBlock(self)
+
+    def _build_csr(self):
+        budget = self.memory_budget
+        if budget is not None and \
+                24 * (len(self.edges) + self.num_edges) > budget.chunk_bytes:
+            return external_csr(self.edges, self.directed, self.id_bound,
+                                budget)
+        edge_ids = np.arange(len(self.edges), dtype=np.int64)
+        undirected = edge_ids[~self.directed]
+        tails = np.concatenate((self.edges[:, 0], self.edges[undirected, 1]))
+        heads = np.concatenate((self.edges[:, 1], self.edges[undirected, 0]))
+        edge_ids = np.concatenate((edge_ids, undirected))
+
+        order = np.argsort(tails, kind='stable')
+        counts = np.bincount(tails, minlength=self.id_bound)
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, heads[order], edge_ids[order]
+
+    def _max_node_id(self):
+        candidates = [0]
+        for values in (self.edges[:, :2], self.terminals,
+                       self.coordinate_ids):
+            if values.size:
+                candidates.append(int(values.max()))
+        return max(candidates)
+
+
+class ArraySteinlibInstance(SteinlibInstance):
+    '''
+    Instance that collects the parser callbacks into flat typed buffers
+    instead of Python objects. Call build() after parsing to get the
+    SteinlibArrays result.
+
+    The bulk records of the sections added to the registry (see
+    steinlib.section.register_section()) that this class has no callback
+    for are collected too, into the ``extra_records`` tables.
+
+    With a ``memory_budget`` (a steinlib.budget.MemoryBudget, or a number
+    of bytes), the edge buffers are appended to temporary files whenever
+    they outgrow a budget chunk, and the built instance maps these files
+    read-only instead of holding its edges in memory.
+    '''
+
+    def __init__(self, compact=False, memory_budget=None):
+        self._compact = compact
+        self._budget = as_budget(memory_budget)
+        self._spill_rows = sys.maxsize
+        if self._budget is not None:
+            self._spill_rows = self._budget.chunk_rows(25)
+        self._edges_file = None
+        self._directed_file = None
+        self._spilled_rows = 0
+        self._header = None
+        self._num_nodes = None
+        self._edges = array('q')
+        self._directed = array('b')
+        self._terminals = array('q')
+        self._terminal_kinds = array('b')
+        self._coordinate_ids = array('q')
+        self._coordinates = array('q')
+        self._dimensions = None
+        self._obstacles = array('q')
+        self._maximum_degrees = array('q')
+        self._presolve = {}
+        self._presolve_records = dict(
+            (name, array('q')) for name in PRESOLVE_RECORDS)
+        self._comment = {}
+        self._extra_records = {}
+        for section, record in SECTIONS.bulk_records():
+            name = '%s__%s' % (section.callback_token, record.callback)
+            if getattr(type(self), name, None) is None:
+                buffer = array('q')
+                self._extra_records[name] = (buffer, record.arity)
+                setattr(self, name, _RecordCollector(buffer))
+
+    def header(self, raw_line, tokens):
+        self._header = tokens[0]
+
+    def comment__name(self, raw_line, tokens):
+        self._comment['name'] = tokens[0]
+
+    def comment__creator(self, raw_line, tokens):
+        self._comment['creator'] = tokens[0]
+
+    def comment__remark(self, raw_line, tokens):
+        self._comment['remark'] = tokens[0]
+
+    def comment__problem(self, raw_line, tokens):
+        self._comment['problem'] = tokens[0]
+
+    def graph__nodes(self, raw_line, tokens):
+        self._num_nodes = tokens[0]
+
+    def graph__e(self, raw_line, tokens):
+        self._edges.extend(tokens)
+        self._directed.append(0)
+        if len(self._directed) >= self._spill_rows:
+            self._spill_edges()
+
+    def graph__a(self, raw_line, tokens):
+        self._edges.extend(tokens)
+        self._directed.append(1)
+        if len(self._directed) >= self._spill_rows:
+            self._spill_edges()
+
+    def _spill_edges(self):
+        if self._edges_file is None:
+            self._edges_file = self._budget.spill_file()
+            self._directed_file = self._budget.spill_file()
+        self._budget.write(self._edges_file, self._edges)
+        self._budget.write(self._directed_file, self._directed)
+        self._spilled_rows += len(self._directed)
+        self._edges = array('q')
+        self._directed = array('b')
+
+    def terminals__t(self, raw_line, tokens):
+        self._terminals.append(tokens[0])
+        self._terminal_kinds.append(TERMINAL)
+
+    def terminals__tp(self, raw_line, tokens):
+        self._terminals.append(tokens[0])
+        self._terminal_kinds.append(POTENTIAL_TERMINAL)
+
+    def terminals__rootp(self, raw_line, tokens):
+        self._terminals.append(tokens[0])
+        self._terminal_kinds.append(ROOT)
+
+    def coordinates__dd(self, raw_line, tokens):
+        if not tokens:
+            raise SteinlibParsingException(
+                'Coordinates without a node id: %s' % raw_line)
+        dimensions = len(tokens) - 1
+        if self._dimensions is None:
+            self._dimensions = dimensions
+        elif dimensions != self._dimensions:
+            raise SteinlibParsingException(
+                'Expected %d coordinates but got %d: %s' %
+                (self._dimensions, dimensions, raw_line))
+        self._coordinate_ids.append(tokens[0])
+        self._coordinates.extend(tokens[1:])
+
+    def obstacles__rr(self, raw_line, tokens):
+        self._obstacles.extend(tokens)
+
+    def maximum_degrees__md(self, raw_line, tokens):
+        self._maximum_degrees.append(tokens[0])
+
+    def presolve__fixed(self, raw_line, tokens):
+        self._presolve['fixed'] = tokens[0]
+
+    def presolve__lower(self, raw_line, tokens):
+        self._presolve['lower'] = tokens[0]
+
+    def presolve__upper(self, raw_line, tokens):
+        self._presolve['upper'] = tokens[0]
+
+    def presolve__time(self, raw_line, tokens):
+        self._presolve['time'] = tokens[0]
+
+    def presolve__orgnodes(self, raw_line, tokens):
+        self._presolve['orgnodes'] = tokens[0]
+
+    def presolve__orgedges(self, raw_line, tokens):
+        self._presolve['orgedges'] = tokens[0]
+
+    def presolve__ea(self, raw_line, tokens):
+        self._presolve_records['ea'].extend(tokens)
+
+    def presolve__ec(self, raw_line, tokens):
+        self._presolve_records['ec'].extend(tokens)
+
+    def presolve__ed(self, raw_line, tokens):
+        self._presolve_records['ed'].extend(tokens)
+
+    def presolve__es(self, raw_line, tokens):
+        self._presolve_records['es'].extend(tokens)
+
+    def build(self):
+        '''
+        Wrap the collected buffers into a SteinlibArrays without copying, or
+        compact its node ids when built with ``compact=True``.
+        '''
+        coordinates = None
+        if self._dimensions is not None:
+            coordinates = _frombuffer(self._coordinates).reshape(
+                -1, self._dimensions)
+        records = dict((name, _frombuffer(buffer))
+                       for name, buffer in self._presolve_records.items())
+        if self._edges_file is None:
+            edges = _frombuffer(self._edges)
+            directed = _frombuffer(self._directed).view(np.bool_)
+        else:
+            self._spill_edges()
+            edges = map_spill_file(self._edges_file, np.int64,
+                                   (self._spilled_rows, 3))
+            directed = map_spill_file(self._directed_file, np.bool_,
+                                      (self._spilled_rows,))
+        extra_records = dict(
+            (name, _frombuffer(buffer).reshape(-1, arity))
+            for name, (buffer, arity) in self._extra_records.items()
+            if len(buffer))
+        result = SteinlibArrays(
+            num_nodes=self._num_nodes,
+            edges=edges,
+            directed=directed,
+            terminals=_frombuffer(self._terminals),
+            terminal_kinds=_frombuffer(self._terminal_kinds),
+            coordinate_ids=_frombuffer(self._coordinate_ids),
+            coordinates=coordinates,
+            obstacles=_frombuffer(self._obstacles),
+            maximum_degrees=_frombuffer(self._maximum_degrees),
+            presolve=self._presolve,
+            presolve_records=records,
+            extra_records=extra_records,
+            comment=self._comment,
+            header=self._header,
+            memory_budget=self._budget)
+        return result.compacted() if self._compact else result
+
+
+class _RecordCollector(object):
+    '''
+    Callback appending the values of a record to a buffer.
+    '''
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+
+    def __call__(self, raw_line, tokens):
+        self._buffer.extend(tokens)
+
+
+def parse_arrays(lines, compact=False, memory_budget=None, progress=None,
+                 cancel=None):
+    '''
+    Parse STP lines straight into a SteinlibArrays, within ``memory_budget``
+    when given (see ArraySteinlibInstance). ``progress`` and ``cancel`` are
+    passed to SteinlibParser.
+    '''
+    builder = ArraySteinlibInstance(compact, memory_budget)
+    SteinlibParser(lines, builder, progress=progress, cancel=cancel).parse()
+    return builder.build()
+
+
+def parse_arrays_tolerant(lines, compact=False, memory_budget=None,
+                          progress=None, cancel=None):
+    '''
+    Parse STP lines in tolerant mode. Returns the SteinlibArrays of whatever
+    could be parsed, together with the list of diagnostics.
+    '''
+    builder = ArraySteinlibInstance(compact, memory_budget)
+    parser = SteinlibParser(lines, builder, tolerant=True, progress=progress,
+                            cancel=cancel)
+    parser.parse()
+    return builder.build(), parser.diagnostics
+
+
+def _frombuffer(buffer):
+    dtypes = {'q': np.int64, 'b': np.int8}
+    if not len(buffer):
+        return np.empty(0, dtype=dtypes[buffer.typecode])
+    return np.frombuffer(buffer, dtype=dtypes[buffer.typecode])
+
+
+def _as_vector(values, dtype, size=0):
+    if values is None:
+        return np.zeros(size, dtype=dtype)
+    return np.asarray(values, dtype=dtype).reshape(-1)
+
+
+def _as_table(values, width):
+    if values is None:
+        return np.empty((0, width), dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    if values.ndim == 2:
+        return values
+    if not values.size:
+        return np.empty((0, width), dtype=np.int64)
+    return values.reshape(-1, width)
@@ -0,0 +1,313 @@
+'''
+Batches of many instances for learning pipelines.
+
+pack() lays out a list of SteinlibArrays as one graph, the disjoint union
+used by PyTorch Geometric and similar libraries: nodes and links of all the
+instances are concatenated, node indices being shifted by the offset of
+their instance, and per-graph offsets tell where every instance starts.
+
+BatchLoader loads (from an InstanceCache, or by parsing) many files in
+background threads and yields GraphBatch objects of a bounded size. Only
+NumPy is needed; converting the arrays to tensors is left to the caller.
+'''
+import collections
+import queue
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from steinlib._pickling import pickled_arrays, unpickled_arrays
+from steinlib.arrays import ROOT, parse_arrays
+from steinlib.parser import open_stp
+
+
+_ARRAY_FIELDS = ('node_offsets', 'edge_offsets', 'edge_index', 'edge_weight',
+                 'terminal_mask', 'root_mask')
+
+
+class GraphBatch(object):
+    '''
+    A disjoint union of instances. Nodes are numbered ``0..num_nodes-1``
+    across the batch, instance ``i`` holding nodes
+    ``node_offsets[i]:node_offsets[i+1]``, in the order of their ids in the
+    instance, and links ``edge_offsets[i]:edge_offsets[i+1]``:
+
+     - ``edge_index``: ``(2, num_links)`` tails and heads;
+     - ``edge_weight``: the weight of every link;
+     - ``batch``: the instance of every node;
+     - ``terminal_mask``, ``root_mask``: which nodes are terminals (of any
+       kind) and roots.
+
+    With ``symmetric`` links (the default of pack()), undirected edges are
+    given in both directions, as message passing expects; arcs only in
+    theirs.
+    '''
+
+    def __init__(self, names, node_offsets, edge_offsets, edge_index,
+                 edge_weight, terminal_mask, root_mask):
+        self.names = list(names)
+        self.node_offsets = node_offsets
+        self.edge_offsets = edge_offsets
+        self.edge_index = edge_index
+        self.edge_weight = edge_weight
+        self.terminal_mask = terminal_mask
+        self.root_mask = root_mask
+
+    def __len__(self):
+        return len(self.names)
+
+    def __reduce_ex__(self, protocol):
+        # out-of-band buffers from protocol 5 on, as SteinlibArrays
+        arrays = [(name, getattr(self, name)) for name in _ARRAY_FIELDS]
+        return (_unpickle_batch,
+                (self.names, pickled_arrays(arrays, protocol)))
+
+    @property
+    def num_nodes(self):
+        return int(self.node_offsets[-1])
+
+    @property
+    def num_links(self):
+        return int(self.edge_offsets[-1])
+
+    @property
+    def batch(self):
+        return np.repeat(np.arange(len(self), dtype=np.int64),
+                         np.diff(self.node_offsets))
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in _ARRAY_FIELDS)
+
+    def graph(self, position):
+        '''
+        ``(edge_index, edge_weight, terminal_mask)`` of one instance, with
+        its own node numbering.
+        '''
+        low, high = self.node_offsets[position:position + 2]
+        start, stop = self.edge_offsets[position:position + 2]
+        return (self.edge_index[:, start:stop] - low,
+                self.edge_weight[start:stop], self.terminal_mask[low:high])
+
+    def padded(self):
+        '''
+        The batch as dense arrays with one row per instance, padded to the
+        largest instance:
+
+         - ``edge_index``: ``(graphs, max links, 2)``, local node numbers;
+         - ``edge_weight``: ``(graphs, max links)``;
+         - ``edge_mask``: ``(graphs, max links)``, false on padding;
+         - ``terminal_mask``, ``root_mask``, ``node_mask``:
+           ``(graphs, max nodes)``.
+        '''
+        graphs = len(self)
+        nodes = np.diff(self.node_offsets)
+        links = np.diff(self.edge_offsets)
+        max_nodes = int(nodes.max()) if graphs else 0
+        max_links = int(links.max()) if graphs else 0
+
+        node_rows = self.batch
+        node_columns = np.arange(self.num_nodes) - \
+            np.repeat(self.node_offsets[:-1], nodes)
+        link_rows = np.repeat(np.arange(graphs), links)
+        link_columns = np.arange(self.num_links) - \
+            np.repeat(self.edge_offsets[:-1], links)
+
+        result = {
+            'edge_index': np.zeros((graphs, max_links, 2), dtype=np.int64),
+            'edge_weight': np.zeros((graphs, max_links), dtype=np.int64),
+            'edge_mask': np.zeros((graphs, max_links), dtype=np.bool_),
+            'node_mask': np.zeros((graphs, max_nodes), dtype=np.bool_),
+            'terminal_mask': np.zeros((graphs, max_nodes), dtype=np.bool_),
+            'root_mask': np.zeros((graphs, max_nodes), dtype=np.bool_),
+        }
+        result['edge_index'][link_rows, link_columns] = (
+            self.edge_index - self.node_offsets[:-1][link_rows]).T
+        result['edge_weight'][link_rows, link_columns] = self.edge_weight
+        result['edge_mask'][link_rows, link_columns] = True
+        result['node_mask'][node_rows, node_columns] = True
+        result['terminal_mask'][node_rows, node_columns] = self.terminal_mask
+        result['root_mask'][node_rows, node_columns] = self.root_mask
+        return result
+
+
+def _unpickle_batch(names, pickled):
+    return GraphBatch(names, **dict(unpickled_arrays(pickled)))
+
+
+def num_links(instance, symmetric=True):
+    '''
+    Number of links of ``instance`` in a batch.
+    '''
+    if not symmetric:
+        return len(instance.edges)
+    return len(instance.edges) + instance.num_edges
+
+
+def packed_size(instance, symmetric=True):
+    '''
+    Bytes that ``instance`` takes in a GraphBatch: 24 per link and 2 per
+    node, plus its offsets.
+    '''
+    return 24 * num_links(instance, symmetric) + \
+        2 * (instance.id_bound - instance.first_id) + 16
+
+
+def pack(instances, names=None, symmetric=True):
+    '''
+    GraphBatch of a list of SteinlibArrays. Every node id of an instance
+    (``first_id`` to ``id_bound - 1``, so ids used without being declared
+    too) is a node of the batch.
+    '''
+    instances = list(instances)
+    if names is None:
+        names = range(len(instances))
+    nodes = np.array([instance.id_bound - instance.first_id
+                      for instance in instances], dtype=np.int64)
+    links = np.array([num_links(instance, symmetric)
+                      for instance in instances], dtype=np.int64)
+    node_offsets = np.zeros(len(instances) + 1, dtype=np.int64)
+    edge_offsets = np.zeros(len(instances) + 1, dtype=np.int64)
+    np.cumsum(nodes, out=node_offsets[1:])
+    np.cumsum(links, out=edge_offsets[1:])
+
+    edge_index = np.empty((2, edge_offsets[-1]), dtype=np.int64)
+    edge_weight = np.empty(edge_offsets[-1], dtype=np.int64)
+    terminal_mask = np.zeros(node_offsets[-1], dtype=np.bool_)
+    root_mask = np.zeros(node_offsets[-1], dtype=np.bool_)
+    for position, instance in enumerate(instances):
+        shift = node_offsets[position] - instance.first_id
+        start = edge_offsets[position]
+        edges = np.asarray(instance.edges)
+        middle = start + len(edges)
+        edge_index[:, start:middle] = edges[:, :2].T + shift
+        edge_weight[start:middle] = edges[:, 2]
+        if symmetric:
+            undirected = edges[~np.asarray(instance.directed)]
+            stop = edge_offsets[position + 1]
+            edge_index[0, middle:stop] = undirected[:, 1] + shift
+            edge_index[1, middle:stop] = undirected[:, 0] + shift
+            edge_weight[middle:stop] = undirected[:, 2]
+        terminal_mask[instance.terminals + shift] = True
+        root_mask[instance.terminals[instance.terminal_kinds == ROOT] +
+                  shift] = True
+    return GraphBatch(names, node_offsets, edge_offsets, edge_index,
+                      edge_weight, terminal_mask, root_mask)
+
+
+def _parse_file(path):
+    with open_stp(path) as stp_file:
+        return parse_arrays(stp_file)
+
+
+_DONE = object()
+
+
+class BatchLoader(object):
+    '''
+    Iterable over GraphBatch objects of the instances in ``paths``.
+
+    Instances are loaded by ``workers`` background threads, through
+    ``cache`` (an InstanceCache) when given or with ``load(path)``, parsing
+    the file by default. Parsing is Python code that holds the interpreter
+    lock, so prefetching pays off most with a cache: loading from it is
+    mostly I/O and memory mapping.
+
+    A batch holds at most ``batch_size`` instances, and at most
+    ``max_batch_bytes`` bytes of packed arrays (see packed_size()) unless a
+    single instance is larger. Up to ``prefetch`` packed batches wait in a
+    queue, and the instances of at most one more batch are loaded ahead,
+    which bounds the memory in use to about ``prefetch + 2`` batches.
+
+    With ``shuffle``, every iteration goes through the paths in a new
+    random order, reproducible from ``seed``.
+    '''
+
+    def __init__(self, paths, batch_size=32, max_batch_bytes=None,
+                 cache=None, load=None, workers=4, prefetch=2,
+                 shuffle=False, seed=None, symmetric=True):
+        if batch_size < 1 or workers < 1 or prefetch < 1:
+            raise ValueError('batch_size, workers and prefetch must be '
+                             'positive')
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.max_batch_bytes = max_batch_bytes
+        self.workers = workers
+        self.prefetch = prefetch
+        self.shuffle = shuffle
+        self.symmetric = symmetric
+        self._random = random.Random(seed)
+        if load is None:
+            load = cache.load if cache is not None else _parse_file
+        self._load = load
+
+    def __iter__(self):
+        paths = list(self.paths)
+        if self.shuffle:
+            self._random.shuffle(paths)
+        batches = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce,
+                                    args=(paths, batches, stop))
+        producer.daemon = True
+        producer.start()
+        try:
+            while True:
+                item = batches.get()
+                if item is _DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            producer.join()
+
+    def _produce(self, paths, batches, stop):
+        def put(item):
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.05)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        try:
+            with ThreadPoolExecutor(self.workers) as executor:
+                pending = collections.deque()
+                remaining = iter(paths)
+                names, instances, size = [], [], 0
+                while not stop.is_set():
+                    for path in remaining:
+                        pending.append((path,
+                                        executor.submit(self._load, path)))
+                        if len(pending) >= self.batch_size:
+                            break
+                    if not pending:
+                        break
+                    path, future = pending.popleft()
+                    instance = future.result()
+                    instance_size = packed_size(instance, self.symmetric)
+                    if instances and self.max_batch_bytes is not None and \
+                            size + instance_size > self.max_batch_bytes:
+                        if not put(pack(instances, names, self.symmetric)):
+                            break
+                        names, instances, size = [], [], 0
+                    names.append(path)
+                    instances.append(instance)
+                    size += instance_size
+                    if len(instances) == self.batch_size:
+                        if not put(pack(instances, names, self.symmetric)):
+                            break
+                        names, instances, size = [], [], 0
+                if instances and not stop.is_set():
+                    put(pack(instances, names, self.symmetric))
+                for _, future in pending:
+                    future.cancel()
+        except BaseException as ex:
+            put(ex)
+            return
+        put(_DONE)
@@ -0,0 +1,189 @@
+'''
+Memory-budgeted building of array-backed instances.
+
+With a MemoryBudget, ArraySteinlibInstance spills its edge buffers to
+temporary files once they grow past the budget, and builds the instance
+over memory maps of these files. The CSR adjacency of such an instance is
+then built out of core by external_csr(), so that neither the edges nor the
+arcs need to fit in memory at once.
+'''
+import sys
+import tempfile
+
+import numpy as np
+
+
+class MemoryBudget(object):
+    '''
+    How much memory the bulk data of one instance may use, in bytes, and
+    where to spill the rest (``directory``, the system temporary directory
+    by default).
+
+    A quarter of the limit goes to each in-memory chunk, which leaves room
+    for the temporaries of the vectorized passes over the chunk. Memory
+    indexed by node id (CSR offsets, degree counts) is not limited: it is
+    needed in full.
+
+    The budget also keeps the figures of what happened: the number of
+    spill files and bytes written, and report() adds the peak resident
+    memory of the process.
+    '''
+
+    def __init__(self, limit, directory=None):
+        if limit <= 0:
+            raise ValueError('The memory budget must be positive, got %s' %
+                             limit)
+        self.limit = int(limit)
+        self.directory = directory
+        self.spill_files = 0
+        self.spilled_bytes = 0
+
+    @property
+    def chunk_bytes(self):
+        return max(self.limit // 4, 1 << 12)
+
+    def chunk_rows(self, row_bytes):
+        '''
+        How many rows of ``row_bytes`` bytes fit in one chunk.
+        '''
+        return max(self.chunk_bytes // row_bytes, 1)
+
+    def spill_file(self):
+        '''
+        A new anonymous temporary file, removed once closed and no longer
+        mapped.
+        '''
+        self.spill_files += 1
+        return tempfile.TemporaryFile(dir=self.directory)
+
+    def write(self, spill_file, buffer):
+        '''
+        Append ``buffer`` (an ``array.array`` or a NumPy array) to a spill
+        file.
+        '''
+        buffer.tofile(spill_file)
+        self.spilled_bytes += len(buffer) * buffer.itemsize
+
+    def report(self):
+        return {
+            'limit': self.limit,
+            'spill_files': self.spill_files,
+            'spilled_bytes': self.spilled_bytes,
+            'peak_rss': peak_rss(),
+        }
+
+
+def as_budget(memory_budget):
+    '''
+    ``memory_budget`` as a MemoryBudget: passed through when it is one
+    already, taken as a limit in bytes otherwise. ``None`` stays ``None``.
+    '''
+    if memory_budget is None or isinstance(memory_budget, MemoryBudget):
+        return memory_budget
+    return MemoryBudget(memory_budget)
+
+
+def peak_rss():
+    '''
+    Peak resident memory of this process in bytes, or ``None`` where the
+    ``resource`` module is not available.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def map_spill_file(spill_file, dtype, shape):
+    '''
+    Read-only memory map over a spill file.
+    '''
+    spill_file.flush()
+    if not np.prod(shape):
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(spill_file, dtype=dtype, mode='r', shape=shape)
+
+
+def external_csr(edges, directed, id_bound, budget):
+    '''
+    ``(indptr, indices, edge_ids)`` as SteinlibArrays.csr() computes them,
+    with ``indices`` and ``edge_ids`` in memory-mapped spill files and at
+    most a chunk of arcs in memory.
+
+    This is a distribution sort on the tail of every arc: a first pass
+    counts the arcs of every node, which gives ``indptr``; a second one
+    appends every arc to the spill file of its range of tails, ranges being
+    cut so that each holds about a chunk of arcs; each range is then sorted
+    in memory and copied to its place. The arcs of a node keep their order,
+    so the result is the same as the in-memory stable sort.
+    '''
+    rows = budget.chunk_rows(64)
+    counts = np.zeros(id_bound, dtype=np.int64)
+    for tails, _, _ in _arc_chunks(edges, directed, rows):
+        counts += np.bincount(tails, minlength=id_bound)
+    indptr = np.zeros(id_bound + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    del counts
+    num_arcs = int(indptr[-1])
+
+    cuts = np.searchsorted(indptr, np.arange(rows, num_arcs, rows),
+                           side='right') - 1
+    starts = np.unique(np.concatenate(([0], cuts)))
+    buckets = [budget.spill_file() for _ in starts]
+    try:
+        for tails, heads, edge_ids in _arc_chunks(edges, directed, rows):
+            bucket = np.searchsorted(starts, tails, side='right') - 1
+            order = np.argsort(bucket, kind='stable')
+            records = np.column_stack((tails, heads, edge_ids))[order]
+            bounds = np.searchsorted(bucket[order],
+                                     np.arange(len(starts) + 1))
+            for position, spill_file in enumerate(buckets):
+                low, high = bounds[position], bounds[position + 1]
+                if high > low:
+                    budget.write(spill_file, records[low:high])
+
+        indices_file, edge_ids_file = budget.spill_file(), \
+            budget.spill_file()
+        indices = _writable_map(indices_file, num_arcs)
+        ids = _writable_map(edge_ids_file, num_arcs)
+        for start, spill_file in zip(starts.tolist(), buckets):
+            spill_file.seek(0)
+            records = np.fromfile(spill_file, dtype=np.int64).reshape(-1, 3)
+            records = records[np.argsort(records[:, 0], kind='stable')]
+            offset = indptr[start]
+            indices[offset:offset + len(records)] = records[:, 1]
+            ids[offset:offset + len(records)] = records[:, 2]
+        budget.spilled_bytes += 16 * num_arcs
+    finally:
+        for spill_file in buckets:
+            spill_file.close()
+
+    return (indptr, map_spill_file(indices_file, np.int64, (num_arcs,)),
+            map_spill_file(edge_ids_file, np.int64, (num_arcs,)))
+
+
+def _writable_map(spill_file, size):
+    if not size:
+        return np.empty(0, dtype=np.int64)
+    spill_file.truncate(8 * size)
+    return np.memmap(spill_file, dtype=np.int64, mode='r+', shape=(size,))
+
+
+def _arc_chunks(edges, directed, rows):
+    '''
+    ``(tails, heads, edge_ids)`` chunks of the arcs in the order of the
+    in-memory CSR build: every record as given, then the undirected ones
+    reversed.
+    '''
+    for reverse in (False, True):
+        for start in range(0, len(edges), rows):
+            chunk = np.asarray(edges[start:start + rows])
+            edge_ids = np.arange(start, start + len(chunk), dtype=np.int64)
+            if reverse:
+                undirected = ~np.asarray(directed[start:start + rows])
+                chunk, edge_ids = chunk[undirected], edge_ids[undirected]
+                yield chunk[:, 1], chunk[:, 0], edge_ids
+            else:
+                yield chunk[:, 0], chunk[:, 1], edge_ids
@@ -0,0 +1,218 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays, parse_arrays
+from steinlib.fingerprint import fingerprint
+from steinlib.parser import open_stp
+
+
+class InstanceCache(object):
+    '''
+    On-disk cache of parsed instances, shared between files with the same
+    structure.
+
+    The arrays are stored once per content key, as ``.npy`` files under
+    ``<directory>/<key>/`` that load() maps read-only instead of reading
+    them. The key hashes every array as it is, so files share their arrays
+    only when they hold the same records in the same order: the structural
+    fingerprint ignores the order of the rows and the presolve records. A
+    small index maps every source path, with its mtime and size, to its
+    key, its fingerprint and its own metadata (comments and presolve values
+    may differ between duplicates).
+
+    Deltas (see steinlib.delta) are stored next to the arrays, under
+    ``<key>/deltas/<name>.npz``, as named variants of the instance.
+
+    A cache can be shared between threads: only the index updates are
+    serialized, the files are parsed and the arrays written concurrently.
+    '''
+    INDEX_NAME = 'index.json'
+    DELTAS_NAME = 'deltas'
+
+    def __init__(self, directory, parse=parse_arrays, mmap=True):
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        self._parse = parse
+        self._mmap = mmap
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._index = self._read_index()
+
+    def __contains__(self, path):
+        return self._entry(path) is not None
+
+    def fingerprint(self, path):
+        '''
+        Fingerprint of the instance in ``path``, parsing it on a miss.
+        '''
+        return self._loaded_entry(path)['fingerprint']
+
+    def load(self, path):
+        '''
+        The SteinlibArrays of ``path``, from the cache when the file did not
+        change, parsed (and cached) otherwise.
+        '''
+        entry = self._entry(path)
+        with self._lock:
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if entry is not None:
+            return self._load_arrays(entry['key'], entry['metadata'])
+
+        with open_stp(path) as stp_file:
+            instance = self._parse(stp_file)
+        self.store(path, instance)
+        return instance
+
+    def store(self, path, instance):
+        '''
+        Cache ``instance`` as the parse result of ``path``, and return its
+        fingerprint. The arrays are only written when no instance with the
+        same content is cached.
+        '''
+        structure = fingerprint(instance)
+        key = content_key(instance)
+        target = os.path.join(self.directory, key)
+        if not os.path.isdir(target):
+            staging = tempfile.mkdtemp(dir=self.directory)
+            for name, values in instance.arrays():
+                np.save(os.path.join(staging, name + '.npy'), values)
+            try:
+                os.rename(staging, target)
+            except OSError:
+                # stored in the meantime by someone else
+                _remove_tree(staging)
+
+        stat = os.stat(path)
+        with self._lock:
+            self._index[os.path.abspath(path)] = {
+                'mtime': stat.st_mtime,
+                'size': stat.st_size,
+                'fingerprint': structure,
+                'key': key,
+                'metadata': instance.metadata(),
+            }
+            self._write_index()
+        return structure
+
+    def store_delta(self, path, name, delta):
+        '''
+        Save ``delta`` as variant ``name`` of the instance of ``path``, next
+        to its cached arrays. Its ``base`` is set to their fingerprint.
+        '''
+        structure = self.fingerprint(path)
+        if delta.base not in (None, structure):
+            raise ValueError('The delta applies to instance %s, not %s' %
+                             (delta.base, structure))
+        target = self._delta_path(self._loaded_entry(path)['key'], name)
+        delta.base = structure
+        directory = os.path.dirname(target)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        handle, staging = tempfile.mkstemp(dir=directory, suffix='.npz')
+        with os.fdopen(handle, 'wb') as delta_file:
+            delta.to_npz(delta_file)
+        os.replace(staging, target)
+
+    def load_delta(self, path, name):
+        from steinlib.delta import InstanceDelta
+        return InstanceDelta.from_npz(
+            self._delta_path(self._loaded_entry(path)['key'], name))
+
+    def deltas(self, path):
+        '''
+        Names of the variants of the instance of ``path``.
+        '''
+        directory = os.path.join(self.directory,
+                                 self._loaded_entry(path)['key'],
+                                 self.DELTAS_NAME)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(name[:-len('.npz')] for name in os.listdir(directory)
+                      if name.endswith('.npz') and not name.startswith('tmp'))
+
+    def load_variant(self, path, name):
+        '''
+        The instance of ``path`` with its delta ``name`` applied, as a copy
+        that shares the unchanged (mapped) arrays with the base.
+        '''
+        from steinlib.delta import apply_delta
+        return apply_delta(self.load(path), self.load_delta(path, name))
+
+    def _delta_path(self, key, name):
+        if not name or os.sep in name or name.startswith('.'):
+            raise ValueError('Invalid delta name: %r' % name)
+        return os.path.join(self.directory, key, self.DELTAS_NAME,
+                            name + '.npz')
+
+    def _loaded_entry(self, path):
+        entry = self._entry(path)
+        if entry is None:
+            self.load(path)
+            entry = self._entry(path)
+        return entry
+
+    def _entry(self, path):
+        with self._lock:
+            entry = self._index.get(os.path.abspath(path))
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if entry['mtime'] != stat.st_mtime or entry['size'] != stat.st_size \
+                or 'key' not in entry:
+            return None
+        return entry
+
+    def _load_arrays(self, key, metadata):
+        directory = os.path.join(self.directory, key)
+        arrays = []
+        for name in os.listdir(directory):
+            if not name.endswith('.npy'):
+                continue
+            arrays.append((name[:-len('.npy')], np.load(
+                os.path.join(directory, name),
+                mmap_mode='r' if self._mmap else None)))
+        return SteinlibArrays.from_arrays(arrays, metadata)
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, self.INDEX_NAME)) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _write_index(self):
+        handle, staging = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(handle, 'w') as index_file:
+            json.dump(self._index, index_file)
+        os.replace(staging, os.path.join(self.directory, self.INDEX_NAME))
+
+
+def content_key(instance):
+    '''
+    Hash of every array of ``instance`` as it is, rows order included:
+    equal keys mean that the arrays can be shared.
+    '''
+    digest = hashlib.sha256()
+    for name, values in instance.arrays():
+        values = np.ascontiguousarray(values)
+        header = '%s %s %r\n' % (name, values.dtype.str, values.shape)
+        digest.update(header.encode('ascii'))
+        if values.size:
+            digest.update(values.reshape(-1).view(np.uint8))
+    return digest.hexdigest()
+
+
+def _remove_tree(directory):
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    os.rmdir(directory)
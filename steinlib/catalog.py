@@ -0,0 +1,250 @@
+import fnmatch
+import hashlib
+import os
+import sqlite3
+
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.instance import SteinlibInstance
+from steinlib.parser import SteinlibParser, open_stp
+from steinlib.section import SECTIONS
+
+COLUMNS = (
+    ('path', 'TEXT PRIMARY KEY'),
+    ('mtime', 'REAL'),
+    ('size', 'INTEGER'),
+    ('sha1', 'TEXT'),
+    ('name', 'TEXT'),
+    ('problem', 'TEXT'),
+    ('creator', 'TEXT'),
+    ('remark', 'TEXT'),
+    ('nodes', 'INTEGER'),
+    ('edges', 'INTEGER'),
+    ('arcs', 'INTEGER'),
+    ('terminals', 'INTEGER'),
+    ('lower', 'INTEGER'),
+    ('upper', 'INTEGER'),
+    ('error', 'TEXT'),
+)
+
+INDEXED_COLUMNS = ('nodes', 'edges', 'arcs', 'terminals', 'sha1')
+
+
+class MetadataInstance(SteinlibInstance):
+    '''
+    Collects only the small values of an instance: the declared counts, the
+    Comment section fields and the Presolve bounds.
+    '''
+
+    def __init__(self):
+        self.values = {}
+
+    def comment__name(self, raw_line, tokens):
+        self.values['name'] = tokens[0]
+
+    def comment__problem(self, raw_line, tokens):
+        self.values['problem'] = tokens[0]
+
+    def comment__creator(self, raw_line, tokens):
+        self.values['creator'] = tokens[0]
+
+    def comment__remark(self, raw_line, tokens):
+        self.values['remark'] = tokens[0]
+
+    def graph__nodes(self, raw_line, tokens):
+        self.values['nodes'] = tokens[0]
+
+    def graph__edges(self, raw_line, tokens):
+        self.values['edges'] = tokens[0]
+
+    def graph__arcs(self, raw_line, tokens):
+        self.values['arcs'] = tokens[0]
+
+    def terminals__terminals(self, raw_line, tokens):
+        self.values['terminals'] = tokens[0]
+
+    def presolve__lower(self, raw_line, tokens):
+        self.values['lower'] = tokens[0]
+
+    def presolve__upper(self, raw_line, tokens):
+        self.values['upper'] = tokens[0]
+
+
+def read_metadata(lines):
+    '''
+    Parse the metadata of an instance, skipping the bulk records.
+
+    Bulk lines are recognized by their first word and only counted, so the
+    regular expressions run for the few header-like lines only. The counts
+    stand in for the ``Nodes``/``Edges``/``Arcs``/``Terminals`` values that
+    are not declared in the file. The bulk records are the ones declared
+    as such in the section registry.
+    '''
+    bulk_keywords = SECTIONS.bulk_keywords()
+    counts = dict((keyword, 0) for keywords in bulk_keywords.values()
+                  for keyword in keywords)
+    instance = MetadataInstance()
+    SteinlibParser(_skip_bulk_records(lines, bulk_keywords, counts),
+                   instance).parse()
+
+    values = instance.values
+    values.setdefault('edges', counts['e'])
+    values.setdefault('arcs', counts['a'])
+    values.setdefault('terminals',
+                      counts['t'] + counts['tp'] + counts['rootp'])
+    return values
+
+
+def _skip_bulk_records(lines, bulk_keywords, counts):
+    section = None
+    for line in lines:
+        words = line.split(None, 1)
+        if not words:
+            continue
+        keyword = words[0].lower()
+        if section is None:
+            if keyword == 'section' and len(words) > 1:
+                section = words[1].strip().lower()
+        elif keyword == 'end':
+            section = None
+        elif keyword in bulk_keywords.get(section, ()):
+            counts[keyword] += 1
+            continue
+        yield line
+
+
+class Catalog(object):
+    '''
+    SQLite index of the metadata of an instance collection.
+
+    Rows are keyed by path and remember the file mtime, size and SHA-1, so
+    update() only reads the files that changed since the last run and only
+    parses those whose content changed. Files that cannot be parsed are kept
+    with the error message in the ``error`` column.
+
+    Selecting instances is then a plain SQL query, e.g. all the instances
+    with more than a million edges and less than a thousand terminals::
+
+        catalog.select('edges > ? AND terminals < ?', (10 ** 6, 1000))
+    '''
+
+    def __init__(self, database=':memory:'):
+        self._connection = sqlite3.connect(database)
+        self._connection.row_factory = sqlite3.Row
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS instances (%s)' %
+                ', '.join('%s %s' % column for column in COLUMNS))
+            for column in INDEXED_COLUMNS:
+                self._connection.execute(
+                    'CREATE INDEX IF NOT EXISTS instances_%s '
+                    'ON instances (%s)' % (column, column))
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM instances').fetchone()[0]
+
+    def update(self, paths):
+        '''
+        Bring the rows of ``paths`` up to date. Returns how many files were
+        ``added``, ``updated``, ``touched`` (same content, new mtime) and
+        ``unchanged``.
+        '''
+        summary = dict.fromkeys(('added', 'updated', 'touched', 'unchanged'),
+                                0)
+        with self._connection:
+            for path in paths:
+                summary[self._update_one(os.path.abspath(path))] += 1
+        return summary
+
+    def update_directory(self, directory, patterns=('*.stp', '*.stp.gz')):
+        '''
+        update() every matching file below ``directory``, and drop the rows
+        of the files that are gone from it. The summary also has the number
+        of ``removed`` rows.
+        '''
+        directory = os.path.abspath(directory)
+        paths = []
+        for root, _, names in os.walk(directory):
+            paths.extend(os.path.join(root, name) for name in sorted(names)
+                         if any(fnmatch.fnmatch(name, pattern)
+                                for pattern in patterns))
+        summary = self.update(paths)
+
+        known = set(paths)
+        prefix = directory.rstrip(os.sep) + os.sep
+        stale = [row[0] for row in self._connection.execute(
+            'SELECT path FROM instances WHERE substr(path, 1, ?) = ?',
+            (len(prefix), prefix)) if row[0] not in known]
+        with self._connection:
+            self._connection.executemany(
+                'DELETE FROM instances WHERE path = ?',
+                [(path,) for path in stale])
+        summary['removed'] = len(stale)
+        return summary
+
+    def select(self, where=None, parameters=(), order_by='path'):
+        '''
+        Rows matching an SQL ``where`` clause, as dictionaries.
+        '''
+        query = 'SELECT * FROM instances'
+        if where:
+            query += ' WHERE %s' % where
+        query += ' ORDER BY %s' % order_by
+        return [dict(row) for row in
+                self._connection.execute(query, parameters)]
+
+    def get(self, path):
+        row = self._connection.execute(
+            'SELECT * FROM instances WHERE path = ?',
+            (os.path.abspath(path),)).fetchone()
+        return dict(row) if row else None
+
+    def _update_one(self, path):
+        stat = os.stat(path)
+        row = self._connection.execute(
+            'SELECT mtime, size, sha1 FROM instances WHERE path = ?',
+            (path,)).fetchone()
+        if row and row['mtime'] == stat.st_mtime and \
+                row['size'] == stat.st_size:
+            return 'unchanged'
+
+        sha1 = _file_sha1(path)
+        if row and row['sha1'] == sha1:
+            self._connection.execute(
+                'UPDATE instances SET mtime = ?, size = ? WHERE path = ?',
+                (stat.st_mtime, stat.st_size, path))
+            return 'touched'
+
+        values = {'path': path, 'mtime': stat.st_mtime,
+                  'size': stat.st_size, 'sha1': sha1}
+        try:
+            with open_stp(path) as stp_file:
+                values.update(read_metadata(stp_file))
+        except (SteinlibParsingException, UnicodeDecodeError, EOFError,
+                OSError) as ex:
+            # OSError covers gzip.BadGzipFile, EOFError truncated archives
+            values['error'] = str(ex) or type(ex).__name__
+
+        names = [name for name, _ in COLUMNS]
+        self._connection.execute(
+            'INSERT OR REPLACE INTO instances (%s) VALUES (%s)' %
+            (', '.join(names), ', '.join('?' * len(names))),
+            [values.get(name) for name in names])
+        return 'updated' if row else 'added'
+
+
+def _file_sha1(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as stp_file:
+        for chunk in iter(lambda: stp_file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,244 @@
+'''
+The ``steinlib`` command line tool.
+
+Every subcommand takes any number of files, processes them in parallel
+with ``--jobs`` and prints one JSON object per file, in the order of the
+arguments (JSON Lines). A file that fails gets an ``error`` member instead
+of its results, and makes the command exit with status 1.
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.parser import open_stp
+
+
+CONVERT_FORMATS = {
+    'stp': '.stp',
+    'stp.gz': '.stp.gz',
+    'npz': '.npz',
+    'parquet': '.parquet',
+    'solution': '.sol',
+}
+
+BENCH_ENGINES = ('callback', 'metadata', 'stats', 'arrays')
+
+# Errors reported for a file instead of stopping the whole run.
+FILE_ERRORS = (SteinlibParsingException, OSError, ValueError, ImportError,
+               UnicodeDecodeError)
+
+
+def stats(path, options):
+    from steinlib.stats import read_stats
+    with open_stp(path) as stp_file:
+        return read_stats(stp_file)
+
+
+def convert(path, options):
+    output = _output_path(path, options['to'], options['output_dir'])
+    if os.path.abspath(output) == os.path.abspath(path):
+        raise ValueError('Converting %s would overwrite it' % path)
+    instance = _load(path)
+
+    if options['to'] == 'npz':
+        instance.to_npz(output)
+    elif options['to'] == 'parquet':
+        from steinlib.columnar import ColumnarWriter
+        with ColumnarWriter(output, 'parquet') as writer:
+            writer.write(instance.comment.get('name') or _stem(path),
+                         instance)
+    else:
+        from steinlib.writer import write_solution, write_stp
+        write = write_solution if options['to'] == 'solution' else write_stp
+        if options['to'] == 'stp.gz':
+            import gzip
+            stream = gzip.open(output, 'wt')
+        else:
+            stream = open(output, 'w')
+        try:
+            with stream:
+                write(instance, stream)
+        except Exception:
+            os.remove(output)
+            raise
+    return {'output': output, 'format': options['to']}
+
+
+def validate(path, options):
+    from steinlib.validation import validate as validate_lines
+    with open_stp(path) as stp_file:
+        return validate_lines(stp_file)
+
+
+def bench(path, options):
+    with open_stp(path) as stp_file:
+        lines = stp_file.readlines()
+    size = sum(len(line) for line in lines)
+    engines = {}
+    for engine in options['engines']:
+        parse = _bench_engine(engine)
+        best = None
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            parse(lines)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        engines[engine] = {
+            'seconds': best,
+            'mb_per_s': size / best / 1e6 if best else None,
+            'lines_per_s': len(lines) / best if best else None,
+        }
+    return {'bytes': size, 'lines': len(lines), 'repeat': options['repeat'],
+            'engines': engines}
+
+
+COMMANDS = {
+    'stats': stats,
+    'convert': convert,
+    'validate': validate,
+    'bench': bench,
+}
+
+
+def _bench_engine(engine):
+    if engine == 'callback':
+        from steinlib.instance import SteinlibInstance
+        from steinlib.parser import SteinlibParser
+        return lambda lines: SteinlibParser(lines, SteinlibInstance()).parse()
+    if engine == 'metadata':
+        from steinlib.catalog import read_metadata
+        return read_metadata
+    if engine == 'stats':
+        from steinlib.stats import read_stats
+        return read_stats
+    from steinlib.arrays import parse_arrays
+    return parse_arrays
+
+
+def _load(path):
+    if path.endswith(CONVERT_FORMATS['solution']):
+        raise ValueError('%s is a solution: the solution format is written '
+                         'only, it has no weights to read an instance from' %
+                         path)
+    if path.endswith('.npz'):
+        from steinlib.arrays import SteinlibArrays
+        return SteinlibArrays.from_npz(path)
+    if path.endswith('.parquet'):
+        from steinlib.columnar import read_instance
+        return read_instance(path)
+    from steinlib.arrays import parse_arrays
+    with open_stp(path) as stp_file:
+        return parse_arrays(stp_file)
+
+
+def _stem(path):
+    name = os.path.basename(path)
+    if name.endswith('.gz'):
+        name = name[:-len('.gz')]
+    return os.path.splitext(name)[0]
+
+
+def _output_path(path, format, output_dir):
+    directory = output_dir if output_dir is not None else \
+        os.path.dirname(path)
+    return os.path.join(directory, _stem(path) + CONVERT_FORMATS[format])
+
+
+def run_file(task):
+    '''
+    Run one subcommand on one file: ``task`` is ``(command, path,
+    options)``. Returns the JSON-ready result, with the path, the elapsed
+    time and either the results or an ``error``.
+    '''
+    command, path, options = task
+    start = time.perf_counter()
+    result = {'path': path}
+    try:
+        result.update(COMMANDS[command](path, options))
+    except FILE_ERRORS as ex:
+        result['error'] = str(ex)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def run(command, paths, options, jobs=1):
+    '''
+    Yield run_file() for every path, in order, with ``jobs`` worker
+    processes (one per CPU when 0).
+    '''
+    tasks = [(command, path, options) for path in paths]
+    if jobs == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield run_file(task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs or None) as executor:
+        for result in executor.map(run_file, tasks):
+            yield result
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='steinlib',
+        description='Inspect, convert, validate and benchmark SteinLib STP '
+                    'files. Prints one JSON object per file.')
+    commands = parser.add_subparsers(dest='command', metavar='command')
+    commands.required = True
+
+    def add_command(name, help):
+        command = commands.add_parser(name, help=help, description=help)
+        command.add_argument('paths', nargs='+', metavar='file')
+        command.add_argument('-j', '--jobs', type=int, default=1,
+                             help='worker processes, 0 for one per CPU '
+                                  '(default: 1)')
+        return command
+
+    add_command('stats', 'counts, degree distribution and weight histogram, '
+                         'in one streaming pass')
+
+    convert_command = add_command('convert', 'convert STP (or .stp.gz, .npz, '
+                                             '.parquet) files to another '
+                                             'format')
+    convert_command.add_argument('-t', '--to', required=True,
+                                 choices=sorted(CONVERT_FORMATS),
+                                 help='output format; solution writes the '
+                                      'DIMACS Finalsolution of inputs that '
+                                      'hold a solution tree, and is not '
+                                      'read back')
+    convert_command.add_argument('-o', '--output-dir',
+                                 help='where to write the converted files '
+                                      '(default: next to each input)')
+
+    add_command('validate', 'report parse errors and inconsistencies')
+
+    bench_command = add_command('bench', 'time the parsing engines')
+    bench_command.add_argument('-e', '--engine', action='append',
+                               choices=BENCH_ENGINES, dest='engines',
+                               help='engine to time, repeatable (default: '
+                                    'all)')
+    bench_command.add_argument('-r', '--repeat', type=int, default=3,
+                               help='runs per engine, the best one is kept '
+                                    '(default: 3)')
+    return parser
+
+
+def main(argv=None):
+    arguments = _parser().parse_args(argv)
+    options = dict(vars(arguments))
+    command = options.pop('command')
+    paths = options.pop('paths')
+    jobs = options.pop('jobs')
+    if command == 'bench':
+        options['engines'] = options['engines'] or list(BENCH_ENGINES)
+
+    status = 0
+    for result in run(command, paths, options, jobs):
+        if 'error' in result or result.get('valid') is False:
+            status = 1
+        sys.stdout.write(json.dumps(result, sort_keys=True) + '\n')
+        sys.stdout.flush()
+    return status
@@ -0,0 +1,137 @@
+'''
+Reading many instances out of one stream: concatenated STP files, or tar
+archives (compressed or not) of STP files. Everything is read sequentially
+and nothing is extracted to disk.
+'''
+import fnmatch
+import gzip
+import io
+import tarfile
+
+from steinlib.arrays import parse_arrays
+
+
+HEADER_MAGIC = '33D32945'
+
+
+def iter_concatenated(lines, parse=parse_arrays):
+    '''
+    Split a stream of concatenated STP instances at each header line and
+    yield ``parse(instance_lines)`` for every instance, in order.
+
+    Lines are handed to ``parse`` as they are read, so only one instance is
+    alive at a time. Anything before the first header goes to the first
+    instance, which lets the parser report it.
+    '''
+    stream = _PushbackIterator(lines)
+    while stream.has_more():
+        yield parse(_instance_lines(stream))
+
+
+def _instance_lines(stream):
+    first = True
+    for line in stream:
+        if not first and _is_header(line):
+            stream.push_back(line)
+            return
+        if _is_header(line):
+            first = False
+        yield line
+
+
+def _is_header(line):
+    return line.lstrip()[:len(HEADER_MAGIC)].upper() == HEADER_MAGIC
+
+
+class _PushbackIterator(object):
+
+    def __init__(self, lines):
+        self._lines = iter(lines)
+        self._pending = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._pending:
+            return self._pending.pop()
+        return next(self._lines)
+
+    next = __next__
+
+    def push_back(self, line):
+        self._pending.append(line)
+
+    def has_more(self):
+        if self._pending:
+            return True
+        for line in self._lines:
+            if line.strip():
+                self._pending.append(line)
+                return True
+        return False
+
+
+def iter_tar_members(archive, pattern='*.stp*'):
+    '''
+    Yield ``(name, data)`` for every regular member of a tar archive whose
+    name matches ``pattern``, with gzip compressed members (``.gz``)
+    already decompressed. ``archive`` is a path or a binary file object;
+    it is read as a stream, so pipes work too.
+    '''
+    if isinstance(archive, (str, bytes)):
+        tar = tarfile.open(archive, mode='r|*')
+    else:
+        tar = tarfile.open(fileobj=archive, mode='r|*')
+    with tar:
+        for member in tar:
+            if not member.isfile() or not fnmatch.fnmatch(member.name,
+                                                          pattern):
+                continue
+            data = tar.extractfile(member).read()
+            if member.name.endswith('.gz'):
+                data = gzip.decompress(data)
+            yield member.name, data
+
+
+def parse_member(member, parse=parse_arrays):
+    '''
+    Parse one ``(name, data)`` pair from iter_tar_members() into a list of
+    ``(name, result)``, one per instance in the member. This is a module
+    level function so that it can be handed to a process pool.
+    '''
+    name, data = member
+    lines = io.TextIOWrapper(io.BytesIO(data))
+    return [(name, result) for result in iter_concatenated(lines, parse)]
+
+
+def iter_tar(archive, parse=parse_arrays, pattern='*.stp*', pool=None,
+             chunksize=1):
+    '''
+    Yield ``(member name, result)`` for every instance of a tar archive, in
+    archive order.
+
+    With a ``pool`` (anything with an ``imap`` method, such as
+    ``multiprocessing.Pool``), the members are read here and parsed by the
+    workers; ``parse`` must then be picklable.
+    '''
+    members = iter_tar_members(archive, pattern)
+    if pool is None:
+        results = (parse_member(member, parse) for member in members)
+    else:
+        results = pool.imap(_ParseMember(parse), members, chunksize)
+    for parsed in results:
+        for name, result in parsed:
+            yield name, result
+
+
+class _ParseMember(object):
+    '''
+    Picklable parse_member() with a bound ``parse``.
+    '''
+
+    def __init__(self, parse):
+        self._parse = parse
+
+    def __call__(self, member):
+        return parse_member(member, self._parse)
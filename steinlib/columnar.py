@@ -0,0 +1,286 @@
+import os
+
+import numpy as np
+
+from steinlib.arrays import PRESOLVE_RECORDS, TERMINAL_KIND_NAMES, \
+                            SteinlibArrays
+
+
+FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('The columnar export needs pyarrow: '
+                          'pip install steinlib[arrow]')
+    return pyarrow
+
+
+def to_tables(instance, name=None):
+    '''
+    One Arrow table per section of a SteinlibArrays, by table name:
+
+     - ``instances``: header, comment fields and counts, one row;
+     - ``edges``: ``u``, ``v``, ``w``, ``directed``;
+     - ``terminals``: ``id``, ``kind`` (``T``, ``TP`` or ``RootP``);
+     - ``coordinates``: ``id``, ``x0`` ... ``x<d-1>``;
+     - ``obstacles``: ``x1``, ``y1``, ``x2``, ``y2`` as in the ``RR`` records;
+     - ``maximum_degrees``: ``id``, ``degree``;
+     - ``presolve``: ``name``, ``value`` for the scalar values;
+     - ``presolve_records``: ``kind``, ``c0`` ... ``c3`` for the ``EA``,
+       ``EC``, ``ED`` and ``ES`` records, shorter records padded with nulls.
+
+    Contiguous arrays (terminals, ids, degrees, terminal kinds) are wrapped
+    without copies. Edges, coordinates and obstacles are stored row by row
+    by the parser, so each of their columns costs one copy. When ``name`` is
+    given, every table gets an ``instance`` column with it.
+    '''
+    pa = _import_pyarrow()
+    tables = {}
+
+    tables['instances'] = pa.table({
+        'header': [instance.header],
+        'name': [instance.comment.get('name')],
+        'problem': [instance.comment.get('problem')],
+        'creator': [instance.comment.get('creator')],
+        'remark': [instance.comment.get('remark')],
+        'nodes': pa.array([instance.num_nodes], pa.int64()),
+        'edges': pa.array([instance.num_edges], pa.int64()),
+        'arcs': pa.array([instance.num_arcs], pa.int64()),
+        'terminals': pa.array([len(instance.terminals)], pa.int64()),
+    })
+
+    tables['edges'] = pa.table({
+        'u': _column(pa, instance.edges[:, 0]),
+        'v': _column(pa, instance.edges[:, 1]),
+        'w': _column(pa, instance.edges[:, 2]),
+        'directed': pa.array(instance.directed, pa.bool_()),
+    })
+
+    tables['terminals'] = pa.table({
+        'id': _column(pa, instance.terminals),
+        'kind': pa.DictionaryArray.from_arrays(
+            _column(pa, instance.terminal_kinds),
+            pa.array(TERMINAL_KIND_NAMES)),
+    })
+
+    coordinates = {'id': _column(pa, instance.coordinate_ids)}
+    for dimension in range(instance.coordinates.shape[1]):
+        coordinates['x%d' % dimension] = _column(
+            pa, instance.coordinates[:, dimension])
+    tables['coordinates'] = pa.table(coordinates)
+
+    tables['obstacles'] = pa.table(dict(
+        (column, _column(pa, instance.obstacles[:, position]))
+        for position, column in enumerate(('x1', 'y1', 'x2', 'y2'))))
+
+    tables['maximum_degrees'] = pa.table({
+        'id': pa.array(np.arange(instance.first_id, instance.first_id +
+                                 len(instance.maximum_degrees))),
+        'degree': _column(pa, instance.maximum_degrees),
+    })
+
+    names = sorted(instance.presolve)
+    tables['presolve'] = pa.table({
+        'name': pa.array(names, pa.string()),
+        'value': pa.array([instance.presolve[key] for key in names],
+                          pa.int64()),
+    })
+
+    tables['presolve_records'] = _presolve_records(pa, instance)
+
+    if name is not None:
+        for key, table in tables.items():
+            tables[key] = table.append_column(
+                'instance', pa.array([name] * table.num_rows, pa.string()))
+    return tables
+
+
+def _presolve_records(pa, instance):
+    width = max(PRESOLVE_RECORDS.values())
+    kinds = []
+    columns = [[] for _ in range(width)]
+    for kind in sorted(PRESOLVE_RECORDS):
+        records = instance.presolve_records[kind]
+        kinds.append(np.full(len(records), kind.upper(), dtype=object))
+        for position in range(width):
+            if position < records.shape[1]:
+                columns[position].append(
+                    pa.array(records[:, position], pa.int64()))
+            else:
+                columns[position].append(
+                    pa.nulls(len(records), pa.int64()))
+    table = {'kind': pa.array(np.concatenate(kinds), pa.string())}
+    for position, chunks in enumerate(columns):
+        table['c%d' % position] = pa.chunked_array(chunks, pa.int64())
+    return pa.table(table)
+
+
+def _column(pa, values):
+    if values.flags.c_contiguous:
+        return pa.array(values)
+    return pa.array(np.ascontiguousarray(values))
+
+
+class ColumnarWriter(object):
+    '''
+    Write many instances as one dataset, with a directory per table and
+    every row tagged with its instance name::
+
+        root/edges/part-00000.parquet
+        root/edges/part-00001.parquet
+        root/terminals/part-00000.parquet
+        ...
+
+    Tables are buffered and flushed to a new part once ``batch_rows`` rows of
+    a table are pending, so small instances do not end up one file each.
+    Each table directory reads back as a single ``pyarrow.dataset``.
+    '''
+
+    def __init__(self, root, format='parquet', batch_rows=1 << 20):
+        if format not in FORMATS:
+            raise ValueError('Unknown format "%s". Known formats: %s.' %
+                             (format, ', '.join(sorted(FORMATS))))
+        self._pa = _import_pyarrow()
+        self.root = root
+        self.format = format
+        self.batch_rows = batch_rows
+        self._pending = {}
+        self._pending_rows = {}
+        self._parts = {}
+
+    def write(self, name, instance):
+        for table_name, table in to_tables(instance, name).items():
+            self._pending.setdefault(table_name, []).append(table)
+            self._pending_rows[table_name] = (
+                self._pending_rows.get(table_name, 0) + table.num_rows)
+            if self._pending_rows[table_name] >= self.batch_rows:
+                self._flush(table_name)
+
+    def close(self):
+        for table_name in sorted(self._pending):
+            self._flush(table_name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _flush(self, table_name):
+        tables = self._pending.pop(table_name, None)
+        self._pending_rows.pop(table_name, None)
+        if not tables:
+            return
+        table = self._pa.concat_tables(tables, promote_options='default')
+
+        directory = os.path.join(self.root, table_name)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        part = self._parts.get(table_name, 0)
+        self._parts[table_name] = part + 1
+        path = os.path.join(directory,
+                            'part-%05d%s' % (part, FORMATS[self.format]))
+        if self.format == 'parquet':
+            self._pa.parquet.write_table(table, path)
+        else:
+            self._pa.feather.write_feather(table, path)
+
+
+def read_table(root, table_name, format='parquet'):
+    '''
+    Read back one table of a dataset written by ColumnarWriter.
+    '''
+    _import_pyarrow()
+    import pyarrow.dataset
+    return pyarrow.dataset.dataset(
+        os.path.join(root, table_name),
+        format='feather' if format == 'arrow' else format).to_table()
+
+
+def read_instance(root, name=None, format='parquet'):
+    '''
+    Read back one instance of a dataset written by ColumnarWriter as a
+    SteinlibArrays: the one called ``name``, or the only one of the dataset
+    when ``name`` is not given.
+
+    The tables hold what the STP file declares, so original ids of compacted
+    instances and records of sections registered by the application are
+    not restored.
+    '''
+    pa = _import_pyarrow()
+    import pyarrow.compute
+
+    instances = read_table(root, 'instances', format)
+    names = instances.column('instance').to_pylist()
+    if name is None:
+        if len(names) != 1:
+            raise ValueError('%s holds %d instances: pick one by name' %
+                             (root, len(names)))
+        name = names[0]
+    elif name not in names:
+        raise ValueError('No instance "%s" in %s' % (name, root))
+
+    def table(table_name):
+        values = read_table(root, table_name, format)
+        return values.filter(pyarrow.compute.equal(
+            values.column('instance'), pa.scalar(name, pa.string())))
+
+    def column(values, column_name):
+        return values.column(column_name).to_numpy()
+
+    row = table('instances').to_pylist()[0]
+    edges = table('edges')
+    terminals = table('terminals')
+    kind_names = np.array(
+        terminals.column('kind').cast(pa.string()).to_pylist(), dtype=object)
+    kinds = np.zeros(len(kind_names), dtype=np.int8)
+    for kind, kind_name in enumerate(TERMINAL_KIND_NAMES):
+        kinds[kind_names == kind_name] = kind
+
+    coordinates = table('coordinates')
+    dimensions = sum(1 for column_name in coordinates.column_names
+                     if column_name.startswith('x'))
+    coordinate_values = np.empty((coordinates.num_rows, dimensions),
+                                 dtype=np.int64)
+    for dimension in range(dimensions):
+        coordinate_values[:, dimension] = column(coordinates,
+                                                 'x%d' % dimension)
+
+    obstacles = table('obstacles')
+    presolve = table('presolve')
+    records = table('presolve_records')
+    record_kinds = np.array(records.column('kind').to_pylist(), dtype=object)
+    presolve_records = {}
+    for kind, arity in PRESOLVE_RECORDS.items():
+        chosen = np.flatnonzero(record_kinds == kind.upper())
+        presolve_records[kind] = np.column_stack(
+            [column(records, 'c%d' % position)[chosen].astype(np.int64)
+             for position in range(arity)])
+
+    return SteinlibArrays(
+        num_nodes=row['nodes'],
+        edges=np.column_stack((column(edges, 'u'), column(edges, 'v'),
+                               column(edges, 'w'))),
+        directed=column(edges, 'directed'),
+        terminals=column(terminals, 'id'),
+        terminal_kinds=kinds,
+        coordinate_ids=column(coordinates, 'id'),
+        coordinates=coordinate_values,
+        obstacles=np.column_stack([column(obstacles, key) for key in
+                                   ('x1', 'y1', 'x2', 'y2')]),
+        maximum_degrees=column(table('maximum_degrees'), 'degree'),
+        presolve=dict(zip(presolve.column('name').to_pylist(),
+                          presolve.column('value').to_pylist())),
+        presolve_records=presolve_records,
+        comment=dict((key, row[key]) for key in
+                     ('name', 'problem', 'creator', 'remark')
+                     if row[key] is not None),
+        header=row['header'])
@@ -0,0 +1,529 @@
+'''
+Differential conformance checks between the parsing engines.
+
+Every engine parses the same lines, and what it produces is normalized and
+compared with the reference engine of its kind:
+
+ - ``events``: the callbacks called, in order, with their values;
+ - ``arrays``: the arrays and metadata of the built SteinlibArrays;
+ - ``diagnostics``: the problems collected in tolerant mode, and the
+   arrays built from the rest;
+ - ``counts``: the number of edges, arcs and terminals records;
+ - ``declared``: the counts as declared, or counted when not declared.
+
+The reference parser matches the lines of the standard sections with the
+regular expression tables of the hand-written section parsers, frozen here
+(REFERENCE_TOKENS) so that they do not follow changes to the grammar of
+steinlib.section; the other engines are the faster paths. Sections added
+with register_section() have no such table, and are matched with the
+regular expressions of their own grammar.
+When an engine fails, its outcome is the type of the exception and the
+line it points to, so errors are compared too. Engines that skip records
+or checks (``strict=False``, as the statistics and metadata readers) are
+only compared on inputs the reference accepts.
+
+Inputs are a corpus of files, synthetic instances (see steinlib.generator)
+and fuzzed variants of both: mixed case, odd whitespace, missing ``END``,
+trailing data and so on. Run it with::
+
+    python -m steinlib.conformance --synthetic 12 --fuzz 20 instances/*.stp
+'''
+import random
+import re
+import sys
+import time
+
+import numpy as np
+
+from steinlib.arrays import ArraySteinlibInstance, parse_arrays, \
+                            parse_arrays_tolerant
+from steinlib.budget import MemoryBudget
+from steinlib.catalog import read_metadata
+from steinlib.collection import parse_member
+from steinlib.instance import SteinlibInstance
+from steinlib.parser import RootSectionParser, SteinlibParser, open_stp
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.section import SECTIONS, SectionParser
+from steinlib.state import ParsingState
+from steinlib.stats import read_stats
+from steinlib.validation import DeclaringArraySteinlibInstance
+
+
+class RecordingInstance(SteinlibInstance):
+    '''
+    Instance that records every callback as a ``(name, values)`` event.
+    '''
+
+    def __init__(self):
+        self._events = []
+
+    def __getattribute__(self, name):
+        if name.startswith('_') or name == 'events':
+            return object.__getattribute__(self, name)
+        events = object.__getattribute__(self, '_events')
+
+        def record(raw_line, tokens):
+            events.append((name, tuple(tokens)))
+        return record
+
+    def events(self):
+        return self._events
+
+
+_END = r'^END$'
+
+# Regular expressions of the records of the standard sections, as the
+# hand-written section parsers had them: ``(callback token, {callback:
+# regex})`` by section name. ``dd`` is built from the number of values.
+REFERENCE_TOKENS = {
+    'Comment': ('comment', {
+        'name': r'^Name(?:\s+)\"(.+)\"$',
+        'creator': r'^Creator(?:\s+)\"(.+)\"$',
+        'remark': r'^Remark(?:\s+)\"(.+)\"$',
+        'problem': r'^Problem(?:\s+)\"(.+)\"$',
+        'end': _END,
+    }),
+    'Coordinates': ('coordinates', {
+        'dd': None,
+        'end': _END,
+    }),
+    'Graph': ('graph', {
+        'obstacles': r'^Obstacles(?:\s+)(.+)$',
+        'nodes': r'^Nodes\s+(\d+)$',
+        'edges': r'^Edges\s+(\d+)$',
+        'arcs': r'^Arcs\s+(\d+)$',
+        'e': r'^E\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'a': r'^A\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'end': _END,
+    }),
+    'MaximumDegrees': ('maximum_degrees', {
+        'md': r'^MD\s+(\d+)$',
+        'end': _END,
+    }),
+    'Presolve': ('presolve', {
+        'fixed': r'^FIXED\s+(\d+)$',
+        'lower': r'^LOWER\s+(\d+)$',
+        'upper': r'^UPPER\s+(\d+)$',
+        'time': r'^TIME\s+(\d+)$',
+        'orgnodes': r'^ORGNODES\s+(\d+)$',
+        'orgedges': r'^ORGEDGES\s+(\d+)$',
+        'ea': r'^EA\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'ec': r'^EC\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'ed': r'^ED\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'es': r'^ES\s+(\d+)\s+(\d+)$',
+        'end': _END,
+    }),
+    'Obstacles': ('obstacles', {
+        'rr': r'^RR\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$',
+        'end': _END,
+    }),
+    'Terminals': ('terminals', {
+        'terminals': r'^Terminals\s+(\d+)$',
+        'rootp': r'^RootP\s+(\d+)$',
+        't': r'^T\s+(\d+)$',
+        'tp': r'^TP\s+(\d+)$',
+        'end': _END,
+    }),
+}
+
+
+class ReferenceSectionParser(SectionParser):
+    '''
+    Section parser that tries every regular expression of ``tokens`` on a
+    line, as the hand-written parsers did.
+    '''
+    callback_token = None
+    tokens = {}
+
+    @classmethod
+    def parse_token(cls, line, steiner_instance):
+        found = None
+        for name, regex in cls.tokens.items():
+            if regex is None:
+                regex = r'^DD%s$' % (len(line.split()[1:]) * r'\s+(\d+)')
+            matches = re.search(regex, line, re.IGNORECASE)
+            if matches:
+                found = name, matches.groups()
+        if found is None:
+            raise SteinlibParsingException(
+                'Error parsing the following line: %s' % line)
+
+        name, tokens = found
+        callback = getattr(steiner_instance,
+                           '%s__%s' % (cls.callback_token, name))
+        callback(line, [int(token) if token.isdigit() else token
+                        for token in tokens])
+        return (ParsingState.wait_for_section if name == 'end'
+                else ParsingState.inside_section)
+
+
+def reference_parsers():
+    '''
+    Reference section parsers by section name: the frozen tables of
+    REFERENCE_TOKENS for the standard sections, the regular expression
+    converters of the grammar (see steinlib.grammar.Record.compile()) for
+    the other registered sections.
+    '''
+    parsers = SECTIONS.reference_parsers()
+    for name, (callback_token, tokens) in REFERENCE_TOKENS.items():
+        parsers[name] = type('Reference%sSectionParser' % name,
+                             (ReferenceSectionParser,),
+                             {'callback_token': callback_token,
+                              'tokens': tokens})
+    return parsers
+
+
+def reference_parser():
+    '''
+    SteinlibParser subclass that parses the sections with
+    reference_parsers().
+    '''
+    root = type('ReferenceRootSectionParser', (RootSectionParser,),
+                {'section_parsers': reference_parsers()})
+    return type('ReferenceSteinlibParser', (SteinlibParser,),
+                {'root_section_parser': root})
+
+
+class Engine(object):
+    '''
+    A way to parse lines: ``run(lines, reference_parser)`` returns a value
+    of the given ``kind`` that compares equal to the reference engine's.
+    ``strict`` engines must also fail in the same way; ``fuzz`` engines run
+    on the fuzzed inputs too.
+    '''
+
+    def __init__(self, name, kind, run, strict=True, fuzz=True):
+        self.name = name
+        self.kind = kind
+        self.run = run
+        self.strict = strict
+        self.fuzz = fuzz
+
+
+def _events(parser_class):
+    def run(lines, reference):
+        instance = RecordingInstance()
+        (parser_class or reference)(lines, instance).parse()
+        return instance.events()
+    return run
+
+
+def _reference_arrays(lines, reference):
+    builder = ArraySteinlibInstance()
+    reference(lines, builder).parse()
+    return _normalize_arrays(builder.build())
+
+
+def _reference_diagnostics(lines, reference):
+    builder = ArraySteinlibInstance()
+    parser = reference(lines, builder, tolerant=True)
+    parser.parse()
+    return _normalize_tolerant(builder.build(), parser.diagnostics)
+
+
+def _diagnostics(memory_budget=None):
+    def run(lines, reference):
+        return _normalize_tolerant(*parse_arrays_tolerant(
+            lines, memory_budget=memory_budget and
+            MemoryBudget(memory_budget)))
+    return run
+
+
+def _reference_counts(lines, reference):
+    builder = ArraySteinlibInstance()
+    reference(lines, builder).parse()
+    instance = builder.build()
+    return {'edges': instance.num_edges, 'arcs': instance.num_arcs,
+            'terminals': len(instance.terminals)}
+
+
+def _reference_declared(lines, reference):
+    builder = DeclaringArraySteinlibInstance()
+    reference(lines, builder).parse()
+    counts = _reference_counts(lines, reference)
+    counts.update((key, value) for key, value in builder.declared.items()
+                  if key in counts)
+    return counts
+
+
+def _counts(lines, reference):
+    stats = read_stats(lines)
+    return dict((key, stats[key]) for key in ('edges', 'arcs', 'terminals'))
+
+
+def _declared(lines, reference):
+    values = read_metadata(lines)
+    return dict((key, values[key]) for key in ('edges', 'arcs', 'terminals'))
+
+
+def _member(lines, reference):
+    results = parse_member(('member', ''.join(lines).encode('utf-8')))
+    if len(results) != 1:
+        raise ValueError('%d instances found' % len(results))
+    return _normalize_arrays(results[0][1])
+
+
+ENGINES = (
+    Engine('reference', 'events', _events(None)),
+    Engine('compiled', 'events', _events(SteinlibParser)),
+    Engine('reference', 'arrays', _reference_arrays),
+    Engine('arrays', 'arrays',
+           lambda lines, reference: _normalize_arrays(parse_arrays(lines))),
+    Engine('spilled', 'arrays',
+           lambda lines, reference: _normalize_arrays(parse_arrays(
+               lines, memory_budget=MemoryBudget(1 << 12)))),
+    Engine('member', 'arrays', _member, fuzz=False),
+    Engine('reference', 'diagnostics', _reference_diagnostics),
+    Engine('arrays', 'diagnostics', _diagnostics()),
+    Engine('spilled', 'diagnostics', _diagnostics(1 << 12)),
+    Engine('reference', 'counts', _reference_counts),
+    Engine('stats', 'counts', _counts, strict=False),
+    Engine('reference', 'declared', _reference_declared),
+    Engine('metadata', 'declared', _declared, strict=False),
+)
+
+
+def _normalize_arrays(instance):
+    return (instance.metadata(),
+            tuple((name, values.shape, values.dtype.kind,
+                   np.ascontiguousarray(values).tobytes())
+                  for name, values in instance.arrays()))
+
+
+def _normalize_tolerant(instance, diagnostics):
+    return ([(diagnostic.line_number, diagnostic.offset, diagnostic.message)
+             for diagnostic in diagnostics], _normalize_arrays(instance))
+
+
+def _outcome(engine, lines, reference):
+    try:
+        return ('ok', engine.run(lines, reference))
+    except Exception as ex:
+        return ('error', type(ex).__name__, getattr(ex, 'line_number', None))
+
+
+def _summary(outcome, limit=160):
+    text = repr(outcome)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+# Mutations of fuzz(): name and function of (lines, rng).
+
+def _mixed_case(lines, rng):
+    position = _pick(lines, rng)
+    lines[position] = ''.join(
+        character.upper() if rng.random() < 0.5 else character.lower()
+        for character in lines[position])
+
+
+def _odd_whitespace(lines, rng):
+    position = _pick(lines, rng)
+    spaces = (' ', '  ', '\t', ' \t ')
+    words = lines[position].split()
+    lines[position] = rng.choice(spaces + ('',)) + ''.join(
+        word + rng.choice(spaces) for word in words) + '\n'
+
+
+def _missing_end(lines, rng):
+    ends = [position for position, line in enumerate(lines)
+            if line.strip().upper() == 'END']
+    if ends:
+        del lines[rng.choice(ends)]
+
+
+def _trailing_data(lines, rng):
+    if rng.random() < 0.5:
+        lines.append(rng.choice(('E 1 2 3\n', 'garbage\n', 'EOF\n')))
+    else:
+        position = _pick(lines, rng)
+        lines[position] = lines[position].rstrip('\n') + ' 7\n'
+
+
+def _bad_token(lines, rng):
+    position = _pick(lines, rng)
+    words = lines[position].split()
+    if len(words) > 1:
+        words[rng.randrange(1, len(words))] = rng.choice(('x', '-1', '1.5'))
+        lines[position] = ' '.join(words) + '\n'
+
+
+def _drop_line(lines, rng):
+    del lines[_pick(lines, rng)]
+
+
+def _duplicate_line(lines, rng):
+    position = _pick(lines, rng)
+    lines.insert(position, lines[position])
+
+
+def _truncate(lines, rng):
+    del lines[_pick(lines, rng):]
+
+
+MUTATIONS = (
+    ('mixed_case', _mixed_case),
+    ('odd_whitespace', _odd_whitespace),
+    ('missing_end', _missing_end),
+    ('trailing_data', _trailing_data),
+    ('bad_token', _bad_token),
+    ('drop_line', _drop_line),
+    ('duplicate_line', _duplicate_line),
+    ('truncate', _truncate),
+)
+
+
+def _pick(lines, rng):
+    return rng.randrange(len(lines)) if lines else 0
+
+
+def fuzz(lines, rng):
+    '''
+    A random mutation of ``lines``: returns ``(mutation name, lines)``.
+    '''
+    name, mutate = rng.choice(MUTATIONS)
+    mutated = list(lines)
+    if mutated:
+        mutate(mutated, rng)
+    return name, mutated
+
+
+class ConformanceReport(object):
+    '''
+    Result of run(): the ``mismatches`` found (one dictionary each, with the
+    instance, the mutation, the kind, the engine and both outcomes) and the
+    ``throughput`` of every engine on the unmutated inputs, as total
+    ``bytes`` and ``seconds`` by ``(kind, engine name)``.
+    '''
+
+    def __init__(self):
+        self.instances = 0
+        self.fuzzed = 0
+        self.mismatches = []
+        self.throughput = {}
+
+    @property
+    def ok(self):
+        return not self.mismatches
+
+    def format(self):
+        '''
+        The throughput of the engines side by side, relative to the
+        reference of their kind, followed by the mismatches.
+        '''
+        rows = ['%-12s %-12s %10s %8s' % ('kind', 'engine', 'MB/s',
+                                          'speedup')]
+        for (kind, name), (size, seconds) in sorted(
+                self.throughput.items(),
+                key=lambda item: (item[0][0], item[0][1] != 'reference',
+                                  item[0][1])):
+            reference = self.throughput.get((kind, 'reference'))
+            speed = size / seconds / 1e6 if seconds else float('inf')
+            speedup = (reference[1] / seconds
+                       if reference and seconds else float('nan'))
+            rows.append('%-12s %-12s %10.2f %7.2fx' %
+                        (kind, name, speed, speedup))
+        rows.append('%d instances, %d fuzzed inputs, %d mismatches' % (
+            self.instances, self.fuzzed, len(self.mismatches)))
+        for mismatch in self.mismatches:
+            rows.append('%(instance)s [%(mutation)s] %(kind)s/%(engine)s: '
+                        'expected %(expected)s, got %(actual)s' % mismatch)
+        return '\n'.join(rows)
+
+
+def check(lines, engines=ENGINES, fuzzed=False, timings=None):
+    '''
+    Run ``engines`` on ``lines`` and return the mismatches with the
+    reference of each kind, as ``(kind, engine name, expected, actual)``.
+    When given, ``timings[(kind, name)]`` accumulates the seconds spent.
+    '''
+    reference = reference_parser()
+    expected = {}
+    mismatches = []
+    for engine in engines:
+        if fuzzed and not engine.fuzz:
+            continue
+        start = time.perf_counter()
+        outcome = _outcome(engine, lines, reference)
+        if timings is not None:
+            key = (engine.kind, engine.name)
+            timings[key] = timings.get(key, 0.0) + \
+                time.perf_counter() - start
+
+        if engine.kind not in expected:
+            expected[engine.kind] = outcome
+            continue
+        wanted = expected[engine.kind]
+        if not engine.strict and wanted[0] != 'ok':
+            continue
+        if outcome != wanted:
+            mismatches.append((engine.kind, engine.name, wanted, outcome))
+    return mismatches
+
+
+def run(corpus, engines=ENGINES, fuzz_count=0, seed=0):
+    '''
+    Check every ``(name, lines)`` of ``corpus`` and ``fuzz_count`` fuzzed
+    variants of each. Returns a ConformanceReport.
+    '''
+    rng = random.Random(seed)
+    report = ConformanceReport()
+    timings = {}
+    sizes = {}
+    for name, lines in corpus:
+        lines = list(lines)
+        report.instances += 1
+        size = sum(len(line) for line in lines)
+        for engine in engines:
+            key = (engine.kind, engine.name)
+            sizes[key] = sizes.get(key, 0) + size
+        inputs = [('none', lines, False)]
+        for _ in range(fuzz_count):
+            mutation, mutated = fuzz(lines, rng)
+            inputs.append((mutation, mutated, True))
+        for mutation, variant, fuzzed in inputs:
+            report.fuzzed += fuzzed
+            found = check(variant, engines, fuzzed,
+                          None if fuzzed else timings)
+            for kind, engine, expected, actual in found:
+                report.mismatches.append({
+                    'instance': name, 'mutation': mutation, 'kind': kind,
+                    'engine': engine, 'expected': _summary(expected),
+                    'actual': _summary(actual), 'lines': variant})
+    report.throughput = dict((key, (sizes[key], timings.get(key, 0.0)))
+                             for key in sizes)
+    return report
+
+
+def main(argv=None):
+    import argparse
+
+    from steinlib.generator import synthetic_corpus
+
+    parser = argparse.ArgumentParser(
+        prog='python -m steinlib.conformance',
+        description='Check that the parsing engines agree.')
+    parser.add_argument('paths', nargs='*', metavar='file')
+    parser.add_argument('--synthetic', type=int, default=6,
+                        help='synthetic instances to add (default: 6)')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='size multiplier of the synthetic instances')
+    parser.add_argument('--fuzz', type=int, default=10,
+                        help='fuzzed variants per instance (default: 10)')
+    parser.add_argument('--seed', type=int, default=0)
+    arguments = parser.parse_args(argv)
+
+    def corpus():
+        for path in arguments.paths:
+            with open_stp(path) as stp_file:
+                yield path, stp_file.readlines()
+        for item in synthetic_corpus(arguments.synthetic, arguments.seed,
+                                     arguments.scale):
+            yield item
+
+    report = run(corpus(), fuzz_count=arguments.fuzz, seed=arguments.seed)
+    sys.stdout.write(report.format() + '\n')
+    return 0 if report.ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,304 @@
+'''
+Decomposition of an undirected instance at its articulation points into
+biconnected blocks, that can be solved independently.
+
+A Steiner tree restricted to a block is a Steiner tree of the block for
+the terminals inside it plus the articulation points through which it
+reaches terminals outside it. The optimal tree of the instance is the union
+of the optimal trees of the blocks that lie between terminals, which are
+small standalone instances a process pool can solve in parallel.
+'''
+import numpy as np
+
+from steinlib.arrays import POTENTIAL_TERMINAL, TERMINAL, SteinlibArrays
+
+
+def biconnected_blocks(instance):
+    '''
+    Block label of every row of ``edges``, as an array of ``0..B-1``, with
+    -1 for self-loops (which belong to no solution). Arcs count as edges.
+
+    This is Tarjan's algorithm over the CSR adjacency, made iterative with
+    an explicit stack so that long paths do not hit the recursion limit.
+    Parallel edges are told apart by row, so two of them form a block.
+    '''
+    indptr, indices, edge_ids = _adjacency(instance)
+    indptr, indices, edge_ids = (indptr.tolist(), indices.tolist(),
+                                 edge_ids.tolist())
+    labels = [-1] * len(instance.edges)
+    discovery = [-1] * instance.id_bound
+    low = [0] * instance.id_bound
+    following = list(indptr)
+    edge_stack = []
+    count = 0
+    clock = 0
+
+    for start in range(instance.id_bound):
+        if discovery[start] != -1 or indptr[start] == indptr[start + 1]:
+            continue
+        discovery[start] = low[start] = clock
+        clock += 1
+        nodes, parent_edges = [start], [-1]
+        while nodes:
+            node = nodes[-1]
+            position = following[node]
+            if position < indptr[node + 1]:
+                following[node] = position + 1
+                neighbour, edge = indices[position], edge_ids[position]
+                if edge == parent_edges[-1] or neighbour == node:
+                    continue
+                if discovery[neighbour] == -1:
+                    edge_stack.append(edge)
+                    discovery[neighbour] = low[neighbour] = clock
+                    clock += 1
+                    nodes.append(neighbour)
+                    parent_edges.append(edge)
+                elif discovery[neighbour] < discovery[node]:
+                    edge_stack.append(edge)
+                    if discovery[neighbour] < low[node]:
+                        low[node] = discovery[neighbour]
+                continue
+
+            nodes.pop()
+            tree_edge = parent_edges.pop()
+            if not nodes:
+                continue
+            parent = nodes[-1]
+            if low[node] < low[parent]:
+                low[parent] = low[node]
+            if low[node] >= discovery[parent]:
+                # ``parent`` separates the subtree of ``node``: the edges
+                # pushed since the tree edge between them form a block
+                while True:
+                    edge = edge_stack.pop()
+                    labels[edge] = count
+                    if edge == tree_edge:
+                        break
+                count += 1
+    return np.array(labels, dtype=np.int64)
+
+
+def _adjacency(instance):
+    if not instance.num_arcs:
+        return instance.csr()
+    # arcs only appear from tail to head in csr(): add them backwards
+    rows = np.arange(len(instance.edges), dtype=np.int64)
+    tails = np.concatenate((instance.edges[:, 0], instance.edges[:, 1]))
+    heads = np.concatenate((instance.edges[:, 1], instance.edges[:, 0]))
+    rows = np.concatenate((rows, rows))
+    order = np.argsort(tails, kind='stable')
+    indptr = np.zeros(instance.id_bound + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=instance.id_bound),
+              out=indptr[1:])
+    return indptr, heads[order], rows[order]
+
+
+class Decomposition(object):
+    '''
+    Outcome of decompose(). Per block, in CSR form (the values of block
+    ``b`` are ``values[indptr[b]:indptr[b + 1]]``):
+
+     - ``block_edges``: ``(indptr, rows)``, its rows of ``edges``;
+     - ``block_nodes``: ``(indptr, ids)``, its node ids, sorted;
+     - ``block_terminals``: ``(indptr, ids)``, the terminals of its
+       subproblem: the terminals in it and the articulation points through
+       which terminals outside it are reached;
+
+    and ``edge_blocks`` (the block of every row, -1 for self-loops),
+    ``articulation_points`` (node ids in more than one block) and
+    ``needed`` (the blocks with at least two subproblem terminals; the
+    others have an empty optimal tree).
+    '''
+
+    def __init__(self, instance, edge_blocks):
+        self.source = instance
+        self.edge_blocks = edge_blocks
+        self.num_blocks = int(edge_blocks.max()) + 1 if len(edge_blocks) \
+            else 0
+        bound = instance.id_bound
+
+        rows = np.flatnonzero(edge_blocks >= 0)
+        order = rows[np.argsort(edge_blocks[rows], kind='stable')]
+        self.block_edges = (self._indptr(edge_blocks[order]), order)
+
+        keys = np.unique(np.concatenate((
+            edge_blocks[rows] * bound + instance.edges[rows, 0],
+            edge_blocks[rows] * bound + instance.edges[rows, 1])))
+        blocks, nodes = keys // bound, keys % bound
+        self.block_nodes = (self._indptr(blocks), nodes)
+        memberships = np.bincount(nodes, minlength=bound)
+        self.articulation_points = np.flatnonzero(memberships > 1)
+
+        terminal_mask = np.zeros(bound, dtype=np.bool_)
+        terminal_mask[instance.terminals] = True
+        cut = memberships[nodes] > 1
+        inside = terminal_mask[nodes] & ~cut
+        outside = self._terminals_beyond(blocks, nodes, cut, inside,
+                                         terminal_mask)
+        chosen = inside.copy()
+        chosen[np.flatnonzero(cut)[outside > 0]] = True
+        self.block_terminals = (self._indptr(blocks[chosen]), nodes[chosen])
+        self.needed = np.bincount(blocks[chosen],
+                                  minlength=self.num_blocks) >= 2
+
+    def __len__(self):
+        return self.num_blocks
+
+    def edges_of(self, block):
+        return _part(self.block_edges, block)
+
+    def nodes_of(self, block):
+        return _part(self.block_nodes, block)
+
+    def terminals_of(self, block):
+        return _part(self.block_terminals, block)
+
+    def instance(self, block):
+        '''
+        Block ``block`` as a standalone SteinlibArrays with dense ids
+        ``0..n-1`` and ``original_ids`` pointing back to the file ids. Its
+        rows are edges_of(block), in that order.
+
+        The degree limits of articulation points are kept whole, so the
+        union of the block solutions must be checked against them again
+        (see steinlib.feasibility). Presolve data and extra records, which
+        describe the whole instance, are dropped.
+        '''
+        source = self.source
+        nodes, rows = self.nodes_of(block), self.edges_of(block)
+        terminals = self.terminals_of(block)
+        edges = source.edges[rows]
+
+        kinds = np.full(len(terminals), TERMINAL, dtype=np.int8)
+        given, positions = np.unique(source.terminals, return_index=True)
+        known = np.isin(terminals, given)
+        kinds[known] = source.terminal_kinds[
+            positions[np.searchsorted(given, terminals[known])]]
+
+        kept = np.isin(source.coordinate_ids, nodes)
+        degrees = source.maximum_degrees
+        if len(degrees):
+            records = nodes - source.first_id
+            limited = (records >= 0) & (records < len(degrees))
+            degrees = np.zeros(len(nodes), dtype=np.int64)
+            degrees[limited] = source.maximum_degrees[records[limited]]
+
+        return SteinlibArrays(
+            num_nodes=len(nodes),
+            edges=np.column_stack((np.searchsorted(nodes, edges[:, 0]),
+                                   np.searchsorted(nodes, edges[:, 1]),
+                                   edges[:, 2])),
+            directed=source.directed[rows],
+            terminals=np.searchsorted(nodes, terminals),
+            terminal_kinds=kinds,
+            coordinate_ids=np.searchsorted(nodes,
+                                           source.coordinate_ids[kept]),
+            coordinates=source.coordinates[kept],
+            obstacles=source.obstacles,
+            maximum_degrees=degrees,
+            comment=source.comment,
+            header=source.header,
+            original_ids=source.to_original_ids(nodes),
+            memory_budget=source.memory_budget)
+
+    def instances(self):
+        '''
+        ``(block, instance)`` for every needed block, largest first, to
+        hand over to a pool of workers.
+        '''
+        blocks = np.flatnonzero(self.needed)
+        sizes = np.diff(self.block_edges[0])[blocks]
+        return [(int(block), self.instance(block))
+                for block in blocks[np.argsort(-sizes, kind='stable')]]
+
+    def recombine(self, solutions):
+        '''
+        Rows of ``edges`` of the union of block solutions, given as
+        ``(block, rows of its instance)`` pairs or a mapping from blocks to
+        rows.
+        '''
+        if hasattr(solutions, 'items'):
+            solutions = solutions.items()
+        parts = [self.edges_of(block)[np.asarray(rows, dtype=np.int64)]
+                 for block, rows in solutions]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def _indptr(self, blocks):
+        indptr = np.zeros(self.num_blocks + 1, dtype=np.int64)
+        np.cumsum(np.bincount(blocks, minlength=self.num_blocks),
+                  out=indptr[1:])
+        return indptr
+
+    def _terminals_beyond(self, blocks_of, nodes, cut, inside,
+                          terminal_mask):
+        # Number of terminals on the far side of every (block, articulation
+        # point) pair, from the block-cut forest: blocks are its nodes
+        # 0..B-1, articulation points the nodes B.., joined by the pairs.
+        # The terminals of a subtree are summed in reverse DFS order.
+        cut_ids, cut_nodes = np.unique(nodes[cut], return_inverse=True)
+        cut_nodes = cut_nodes.reshape(-1) + self.num_blocks
+        blocks = blocks_of[cut]
+        size = self.num_blocks + len(cut_ids)
+        weights = np.zeros(size, dtype=np.int64)
+        weights[:self.num_blocks] = np.bincount(
+            blocks_of[inside], minlength=self.num_blocks)
+        weights[self.num_blocks:] = terminal_mask[cut_ids]
+
+        tails = np.concatenate((blocks, cut_nodes))
+        heads = np.concatenate((cut_nodes, blocks))
+        order = np.argsort(tails, kind='stable')
+        indptr = np.zeros(size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(tails, minlength=size), out=indptr[1:])
+        indptr, heads = indptr.tolist(), heads[order].tolist()
+
+        parents = [-1] * size
+        roots = [-1] * size
+        visited = []
+        for start in range(size):
+            if roots[start] != -1:
+                continue
+            roots[start] = start
+            stack = [start]
+            while stack:
+                node = stack.pop()
+                visited.append(node)
+                for neighbour in heads[indptr[node]:indptr[node + 1]]:
+                    if roots[neighbour] == -1:
+                        roots[neighbour] = start
+                        parents[neighbour] = node
+                        stack.append(neighbour)
+
+        subtree = weights.tolist()
+        for node in reversed(visited):
+            if parents[node] != -1:
+                subtree[parents[node]] += subtree[node]
+        subtree = np.array(subtree, dtype=np.int64)
+        parents = np.array(parents, dtype=np.int64)
+        roots = np.array(roots, dtype=np.int64)
+
+        # the cut is the parent of the block, or its child
+        above = parents[blocks] == cut_nodes
+        return np.where(above, subtree[roots[blocks]] - subtree[blocks],
+                        subtree[cut_nodes])
+
+
+def _part(csr, position):
+    indptr, values = csr
+    return values[indptr[position]:indptr[position + 1]]
+
+
+def decompose(instance):
+    '''
+    Split ``instance`` into its biconnected blocks, with the terminals of
+    their subproblems. Only undirected instances decompose this way: arcs
+    raise a ValueError, as do potential terminals, since whether a block is
+    needed then depends on the solution.
+    '''
+    if instance.num_arcs:
+        raise ValueError('Only instances without arcs can be decomposed')
+    if np.any(instance.terminal_kinds == POTENTIAL_TERMINAL):
+        raise ValueError('Instances with potential terminals cannot be '
+                         'decomposed')
+    return Decomposition(instance, biconnected_blocks(instance))
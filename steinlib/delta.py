@@ -0,0 +1,398 @@
+'''
+Small changes to large instances, without writing nor parsing them again.
+
+An InstanceDelta lists edges and arcs to add, remove or reweight and
+terminals to add or remove. apply_delta() applies it to a SteinlibArrays,
+either in place or as a copy that shares every unchanged array with the
+base, and updates the CSR adjacency, the edge index and the fingerprint
+state that were already built instead of dropping them: only the changed
+rows are hashed, and the adjacency is patched without sorting it again.
+
+Deltas are saved as ``.npz`` archives, on their own or next to their base
+in an InstanceCache (see InstanceCache.store_delta()).
+'''
+import json
+
+import numpy as np
+
+from steinlib._pickling import pickled_arrays, unpickle_instance
+from steinlib.arrays import NPZ_METADATA, TERMINAL, SteinlibArrays
+from steinlib.fingerprint import canonical_edges, canonical_terminals
+
+
+# name, dtype and width (None for vectors) of the arrays of a delta
+_FIELDS = (
+    ('add_edges', np.int64, 3),
+    ('add_directed', np.bool_, None),
+    ('remove_edges', np.int64, 2),
+    ('reweight_edges', np.int64, 3),
+    ('add_terminals', np.int64, None),
+    ('add_terminal_kinds', np.int8, None),
+    ('remove_terminals', np.int64, None),
+)
+
+
+class InstanceDelta(object):
+    '''
+    Changes to an instance, in file node ids:
+
+     - ``add_edges``: ``(tail, head, weight)`` rows, arcs where
+       ``add_directed`` is true;
+     - ``remove_edges``: ``(tail, head)`` pairs of edges (either way) or
+       arcs to remove;
+     - ``reweight_edges``: ``(tail, head, new weight)`` rows;
+     - ``add_terminals`` of kinds ``add_terminal_kinds`` (``T`` by
+       default) and ``remove_terminals``.
+
+    ``base`` is the fingerprint of the instance the delta applies to, when
+    known. Changes can also be added one at a time with add_edge() and the
+    like.
+    '''
+
+    def __init__(self, add_edges=None, add_directed=None, remove_edges=None,
+                 reweight_edges=None, add_terminals=None,
+                 add_terminal_kinds=None, remove_terminals=None, base=None):
+        self.base = base
+        self._chunks = dict((name, []) for name, _, _ in _FIELDS)
+        self._arrays = {}
+        for name, values in (('add_edges', add_edges),
+                             ('add_directed', add_directed),
+                             ('remove_edges', remove_edges),
+                             ('reweight_edges', reweight_edges),
+                             ('add_terminals', add_terminals),
+                             ('add_terminal_kinds', add_terminal_kinds),
+                             ('remove_terminals', remove_terminals)):
+            if values is not None:
+                self._extend(name, values)
+        self._pad('add_directed', 'add_edges', False)
+        self._pad('add_terminal_kinds', 'add_terminals', TERMINAL)
+
+    def __len__(self):
+        return sum(len(self.array(name)) for name in
+                   ('add_edges', 'remove_edges', 'reweight_edges',
+                    'add_terminals', 'remove_terminals'))
+
+    add_edges = property(lambda self: self.array('add_edges'))
+    add_directed = property(lambda self: self.array('add_directed'))
+    remove_edges = property(lambda self: self.array('remove_edges'))
+    reweight_edges = property(lambda self: self.array('reweight_edges'))
+    add_terminals = property(lambda self: self.array('add_terminals'))
+    add_terminal_kinds = property(
+        lambda self: self.array('add_terminal_kinds'))
+    remove_terminals = property(lambda self: self.array('remove_terminals'))
+
+    def array(self, name):
+        if name not in self._arrays:
+            _, dtype, width = _FIELDS[_NAMES.index(name)]
+            chunks = self._chunks[name]
+            shape = (0, width) if width else (0,)
+            self._arrays[name] = (np.concatenate(chunks) if chunks
+                                  else np.empty(shape, dtype=dtype))
+        return self._arrays[name]
+
+    def add_edge(self, tail, head, weight, directed=False):
+        self._extend('add_edges', [(tail, head, weight)])
+        self._extend('add_directed', [directed])
+
+    def remove_edge(self, tail, head):
+        self._extend('remove_edges', [(tail, head)])
+
+    def reweight(self, tail, head, weight):
+        self._extend('reweight_edges', [(tail, head, weight)])
+
+    def add_terminal(self, node, kind=TERMINAL):
+        self._extend('add_terminals', [node])
+        self._extend('add_terminal_kinds', [kind])
+
+    def remove_terminal(self, node):
+        self._extend('remove_terminals', [node])
+
+    def arrays(self):
+        return [(name, self.array(name)) for name, _, _ in _FIELDS]
+
+    def metadata(self):
+        return {'base': self.base}
+
+    @classmethod
+    def from_arrays(cls, arrays, metadata):
+        kwargs = dict(arrays)
+        kwargs.update(metadata)
+        return cls(**kwargs)
+
+    def __reduce_ex__(self, protocol):
+        # out-of-band buffers from protocol 5 on, as SteinlibArrays
+        return (unpickle_instance,
+                (type(self), pickled_arrays(self.arrays(), protocol),
+                 self.metadata()))
+
+    def to_npz(self, path):
+        '''
+        Save the delta into a NumPy ``.npz`` archive, as
+        SteinlibArrays.to_npz() does.
+        '''
+        arrays = dict(self.arrays())
+        arrays[NPZ_METADATA] = np.array(json.dumps(self.metadata()))
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def from_npz(cls, path):
+        with np.load(path, allow_pickle=False) as archive:
+            arrays = dict((name, archive[name]) for name in archive.files)
+        metadata = json.loads(str(arrays.pop(NPZ_METADATA)))
+        return cls.from_arrays(arrays, metadata)
+
+    def _extend(self, name, values):
+        _, dtype, width = _FIELDS[_NAMES.index(name)]
+        values = np.asarray(values, dtype=dtype)
+        self._chunks[name].append(values.reshape(-1, width) if width
+                                  else values.reshape(-1))
+        self._arrays.pop(name, None)
+
+    def _pad(self, name, rows, value):
+        missing = len(self.array(rows)) - len(self.array(name))
+        if missing > 0:
+            self._extend(name, np.full(missing, value))
+        elif missing < 0:
+            raise ValueError('%s has more values than %s' % (name, rows))
+
+
+_NAMES = [name for name, _, _ in _FIELDS]
+
+
+def apply_delta(instance, delta, in_place=False):
+    '''
+    Apply ``delta`` to ``instance``: removals first, then new weights, then
+    additions, which are appended after the remaining rows.
+
+    Returns a new SteinlibArrays that shares the unchanged arrays with
+    ``instance``, or ``instance`` itself, updated, with ``in_place``. Its
+    CSR adjacency, edge index and fingerprint state are updated when they
+    were built on ``instance``, and are built lazily otherwise.
+
+    Raises ValueError for changes that do not apply: edges or terminals to
+    remove that do not exist, node ids outside the instance, or a ``base``
+    fingerprint that is not the fingerprint of ``instance`` (which is then
+    computed if needed). ``in_place`` changes of weights also raise it on
+    read-only edges, as those of an instance unpickled from read-only
+    out-of-band buffers or attached to shared memory.
+    '''
+    if delta.base is not None:
+        state = instance.fingerprint_state()
+        if state.hexdigest() != delta.base:
+            raise ValueError('The delta applies to instance %s, not %s' %
+                             (delta.base, state.hexdigest()))
+    state = instance.cached_index('fingerprint_state')
+    if in_place and len(delta.reweight_edges) and \
+            not instance.edges.flags.writeable:
+        raise ValueError('The edges are read-only: apply the delta to a copy')
+
+    edges, directed = instance.edges, instance.directed
+    id_bound = instance.id_bound
+    index = instance.edge_index() if len(delta.remove_edges) or \
+        len(delta.reweight_edges) else instance.cached_index('edge_index')
+
+    removed = _rows(instance, index, delta.remove_edges, 'remove')
+    if len(np.unique(removed)) < len(removed):
+        removed = _repeated_removals(instance, index, removed)
+    reweighted = _rows(instance, index, delta.reweight_edges, 'reweight')
+    if np.isin(reweighted, removed).any():
+        raise ValueError('An edge is both removed and reweighted')
+    added = delta.add_edges.copy()
+    added[:, :2] = _node_ids(instance, added[:, :2], id_bound)
+    dropped, new_terminals = _terminal_changes(instance, delta, id_bound)
+
+    if state is not None:
+        state = state if in_place else state.copy()
+        state.remove('edges', canonical_edges(
+            instance, edges[removed], directed[removed]))
+        state.remove('edges', canonical_edges(
+            instance, edges[reweighted], directed[reweighted]))
+        state.remove('terminals', canonical_terminals(
+            instance, instance.terminals[dropped],
+            instance.terminal_kinds[dropped]))
+        state.add('terminals', canonical_terminals(
+            instance, new_terminals, delta.add_terminal_kinds))
+
+    structural = len(removed) or len(added)
+    if structural:
+        kept = np.ones(len(edges), dtype=np.bool_)
+        kept[removed] = False
+        mapping = np.full(len(edges), -1, dtype=np.int64)
+        mapping[kept] = np.arange(np.count_nonzero(kept))
+        new_edges = np.concatenate((edges[kept], added))
+        new_directed = np.concatenate((directed[kept], delta.add_directed))
+        reweighted = mapping[reweighted]
+    else:
+        new_edges = edges if in_place else edges.copy()
+        new_directed = directed
+    new_edges[reweighted, 2] = delta.reweight_edges[:, 2]
+
+    if state is not None:
+        changed = np.concatenate((reweighted, np.arange(
+            len(new_edges) - len(added), len(new_edges))))
+        state.add('edges', canonical_edges(instance, new_edges[changed],
+                                           new_directed[changed]))
+
+    terminals, kinds = instance.terminals, instance.terminal_kinds
+    if len(new_terminals) or dropped.any():
+        terminals = np.concatenate((terminals[~dropped], new_terminals))
+        kinds = np.concatenate((kinds[~dropped], delta.add_terminal_kinds))
+
+    if in_place:
+        result = instance
+        result.edges, result.directed = new_edges, new_directed
+        result.terminals, result.terminal_kinds = terminals, kinds
+    else:
+        result = SteinlibArrays(
+            num_nodes=instance.num_nodes,
+            edges=new_edges,
+            directed=new_directed,
+            terminals=terminals,
+            terminal_kinds=kinds,
+            coordinate_ids=instance.coordinate_ids,
+            coordinates=instance.coordinates,
+            obstacles=instance.obstacles,
+            maximum_degrees=instance.maximum_degrees,
+            presolve=instance.presolve,
+            presolve_records=instance.presolve_records,
+            extra_records=instance.extra_records,
+            comment=instance.comment,
+            header=instance.header,
+            original_ids=instance.original_ids,
+            memory_budget=instance.memory_budget)
+        for name in ('point_index', 'obstacle_index'):
+            result.set_cached_index(name, instance.cached_index(name))
+
+    result.set_cached_index('fingerprint_state', state)
+    csr = instance.cached_index('csr')
+    if not structural:
+        result.set_cached_index('csr', csr)
+        if index is not None and not in_place:
+            result.set_cached_index('edge_index', index.reweighted(new_edges))
+    else:
+        if csr is not None:
+            result.set_cached_index('csr', _updated_csr(
+                csr, new_edges, new_directed, kept, mapping,
+                len(edges) - len(removed), result.id_bound))
+        if index is not None:
+            result.set_cached_index('edge_index', index.updated(
+                new_edges, new_directed, directed, removed, mapping,
+                copy=not in_place))
+    return result
+
+
+def _node_ids(instance, ids, id_bound):
+    ids = instance.from_original_ids(ids)
+    outside = (ids < instance.first_id) | (ids >= id_bound)
+    if outside.any():
+        raise ValueError('Node %d is not in the instance' %
+                         np.asarray(ids)[outside][0])
+    return ids
+
+
+def _rows(instance, index, pairs, action):
+    if not len(pairs):
+        return np.empty(0, dtype=np.int64)
+    ids = instance.from_original_ids(pairs[:, :2])
+    rows = index.find(ids[:, 0], ids[:, 1])
+    missing = np.flatnonzero(rows < 0)
+    if len(missing):
+        raise ValueError('No edge %d-%d to %s' % (
+            pairs[missing[0], 0], pairs[missing[0], 1], action))
+    return rows
+
+
+def _repeated_removals(instance, index, rows):
+    # removing a pair again removes its next record, in row order
+    edges, directed = instance.edges, instance.directed
+
+    def key(row):
+        tail, head = int(edges[row, 0]), int(edges[row, 1])
+        if directed[row]:
+            return True, tail, head
+        return False, min(tail, head), max(tail, head)
+
+    others = {}
+    for row in index.duplicates.tolist():
+        others.setdefault(key(row), []).append(row)
+    result = []
+    seen = {}
+    for row in rows.tolist():
+        count = seen[row] = seen.get(row, -1) + 1
+        if not count:
+            result.append(row)
+            continue
+        records = others.get(key(row), ())
+        if count > len(records):
+            raise ValueError('Edge %d-%d removed more times than given' %
+                             tuple(instance.to_original_ids(edges[row, :2])))
+        result.append(records[count - 1])
+    return np.array(result, dtype=np.int64)
+
+
+def _terminal_changes(instance, delta, id_bound):
+    # the mask of the terminals to remove and the ids of the new ones
+    terminals = instance.terminals
+    remove = _node_ids(instance, delta.remove_terminals, id_bound)
+    unknown = ~np.isin(remove, terminals)
+    if unknown.any():
+        raise ValueError('Node %d is not a terminal' %
+                         delta.remove_terminals[unknown][0])
+    dropped = np.isin(terminals, remove)
+    add = _node_ids(instance, delta.add_terminals, id_bound)
+    repeated = np.isin(add, terminals[~dropped])
+    if repeated.any() or len(np.unique(add)) < len(add):
+        raise ValueError('A node is added as a terminal twice')
+    return dropped, add
+
+
+def _updated_csr(csr, edges, directed, kept, mapping, start, id_bound):
+    '''
+    The CSR of SteinlibArrays.csr() for ``edges``, from the one of the edges
+    before the change: the entries of the removed rows are dropped and the
+    others renumbered by ``mapping``, and the entries of the rows from
+    ``start`` on are inserted where a full build would put them, i.e. by
+    node, the rows as given before the reversed undirected edges, each in
+    row order.
+    '''
+    indptr, indices, edge_ids = csr
+    indptr = np.array(indptr, dtype=np.int64)
+    bound = len(indptr) - 1
+    dropped = ~kept[edge_ids]
+    if dropped.any():
+        nodes = np.searchsorted(indptr, np.flatnonzero(dropped),
+                                side='right') - 1
+        indptr[1:] -= np.cumsum(np.bincount(nodes, minlength=bound))
+        indices = indices[~dropped]
+        edge_ids = mapping[edge_ids[~dropped]]
+    else:
+        indices = np.asarray(indices)
+        edge_ids = mapping[edge_ids]
+
+    rows = np.arange(start, len(edges), dtype=np.int64)
+    if not len(rows):
+        return _resized(indptr, id_bound), indices, edge_ids
+    undirected = rows[~directed[start:]]
+    tails = np.concatenate((edges[rows, 0], edges[undirected, 1]))
+    heads = np.concatenate((edges[rows, 1], edges[undirected, 0]))
+    ids = np.concatenate((rows, undirected))
+    reverse = np.arange(len(ids)) >= len(rows)
+    order = np.lexsort((ids, reverse, tails))
+    tails, heads, ids, reverse = tails[order], heads[order], ids[order], \
+        reverse[order]
+
+    forward = np.bincount(edges[:start, 0], minlength=bound)
+    positions = np.where(reverse, indptr[tails + 1],
+                         indptr[tails] + forward[tails])
+    indices = np.insert(indices, positions, heads)
+    edge_ids = np.insert(edge_ids, positions, ids)
+    indptr[1:] += np.cumsum(np.bincount(tails, minlength=bound))
+    return _resized(indptr, id_bound), indices, edge_ids
+
+
+def _resized(indptr, id_bound):
+    # removed edges may have been the only mention of the largest ids
+    if len(indptr) > id_bound + 1:
+        return indptr[:id_bound + 1]
+    return np.concatenate((indptr, np.full(id_bound + 1 - len(indptr),
+                                           indptr[-1], dtype=np.int64)))
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from steinlib.spatial import distances
+
+
+class DistanceProvider(object):
+    '''
+    Pairwise distances between ``DD`` points, computed on demand.
+
+    The full matrix is never built: distances are computed in square blocks
+    of ``block_size`` points, and the last ``cache_blocks`` blocks that were
+    asked for are kept in an LRU cache. Points are addressed by node id.
+    '''
+
+    def __init__(self, ids, coordinates, metric='l2', block_size=1024,
+                 cache_blocks=64):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.metric = metric
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.hits = 0
+        self.misses = 0
+        self._coordinates = np.asarray(coordinates, dtype=np.float64)
+        self._cache = OrderedDict()
+
+        bound = int(self.ids.max()) + 1 if len(self.ids) else 0
+        self._positions = np.full(bound, -1, dtype=np.int64)
+        self._positions[self.ids] = np.arange(len(self.ids))
+        # fail early on unknown metric names
+        distances(np.zeros((1, 1)), metric)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def positions(self, ids):
+        '''
+        Rows of the given node ids, raising KeyError for ids without
+        coordinates.
+        '''
+        ids = np.asarray(ids, dtype=np.int64)
+        inside = (ids >= 0) & (ids < len(self._positions))
+        positions = np.full(ids.shape, -1, dtype=np.int64)
+        positions[inside] = self._positions[ids[inside]]
+        if (positions < 0).any():
+            raise KeyError('No coordinates for node ids %s.' %
+                           ids[positions < 0].tolist())
+        return positions
+
+    def distance(self, u, v):
+        return float(self.pairs([u], [v])[0])
+
+    def pairs(self, us, vs):
+        '''
+        Distance of every ``(us[i], vs[i])`` pair. This does not go through
+        the block cache.
+        '''
+        first = self._coordinates[self.positions(us)]
+        second = self._coordinates[self.positions(vs)]
+        return distances(first - second, self.metric)
+
+    def row(self, u):
+        '''
+        Distances from ``u`` to every point, in the order of ``ids``.
+        '''
+        position = self.positions([u])[0]
+        block_row = position // self.block_size
+        offset = position - block_row * self.block_size
+        return np.concatenate([
+            self.block(block_row, block_column)[offset]
+            for block_column in range(self.num_blocks)])
+
+    @property
+    def num_blocks(self):
+        return -(-len(self.ids) // self.block_size)
+
+    def block(self, block_row, block_column):
+        '''
+        Distances between the points of two blocks. Blocks on the border may
+        be smaller than ``block_size``.
+        '''
+        key = (block_row, block_column)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+        self.misses += 1
+        result = self._compute_block(block_row, block_column)
+        result.setflags(write=False)
+        self._cache[key] = result
+        while len(self._cache) > self.cache_blocks:
+            self._cache.popitem(last=False)
+        return result
+
+    def iter_nearest(self, k):
+        '''
+        Stream the ``k`` nearest other points of every point, one block of
+        rows at a time, as ``(ids, neighbor_ids, neighbor_distances)`` with
+        the last two shaped ``(rows, k)`` and sorted by distance.
+
+        Only one row block of candidates is alive at a time, and the blocks
+        computed here do not go through the cache.
+        '''
+        k = min(k, max(len(self.ids) - 1, 0))
+        for block_row in range(self.num_blocks):
+            start = block_row * self.block_size
+            stop = min(start + self.block_size, len(self.ids))
+            rows = np.arange(stop - start)
+            best = np.full((stop - start, k), np.inf)
+            best_positions = np.full((stop - start, k), -1, dtype=np.int64)
+
+            for block_column in range(self.num_blocks):
+                block = self._compute_block(block_row, block_column)
+                column_start = block_column * self.block_size
+                if block_column == block_row:
+                    block[rows, rows] = np.inf
+                columns = column_start + np.arange(block.shape[1])
+                merged = np.hstack((best, block))
+                merged_positions = np.hstack((
+                    best_positions,
+                    np.broadcast_to(columns, block.shape)))
+                if k:
+                    keep = np.argpartition(merged, k - 1, axis=1)[:, :k]
+                else:
+                    keep = np.empty((len(rows), 0), dtype=np.int64)
+                best = np.take_along_axis(merged, keep, axis=1)
+                best_positions = np.take_along_axis(merged_positions, keep,
+                                                    axis=1)
+
+            order = np.argsort(best, axis=1, kind='stable')
+            best = np.take_along_axis(best, order, axis=1)
+            best_positions = np.take_along_axis(best_positions, order, axis=1)
+            yield self.ids[start:stop], self.ids[best_positions], best
+
+    def _compute_block(self, block_row, block_column):
+        rows = self._block_slice(block_row)
+        columns = self._block_slice(block_column)
+        differences = (self._coordinates[rows, np.newaxis, :] -
+                       self._coordinates[np.newaxis, columns, :])
+        return distances(differences, self.metric)
+
+    def _block_slice(self, block):
+        start = block * self.block_size
+        if block < 0 or start >= len(self.ids):
+            raise IndexError('Block %d out of range.' % block)
+        return slice(start, start + self.block_size)
@@ -3,8 +3,29 @@ class SteinlibParsingException(Exception):
     """
     This is the generic exception for the overall parsing process. If there is
     something wrong, this will be raised.
+
+    The parser fills ``line_number`` and ``offset`` with the position of the
+    offending line.
     """
-    pass
+
+    def __init__(self, message, line_number=None, offset=None):
+        super(SteinlibParsingException, self).__init__(message)
+        self.message = message
+        self.line_number = line_number
+        self.offset = offset
+
+    def locate(self, line_number, offset):
+        """
+        Set the position, unless a more precise one is already known.
+        """
+        if self.line_number is None:
+            self.line_number = line_number
+            self.offset = offset
+
+    def __str__(self):
+        if self.line_number is None:
+            return self.message
+        return '%s (line %d)' % (self.message, self.line_number)
 
 
 class UnrecognizedSectionException(SteinlibParsingException):
@@ -12,3 +33,16 @@ class UnrecognizedSectionException(SteinlibParsingException):
     This exception is raised when a unknown section name is found.
     """
     pass
+
+
+class ParsingCancelledException(Exception):
+    """
+    This exception is raised when the cancellation token of a parse is
+    cancelled. ``line_number`` and ``offset`` tell how far the parse went.
+    """
+
+    def __init__(self, line_number, offset):
+        super(ParsingCancelledException, self).__init__(
+            'Parsing cancelled at line %d' % line_number)
+        self.line_number = line_number
+        self.offset = offset
@@ -0,0 +1,217 @@
+'''
+Fast checks of candidate solutions against the degree limits (``MD``
+records) and the cost bounds (``LOWER``/``UPPER`` presolve values) of an
+instance, for local searches that test many candidates in a loop.
+
+A candidate is a set of rows of ``edges``, given as row ids or as a
+boolean mask over the rows. Batches of candidates are checked together,
+with one counting pass over all of their endpoints.
+'''
+import numpy as np
+
+
+_UNLIMITED = np.iinfo(np.int64).max
+
+
+class FeasibilityResult(object):
+    '''
+    Outcome of FeasibilityChecker.check_batch(), one value per candidate:
+
+     - ``cost``: the total weight of its edges;
+     - ``degree_violations``: the number of nodes with more edges than their
+       ``MD`` limit;
+     - ``uncovered_terminals``: the number of terminals that none of its
+       edges touches (0 for instances with at most one terminal);
+     - ``below_lower``, ``above_upper``: whether ``cost`` plus the presolve
+       ``FIXED`` cost is under ``LOWER`` or over ``UPPER``, when known.
+
+    A cost under ``LOWER`` shows a candidate that cannot connect all the
+    terminals (or wrong bounds), one over ``UPPER`` a candidate worse than
+    the known solution.
+    '''
+
+    def __init__(self, cost, degree_violations, uncovered_terminals,
+                 below_lower, above_upper):
+        self.cost = cost
+        self.degree_violations = degree_violations
+        self.uncovered_terminals = uncovered_terminals
+        self.below_lower = below_lower
+        self.above_upper = above_upper
+
+    def __len__(self):
+        return len(self.cost)
+
+    @property
+    def feasible(self):
+        '''
+        Candidates within the degree limits and the bounds, that touch
+        every terminal.
+        '''
+        return (self.degree_violations == 0) & \
+            (self.uncovered_terminals == 0) & \
+            ~self.below_lower & ~self.above_upper
+
+    def candidate(self, position):
+        '''
+        The figures of one candidate, as a dictionary of Python values.
+        '''
+        return {
+            'cost': int(self.cost[position]),
+            'degree_violations': int(self.degree_violations[position]),
+            'uncovered_terminals': int(self.uncovered_terminals[position]),
+            'below_lower': bool(self.below_lower[position]),
+            'above_upper': bool(self.above_upper[position]),
+            'feasible': bool(self.feasible[position]),
+        }
+
+
+class FeasibilityChecker(object):
+    '''
+    Checks candidate edge sets of ``instance``. Everything that does not
+    depend on the candidates (the limit of every node id, the terminals,
+    the bounds) is prepared once here.
+    '''
+
+    def __init__(self, instance):
+        self.id_bound = instance.id_bound
+        self.tails = np.ascontiguousarray(instance.edges[:, 0])
+        self.heads = np.ascontiguousarray(instance.edges[:, 1])
+        self.weights = np.ascontiguousarray(instance.edges[:, 2])
+
+        self.limits = np.full(self.id_bound, _UNLIMITED, dtype=np.int64)
+        degrees = instance.maximum_degrees
+        first_id = instance.first_id
+        self.limits[first_id:first_id + len(degrees)] = degrees
+        self.limited = self.limits < _UNLIMITED
+
+        terminals = np.unique(instance.terminals)
+        self.num_terminals = len(terminals) if len(terminals) > 1 else 0
+        self.terminal_mask = np.zeros(self.id_bound, dtype=np.bool_)
+        if self.num_terminals:
+            self.terminal_mask[terminals] = True
+
+        presolve = instance.presolve
+        self.fixed = presolve.get('fixed', 0)
+        self.lower = presolve.get('lower')
+        self.upper = presolve.get('upper')
+
+    def check(self, candidate):
+        '''
+        The figures of one candidate, as FeasibilityResult.candidate().
+        '''
+        return self.check_batch([candidate]).candidate(0)
+
+    def check_batch(self, candidates):
+        '''
+        FeasibilityResult of many candidates: a sequence of row id arrays or
+        masks, or a ``(candidates, rows)`` boolean matrix.
+        '''
+        return self.check_csr(*self._as_batch(candidates))
+
+    def check_csr(self, indptr, rows):
+        '''
+        FeasibilityResult of candidates in CSR form: candidate ``i`` is
+        ``rows[indptr[i]:indptr[i + 1]]``.
+        '''
+        indptr = np.asarray(indptr, dtype=np.int64)
+        rows = _checked_rows(rows, len(self.weights))
+        if len(indptr) < 1 or indptr[0] != 0 or indptr[-1] != len(rows) or \
+                (np.diff(indptr) < 0).any():
+            raise ValueError('indptr does not delimit the %d rows' %
+                             len(rows))
+        count = len(indptr) - 1
+        owners = np.repeat(np.arange(count, dtype=np.int64), np.diff(indptr))
+
+        total = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(self.weights[rows], out=total[1:])
+        cost = total[indptr[1:]] - total[indptr[:-1]]
+
+        nodes = np.concatenate((self.tails[rows], self.heads[rows]))
+        owners = np.concatenate((owners, owners))
+        limited = self.limited[nodes]
+        violations = self._violations(owners[limited], nodes[limited], count)
+
+        uncovered = np.zeros(count, dtype=np.int64)
+        if self.num_terminals:
+            touched = self.terminal_mask[nodes]
+            keys = np.unique(owners[touched] * self.id_bound + nodes[touched])
+            uncovered = self.num_terminals - np.bincount(
+                keys // self.id_bound, minlength=count)
+
+        total_cost = cost + self.fixed
+        below = (total_cost < self.lower if self.lower is not None
+                 else np.zeros(count, dtype=np.bool_))
+        above = (total_cost > self.upper if self.upper is not None
+                 else np.zeros(count, dtype=np.bool_))
+        return FeasibilityResult(cost, violations, uncovered, below, above)
+
+    def over_limit(self, candidate):
+        '''
+        Ids of the nodes with more edges in ``candidate`` than their limit.
+        '''
+        _, rows = self._as_batch([candidate])
+        rows = _checked_rows(rows, len(self.weights))
+        degrees = np.bincount(np.concatenate((self.tails[rows],
+                                              self.heads[rows])),
+                              minlength=self.id_bound)
+        return np.flatnonzero(degrees > self.limits)
+
+    def _violations(self, owners, nodes, count):
+        # per candidate, the number of (candidate, node) keys over the
+        # limit: counted with a dense bincount when the candidates times
+        # the ids are few, by sorting the keys otherwise
+        keys = owners * self.id_bound + nodes
+        size = count * self.id_bound
+        if size <= max(4 * len(keys), 1 << 16):
+            degrees = np.bincount(keys, minlength=size).reshape(
+                count, self.id_bound)
+            return np.count_nonzero(degrees > self.limits, axis=1)
+        keys, degrees = np.unique(keys, return_counts=True)
+        over = degrees > self.limits[keys % self.id_bound]
+        return np.bincount(keys[over] // self.id_bound, minlength=count)
+
+    def _as_batch(self, candidates):
+        num_rows = len(self.weights)
+        if isinstance(candidates, np.ndarray) and candidates.ndim == 2 and \
+                candidates.dtype == np.bool_:
+            if candidates.shape[1] != num_rows:
+                raise ValueError('Masks of %d rows for %d edges' %
+                                 (candidates.shape[1], num_rows))
+            owners, rows = np.nonzero(candidates)
+            counts = np.bincount(owners, minlength=len(candidates))
+        else:
+            parts = [_as_rows(candidate, num_rows)
+                     for candidate in candidates]
+            counts = [len(part) for part in parts]
+            rows = (np.concatenate(parts) if parts
+                    else np.empty(0, dtype=np.int64))
+        indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        return indptr, rows
+
+
+def _as_rows(candidate, num_rows):
+    candidate = np.asarray(candidate)
+    if candidate.dtype == np.bool_:
+        if len(candidate) != num_rows:
+            raise ValueError('Mask of %d rows for %d edges' %
+                             (len(candidate), num_rows))
+        return np.flatnonzero(candidate)
+    return candidate.astype(np.int64, copy=False).reshape(-1)
+
+
+def _checked_rows(rows, num_rows):
+    rows = np.asarray(rows, dtype=np.int64).reshape(-1)
+    outside = (rows < 0) | (rows >= num_rows)
+    if outside.any():
+        raise ValueError('Row %d is not an edge: there are %d' %
+                         (rows[outside][0], num_rows))
+    return rows
+
+
+def check_feasibility(instance, candidate):
+    '''
+    Check one candidate (row ids or a mask over ``edges``) of ``instance``.
+    Build a FeasibilityChecker once to check many.
+    '''
+    return FeasibilityChecker(instance).check(candidate)
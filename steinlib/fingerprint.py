@@ -0,0 +1,180 @@
+'''
+Structural fingerprints of parsed instances.
+
+Two instances get the same fingerprint when they describe the same graph:
+the same nodes, edges and arcs with their weights, terminals, coordinates,
+obstacles and degree limits, whatever the order of the records, the
+comments or the formatting of the file. Compacting the ids does not change
+the fingerprint either, unless it drops nodes that nothing refers to.
+'''
+import hashlib
+
+import numpy as np
+
+
+FINGERPRINT_VERSION = b'steinlib-fingerprint-2'
+_CHUNK_ROWS = 1 << 16
+_LANES = 4
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_LANE_KEYS = np.array([0, 0x632BE59BD9B4E019, 0x85157AF5D1D1E1A1,
+                       0xC2B2AE3D27D4EB4F], dtype=np.uint64)
+_TABLES = ('edges', 'terminals', 'coordinates', 'obstacles',
+           'maximum_degrees')
+
+
+def fingerprint(instance):
+    '''
+    Hex SHA-256 digest of the canonical form of ``instance``.
+
+    Every row of every table is hashed on its own (see FingerprintState),
+    so the result does not depend on the order of the rows and can be
+    updated when rows are added or removed, as steinlib.delta does.
+    '''
+    return fingerprint_state(instance).hexdigest()
+
+
+def fingerprint_state(instance):
+    '''
+    FingerprintState of ``instance``, computed in chunks of rows.
+    '''
+    state = FingerprintState(instance.num_nodes, instance.extra_records)
+    state.add('edges', canonical_edges(instance, instance.edges,
+                                       instance.directed))
+    state.add('terminals', canonical_terminals(
+        instance, instance.terminals, instance.terminal_kinds))
+    state.add('coordinates', np.column_stack((
+        instance.to_original_ids(instance.coordinate_ids),
+        instance.coordinates)))
+    state.add('obstacles', instance.obstacles)
+
+    degrees = instance.maximum_degrees
+    degree_ids = instance.to_original_ids(
+        np.arange(len(degrees)) + instance.first_id)
+    state.add('maximum_degrees', np.column_stack((degree_ids, degrees)))
+    for name, records in instance.extra_records.items():
+        state.add(name, records)
+    return state
+
+
+def canonical_edges(instance, edges, directed):
+    '''
+    ``(directed, low, high, weight)`` rows of ``edges``, in file ids, the
+    endpoints of undirected edges in increasing order.
+    '''
+    edges = np.asarray(edges)
+    directed = np.asarray(directed, dtype=np.bool_)
+    tails = instance.to_original_ids(edges[:, 0])
+    heads = instance.to_original_ids(edges[:, 1])
+    low = np.where(directed, tails, np.minimum(tails, heads))
+    high = np.where(directed, heads, np.maximum(tails, heads))
+    return np.column_stack((directed, low, high, edges[:, 2]))
+
+
+def canonical_terminals(instance, terminals, kinds):
+    '''
+    ``(id, kind)`` rows of terminals, in file ids.
+    '''
+    return np.column_stack((instance.to_original_ids(terminals), kinds))
+
+
+class FingerprintState(object):
+    '''
+    Order independent hash of the tables of an instance, that rows can be
+    added to and removed from.
+
+    Every row is hashed to 64 bits, mixing its values one after the other,
+    and then to four lanes; a table keeps its number of rows and the sums
+    of the lanes over its rows, modulo 2**64. hexdigest() is the SHA-256 of
+    the number of nodes and of these figures. The sums make the digest a
+    multiset hash: it is fit to tell instances apart, not to resist
+    crafted collisions.
+    '''
+
+    def __init__(self, num_nodes, extra_names=()):
+        self.num_nodes = int(num_nodes)
+        self.names = _TABLES + tuple(sorted(extra_names))
+        self.tables = dict((name, [0, 0, np.zeros(_LANES, dtype=np.uint64)])
+                           for name in self.names)
+
+    def copy(self):
+        state = FingerprintState(self.num_nodes)
+        state.names = self.names
+        state.tables = dict((name, [columns, count, lanes.copy()])
+                            for name, (columns, count, lanes)
+                            in self.tables.items())
+        return state
+
+    def add(self, name, rows):
+        self._update(name, rows, 1)
+
+    def remove(self, name, rows):
+        self._update(name, rows, -1)
+
+    def hexdigest(self):
+        digest = hashlib.sha256(FINGERPRINT_VERSION)
+        digest.update(('nodes:%d;' % self.num_nodes).encode('ascii'))
+        for name in self.names:
+            columns, count, lanes = self.tables[name]
+            digest.update(('%s:%d,%d;' % (name, count, columns if count
+                                          else 0)).encode('ascii'))
+            digest.update(lanes.astype('<u8').tobytes())
+        return digest.hexdigest()
+
+    def _update(self, name, rows, sign):
+        rows = np.asarray(rows, dtype=np.int64)
+        if not rows.size:
+            return
+        table = self.tables[name]
+        if table[1] and table[0] != rows.shape[1]:
+            raise ValueError('Rows of %d values for table %s of %d' %
+                             (rows.shape[1], name, table[0]))
+        table[0] = rows.shape[1]
+        table[1] += sign * len(rows)
+        with np.errstate(over='ignore'):
+            for start in range(0, len(rows), _CHUNK_ROWS):
+                sums = _lane_hashes(rows[start:start + _CHUNK_ROWS]).sum(
+                    axis=0, dtype=np.uint64)
+                if sign < 0:
+                    sums = np.uint64(0) - sums
+                table[2] += sums
+        if table[1] < 0:
+            raise ValueError('More rows removed from %s than added' % name)
+
+
+def _lane_hashes(rows):
+    hashes = np.full(len(rows), rows.shape[1], dtype=np.uint64)
+    for column in rows.T.astype(np.uint64):
+        hashes = _mix(hashes * _GOLDEN + column)
+    return _mix(hashes[:, None] ^ _LANE_KEYS)
+
+
+def _mix(values):
+    # finalizer of SplitMix64
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def find_duplicates(paths, load=None):
+    '''
+    Group ``paths`` by fingerprint. Returns the groups with more than one
+    path, as ``{fingerprint: [path, ...]}``.
+
+    ``load`` turns a path into a SteinlibArrays; pass an InstanceCache's
+    load() to reuse and fill the cache.
+    '''
+    if load is None:
+        from steinlib.arrays import parse_arrays
+        from steinlib.parser import open_stp
+
+        def load(path):
+            with open_stp(path) as stp_file:
+                return parse_arrays(stp_file)
+
+    groups = {}
+    for path in paths:
+        groups.setdefault(fingerprint(load(path)), []).append(path)
+    return dict((key, sorted(group)) for key, group in groups.items()
+                if len(group) > 1)
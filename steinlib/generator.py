@@ -0,0 +1,110 @@
+'''
+Synthetic instances, for tests and benchmarks: random graphs of a given
+size with any combination of the optional sections, reproducible from a
+seed.
+'''
+import io
+
+import numpy as np
+
+from steinlib.arrays import POTENTIAL_TERMINAL, ROOT, TERMINAL, \
+                            SteinlibArrays
+from steinlib.writer import write_stp
+
+
+def generate(nodes=100, edges=300, terminals=10, arcs=0, root=False,
+             potential_terminals=0, dimensions=0, degree_limits=False,
+             presolve=False, max_weight=100, seed=None, name=None):
+    '''
+    Random SteinlibArrays with ``nodes`` nodes, ``edges`` undirected edges
+    and ``arcs`` arcs between random pairs of distinct nodes, weights in
+    ``1..max_weight`` and distinct random terminals.
+
+    With ``root``, the first terminal is a ``RootP``; the last
+    ``potential_terminals`` terminals are ``TP``. ``dimensions`` adds
+    coordinates to every node, ``degree_limits`` a ``MD`` record per node
+    and ``presolve`` presolve bounds and a few ``EC`` records.
+    '''
+    if nodes < 2:
+        raise ValueError('Synthetic instances need at least 2 nodes')
+    if terminals > nodes or potential_terminals + root > terminals:
+        raise ValueError('Too many terminals for %d nodes' % nodes)
+    rng = np.random.RandomState(seed)
+
+    count = edges + arcs
+    tails = rng.randint(1, nodes + 1, count)
+    heads = rng.randint(1, nodes, count)
+    heads += heads >= tails
+    directed = np.zeros(count, dtype=np.bool_)
+    directed[rng.permutation(count)[:arcs]] = True
+
+    terminal_ids = rng.permutation(nodes)[:terminals] + 1
+    kinds = np.full(terminals, TERMINAL, dtype=np.int8)
+    if potential_terminals:
+        kinds[-potential_terminals:] = POTENTIAL_TERMINAL
+    if root and terminals:
+        kinds[0] = ROOT
+
+    coordinates = None
+    if dimensions:
+        coordinates = rng.randint(0, 1000, (nodes, dimensions))
+
+    presolve_values = {}
+    presolve_records = {}
+    if presolve:
+        lower = int(rng.randint(1, 1000))
+        presolve_values = {'lower': lower, 'upper': lower + 10, 'time': 1}
+        fixed = min(3, count)
+        presolve_records['ec'] = np.column_stack((
+            tails[:fixed], heads[:fixed],
+            rng.randint(1, max_weight + 1, fixed)))
+
+    return SteinlibArrays(
+        num_nodes=nodes,
+        edges=np.column_stack((tails, heads,
+                               rng.randint(1, max_weight + 1, count))),
+        directed=directed,
+        terminals=terminal_ids,
+        terminal_kinds=kinds,
+        coordinate_ids=np.arange(1, nodes + 1) if dimensions else None,
+        coordinates=coordinates,
+        maximum_degrees=(rng.randint(1, 6, nodes) if degree_limits
+                         else None),
+        presolve=presolve_values,
+        presolve_records=presolve_records,
+        comment={'name': name or 'synthetic-%s' % seed,
+                 'creator': 'steinlib.generator'})
+
+
+def generate_lines(**kwargs):
+    '''
+    STP lines of a generate() instance, as read from a file.
+    '''
+    stream = io.StringIO()
+    write_stp(generate(**kwargs), stream)
+    stream.seek(0)
+    return stream.readlines()
+
+
+def synthetic_corpus(count, seed=0, scale=1):
+    '''
+    Yield ``(name, lines)`` for ``count`` instances that cycle through the
+    optional sections: arcs with a root, coordinates in 2 and 3
+    dimensions, degree limits, potential terminals and presolve data.
+    ``scale`` multiplies their size.
+    '''
+    variants = (
+        {},
+        {'arcs': 40, 'root': True},
+        {'dimensions': 2},
+        {'dimensions': 3, 'degree_limits': True},
+        {'potential_terminals': 3, 'presolve': True},
+        {'arcs': 20, 'root': True, 'dimensions': 2, 'degree_limits': True,
+         'presolve': True},
+    )
+    for position in range(count):
+        name = 'synthetic-%d' % position
+        kwargs = dict(variants[position % len(variants)])
+        kwargs.update(nodes=50 * scale, edges=120 * scale, terminals=8,
+                      seed=seed + position, name=name)
+        yield name, generate_lines(**kwargs)
@@ -0,0 +1,199 @@
+'''
+Declarative grammar of the STP sections.
+
+A section is declared as a Section with the Record kinds it accepts: the
+keyword, the types of its fields, an optional variadic tail (as the ``DD``
+coordinates) and the callback to call. Section.compile() turns these into
+one converter per keyword, which the section parsers use to match and
+convert a line with a dictionary lookup and a split, instead of trying a
+regular expression per record kind.
+
+See steinlib.section.register_section() to add a section to the parser.
+'''
+import re
+
+from steinlib.state import ParsingState
+
+
+# Field types.
+INT = 'int'        # a non negative integer
+WORD = 'word'      # a token without spaces
+STRING = 'string'  # a double quoted string
+TEXT = 'text'      # the rest of the line
+
+FIELD_TYPES = (INT, WORD, STRING, TEXT)
+
+_FIELD_REGEX = {
+    INT: r'(\d+)',
+    WORD: r'(\S+)',
+    STRING: r'"(.+)"',
+    TEXT: r'(.+)',
+}
+
+_VARIADIC_REGEX = {
+    INT: r'\d+',
+    WORD: r'\S+',
+}
+
+
+class Record(object):
+    '''
+    One kind of line of a section: ``keyword`` followed by ``fields``
+    (field types), and then by any number of ``variadic`` values when given
+    (a bare ``DD`` line is a valid Coordinates record without values).
+
+    The parser calls ``<section callback token>__<callback>`` with the raw
+    line and the converted values, ``callback`` being the lowercase keyword
+    by default, and moves to ``next_state`` afterwards.
+
+    ``bulk`` records are the ones a file can have millions of, which only
+    hold integers; they are the ones readers interested in the metadata
+    can skip, and the ones the array builder collects into tables. They
+    are all the integer-only records, unless told otherwise.
+    '''
+
+    def __init__(self, keyword, fields=(), variadic=None, callback=None,
+                 next_state=ParsingState.inside_section, bulk=None):
+        for field in tuple(fields) + ((variadic,) if variadic else ()):
+            if field not in FIELD_TYPES:
+                raise ValueError('Unknown field type "%s" in record %s' %
+                                 (field, keyword))
+        if variadic not in (None, INT, WORD):
+            raise ValueError('Only INT and WORD fields can be variadic')
+        if variadic and not set(fields) <= set((INT, WORD)):
+            raise ValueError('Variadic records take INT and WORD fields only')
+        self.keyword = keyword
+        self.fields = tuple(fields)
+        self.variadic = variadic
+        self.callback = callback or keyword.lower()
+        self.next_state = next_state
+        if bulk is None:
+            bulk = bool(self.fields or variadic) and \
+                set(self.fields + ((variadic,) if variadic else ())) == \
+                set((INT,))
+        self.bulk = bulk
+
+    @property
+    def arity(self):
+        '''
+        Number of values of the record, ``None`` when it is variadic.
+        '''
+        return None if self.variadic else len(self.fields)
+
+    def compile(self, regex=False):
+        '''
+        Function of a stripped line and its ``line.split(None, 1)`` that
+        returns the converted values, or ``None`` when the line does not
+        match.
+
+        With ``regex``, the line is always matched with one regular
+        expression, as the hand-written section parsers used to do. This is
+        slower, and kept as the reference the split-based converters are
+        checked against (see steinlib.conformance).
+        '''
+        if not regex and set(self.fields) <= set((INT, WORD)):
+            return _split_converter(self.fields, self.variadic)
+        return _regex_converter(self.keyword, self.fields, self.variadic)
+
+
+class Section(object):
+    '''
+    A section of the STP format: its ``name`` as in ``SECTION <name>``, its
+    records and the prefix of their callbacks (the name in snake case by
+    default, e.g. ``maximum_degrees`` for ``MaximumDegrees``). Every
+    section also accepts the ``END`` line that closes it.
+    '''
+
+    def __init__(self, name, records, callback_token=None):
+        self.name = name
+        self.records = tuple(records)
+        self.callback_token = callback_token or _snake_case(name)
+        keywords = [record.keyword.lower() for record in self.records]
+        if len(set(keywords)) != len(keywords):
+            raise ValueError('Repeated keyword in section %s' % name)
+        if 'end' not in keywords:
+            self.records += (Record('END', next_state=ParsingState
+                                    .wait_for_section),)
+
+    def compile(self, regex=False):
+        '''
+        ``{lowercase keyword: (callback method name, converter, next
+        state)}`` for the section parsers. See Record.compile().
+        '''
+        return dict(
+            (record.keyword.lower(),
+             ('%s__%s' % (self.callback_token, record.callback),
+              record.compile(regex), record.next_state))
+            for record in self.records)
+
+    def bulk_keywords(self):
+        return tuple(record.keyword.lower() for record in self.records
+                     if record.bulk)
+
+
+def _snake_case(name):
+    return re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name).lower()
+
+
+def _split_converter(fields, variadic):
+    types = fields
+    size = len(fields)
+
+    def convert(line, words):
+        values = words[1].split() if len(words) > 1 else []
+        if variadic is None:
+            if len(values) != size:
+                return None
+            field_types = types
+        else:
+            if len(values) < size:
+                return None
+            field_types = types + (variadic,) * (len(values) - size)
+        converted = []
+        for field, value in zip(field_types, values):
+            if value.isdigit():
+                try:
+                    converted.append(int(value))
+                    continue
+                except ValueError:
+                    pass
+            if field == INT:
+                return None
+            converted.append(value)
+        return converted
+
+    if variadic is None and set(fields) == set((INT,)):
+        def convert_ints(line, words):
+            values = words[1].split() if len(words) > 1 else []
+            if len(values) != size:
+                return None
+            for value in values:
+                if not value.isdigit():
+                    return None
+            try:
+                return [int(value) for value in values]
+            except ValueError:
+                return None
+        return convert_ints
+    return convert
+
+
+def _regex_converter(keyword, fields, variadic=None):
+    tail = r'((?:\s+%s)*)' % _VARIADIC_REGEX[variadic] if variadic else ''
+    regex = re.compile(
+        r'^%s%s%s$' % (re.escape(keyword),
+                       ''.join(r'\s+' + _FIELD_REGEX[field]
+                               for field in fields),
+                       tail),
+        re.IGNORECASE)
+
+    def convert(line, words):
+        matches = regex.search(line)
+        if not matches:
+            return None
+        tokens = list(matches.groups())
+        if variadic:
+            tokens[-1:] = tokens[-1].split()
+        return [int(token) if token.isdigit() else token
+                for token in tokens]
+    return convert
@@ -0,0 +1,116 @@
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays, TERMINAL
+from steinlib.spatial import obstacle_boxes
+
+
+def hanan_grid(instance):
+    '''
+    Build the Hanan grid of a rectilinear instance, with the obstacles cut
+    out, as a new SteinlibArrays.
+
+    The grid lines go through every ``DD`` point and every side of the
+    ``RR`` obstacles. Grid nodes strictly inside an obstacle are dropped, and
+    so are the grid segments that cross an obstacle interior; segments along
+    an obstacle border are kept. Edge weights are the L1 lengths of the
+    segments.
+
+    Grid nodes are numbered from 1, row by row, skipping the dropped ones,
+    and every one of them gets its ``DD`` coordinates. The terminals of
+    ``instance`` are carried over to the grid nodes at their coordinates;
+    when ``instance`` has no terminals, every ``DD`` point is one.
+    '''
+    if instance.coordinates.shape[1] != 2:
+        raise ValueError('The Hanan grid needs 2D coordinates, got %d.' %
+                         instance.coordinates.shape[1])
+
+    points = instance.coordinates
+    boxes = obstacle_boxes(instance.obstacles)
+    xs = np.unique(np.concatenate((points[:, 0], boxes[:, 0], boxes[:, 2])))
+    ys = np.unique(np.concatenate((points[:, 1], boxes[:, 1], boxes[:, 3])))
+    shape = (len(xs), len(ys))
+
+    # obstacle sides in grid line indexes
+    x_low = np.searchsorted(xs, boxes[:, 0])
+    x_high = np.searchsorted(xs, boxes[:, 2])
+    y_low = np.searchsorted(ys, boxes[:, 1])
+    y_high = np.searchsorted(ys, boxes[:, 3])
+
+    inside = _covered(shape, x_low + 1, x_high - 1, y_low + 1, y_high - 1)
+    horizontal_blocked = _covered((shape[0] - 1, shape[1]), x_low, x_high - 1,
+                                  y_low + 1, y_high - 1)
+    vertical_blocked = _covered((shape[0], shape[1] - 1), x_low + 1,
+                                x_high - 1, y_low, y_high - 1)
+
+    kept = ~inside
+    node_ids = np.zeros(shape, dtype=np.int64)
+    node_ids[kept] = np.arange(1, kept.sum() + 1)
+
+    horizontal = ~horizontal_blocked
+    horizontal_edges = np.column_stack((
+        node_ids[:-1][horizontal],
+        node_ids[1:][horizontal],
+        np.broadcast_to(np.diff(xs)[:, np.newaxis],
+                        horizontal.shape)[horizontal]))
+    vertical = ~vertical_blocked
+    vertical_edges = np.column_stack((
+        node_ids[:, :-1][vertical],
+        node_ids[:, 1:][vertical],
+        np.broadcast_to(np.diff(ys)[np.newaxis, :],
+                        vertical.shape)[vertical]))
+    edges = np.concatenate((horizontal_edges, vertical_edges))
+
+    grid_x, grid_y = np.meshgrid(xs, ys, indexing='ij')
+    coordinates = np.column_stack((grid_x[kept], grid_y[kept]))
+
+    point_nodes = node_ids[np.searchsorted(xs, points[:, 0]),
+                           np.searchsorted(ys, points[:, 1])]
+    if (point_nodes == 0).any():
+        raise ValueError('Some points lie strictly inside an obstacle.')
+    if len(instance.terminals):
+        positions = _positions_of(instance.coordinate_ids, instance.terminals)
+        terminals = point_nodes[positions]
+        terminal_kinds = instance.terminal_kinds
+    else:
+        terminals = point_nodes
+        terminal_kinds = np.full(len(terminals), TERMINAL, dtype=np.int8)
+
+    return SteinlibArrays(
+        num_nodes=len(coordinates),
+        edges=edges,
+        terminals=terminals,
+        terminal_kinds=terminal_kinds,
+        coordinate_ids=np.arange(1, len(coordinates) + 1),
+        coordinates=coordinates,
+        obstacles=instance.obstacles,
+        comment=instance.comment,
+        header=instance.header)
+
+
+def _covered(shape, row_low, row_high, column_low, column_high):
+    '''
+    Mask of the cells of ``shape`` covered by at least one of the inclusive
+    index rectangles, using a 2D difference array instead of one slice
+    assignment per rectangle.
+    '''
+    valid = (row_low <= row_high) & (column_low <= column_high)
+    row_low, row_high = row_low[valid], row_high[valid] + 1
+    column_low, column_high = column_low[valid], column_high[valid] + 1
+
+    counts = np.zeros((shape[0] + 1, shape[1] + 1), dtype=np.int64)
+    np.add.at(counts, (row_low, column_low), 1)
+    np.add.at(counts, (row_low, column_high), -1)
+    np.add.at(counts, (row_high, column_low), -1)
+    np.add.at(counts, (row_high, column_high), 1)
+    counts = counts.cumsum(axis=0).cumsum(axis=1)
+    return counts[:shape[0], :shape[1]] > 0
+
+
+def _positions_of(ids, wanted):
+    order = np.argsort(ids, kind='stable')
+    positions = np.searchsorted(ids, wanted, sorter=order)
+    positions = np.minimum(positions, len(ids) - 1)
+    found = order[positions]
+    if len(wanted) and (ids[found] != wanted).any():
+        raise ValueError('Some terminals have no coordinates.')
+    return found
@@ -0,0 +1,350 @@
+import numpy as np
+
+
+class PackedKeyTable(object):
+    '''
+    Open addressing hash table from unique uint64 keys to int64 values.
+
+    Both building and probing are vectorized: every round handles all the
+    pending keys at once and only the keys that collided go on to the next
+    slot (linear probing), so the number of rounds is bounded by the longest
+    probe sequence and not by the number of keys.
+
+    Keys can be inserted and removed afterwards. A removed key leaves a
+    marker that lookups probe past, until the table is rebuilt as it grows.
+    '''
+    EMPTY = np.uint64(0xFFFFFFFFFFFFFFFF)
+    REMOVED = np.uint64(0xFFFFFFFFFFFFFFFE)
+    _MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+
+    def __init__(self, keys, values):
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.int64)
+        self._bits = max(3, int(2 * len(keys)).bit_length())
+        self._mask = np.uint64((1 << self._bits) - 1)
+        self._keys = np.full(1 << self._bits, self.EMPTY, dtype=np.uint64)
+        self._values = np.full(1 << self._bits, -1, dtype=np.int64)
+        self._size = len(keys)
+        self._removed = 0
+
+        pending = np.arange(len(keys))
+        slots = self._hash(keys)
+        while len(pending):
+            free = self._keys[slots] == self.EMPTY
+            _, first = np.unique(slots[free], return_index=True)
+            winners = np.flatnonzero(free)[first]
+            self._keys[slots[winners]] = keys[pending[winners]]
+            self._values[slots[winners]] = values[pending[winners]]
+
+            losers = np.ones(len(pending), dtype=np.bool_)
+            losers[winners] = False
+            pending = pending[losers]
+            slots = (slots[losers] + np.uint64(1)) & self._mask
+
+    def __len__(self):
+        return self._size
+
+    def lookup(self, keys, missing=-1):
+        '''
+        Values stored for each of ``keys``, or ``missing`` where absent.
+        '''
+        slots = self._slots(np.asarray(keys, dtype=np.uint64))
+        result = np.full(len(slots), missing, dtype=np.int64)
+        found = slots >= 0
+        result[found] = self._values[slots[found]]
+        return result
+
+    def copy(self):
+        table = PackedKeyTable.__new__(PackedKeyTable)
+        table.__dict__.update(self.__dict__)
+        table._keys = self._keys.copy()
+        table._values = self._values.copy()
+        return table
+
+    def insert(self, keys, values):
+        '''
+        Add unique ``keys`` that are not in the table yet, growing it when
+        it gets more than half full.
+        '''
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.int64)
+        if 2 * (self._size + self._removed + len(keys)) > len(self._keys):
+            live = (self._keys != self.EMPTY) & (self._keys != self.REMOVED)
+            self.__init__(np.concatenate((self._keys[live], keys)),
+                          np.concatenate((self._values[live], values)))
+            return
+        pending = np.arange(len(keys))
+        slots = self._hash(keys)
+        while len(pending):
+            free = (self._keys[slots] == self.EMPTY) | \
+                (self._keys[slots] == self.REMOVED)
+            _, first = np.unique(slots[free], return_index=True)
+            winners = np.flatnonzero(free)[first]
+            self._removed -= int(np.count_nonzero(
+                self._keys[slots[winners]] == self.REMOVED))
+            self._keys[slots[winners]] = keys[pending[winners]]
+            self._values[slots[winners]] = values[pending[winners]]
+
+            losers = np.ones(len(pending), dtype=np.bool_)
+            losers[winners] = False
+            pending = pending[losers]
+            slots = (slots[losers] + np.uint64(1)) & self._mask
+        self._size += len(keys)
+
+    def remove(self, keys):
+        '''
+        Remove ``keys`` from the table; they are replaced by markers that
+        lookups probe past. Returns how many were found.
+        '''
+        slots = self._slots(np.asarray(keys, dtype=np.uint64))
+        slots = slots[slots >= 0].astype(np.uint64)
+        self._keys[slots] = self.REMOVED
+        self._values[slots] = -1
+        self._size -= len(slots)
+        self._removed += len(slots)
+        return len(slots)
+
+    def remap(self, mapping):
+        '''
+        Replace every stored value ``v`` by ``mapping[v]``.
+        '''
+        stored = self._values >= 0
+        self._values[stored] = mapping[self._values[stored]]
+
+    def _slots(self, keys):
+        result = np.full(len(keys), -1, dtype=np.int64)
+        pending = np.arange(len(keys))
+        slots = self._hash(keys)
+        while len(pending):
+            stored = self._keys[slots]
+            hits = stored == keys[pending]
+            result[pending[hits]] = slots[hits]
+
+            unresolved = ~hits & (stored != self.EMPTY)
+            pending = pending[unresolved]
+            slots = (slots[unresolved] + np.uint64(1)) & self._mask
+        return result
+
+    def _hash(self, keys):
+        # Fibonacci hashing: the top bits of the product are well mixed even
+        # when the packed node ids are small and sequential.
+        shift = np.uint64(64 - self._bits)
+        return (keys * self._MULTIPLIER) >> shift
+
+
+class EdgeIndex(object):
+    '''
+    Constant time lookup of the ``edges`` row that joins two nodes.
+
+    Undirected ``E`` records are keyed by ``(min(u, v), max(u, v))`` and
+    ``A`` arcs by the ordered ``(tail, head)`` pair, each packed into a single
+    64 bit integer. A query ``(u, v)`` matches an edge in either orientation
+    or an arc from ``u`` to ``v``.
+
+    When the same pair is given more than once, the first record is the one
+    that is indexed and the others are listed in ``duplicates``.
+    '''
+
+    def __init__(self, edges, directed):
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 3)
+        directed = np.asarray(directed, dtype=np.bool_)
+        _check_ids(edges[:, :2])
+        self._edges = edges
+        self._shared = False
+
+        positions = np.arange(len(edges), dtype=np.int64)
+        duplicates = []
+        self._edge_table, dups = self._build_table(
+            edges[~directed], positions[~directed], ordered=False)
+        duplicates.append(dups)
+        self._arc_table, dups = self._build_table(
+            edges[directed], positions[directed], ordered=True)
+        duplicates.append(dups)
+        self.duplicates = np.sort(np.concatenate(duplicates))
+
+    def __len__(self):
+        return len(self._edge_table) + len(self._arc_table)
+
+    def __contains__(self, pair):
+        return self.position(*pair) is not None
+
+    @property
+    def has_duplicates(self):
+        return len(self.duplicates) > 0
+
+    @property
+    def parallel(self):
+        '''
+        The subset of ``duplicates`` whose weight differs from the indexed
+        record, i.e. parallel edges rather than plain repeated lines.
+        '''
+        if not self.has_duplicates:
+            return self.duplicates
+        dups = self.duplicates
+        kept = self.find(self._edges[dups, 0], self._edges[dups, 1])
+        weights = self._edges[:, 2]
+        return dups[weights[dups] != weights[kept]]
+
+    def find(self, tails, heads):
+        '''
+        Row of ``edges`` for every ``(tails[i], heads[i])`` pair, -1 when
+        there is no such edge or arc.
+        '''
+        tails = np.asarray(tails, dtype=np.int64)
+        heads = np.asarray(heads, dtype=np.int64)
+        low = np.minimum(tails, heads)
+        high = np.maximum(tails, heads)
+        # ids that could never have been indexed are a plain miss
+        valid = (low >= 0) & (high < _ID_LIMIT)
+        low = np.where(valid, low, 0)
+        high = np.where(valid, high, 0)
+        tails = np.where(valid, tails, 0)
+        heads = np.where(valid, heads, 0)
+
+        result = self._edge_table.lookup(_pack(low, high))
+
+        missing = np.flatnonzero(result < 0)
+        if len(missing) and len(self._arc_table):
+            result[missing] = self._arc_table.lookup(
+                _pack(tails[missing], heads[missing]))
+        result[~valid] = -1
+        return result
+
+    def contains(self, tails, heads):
+        return self.find(tails, heads) >= 0
+
+    def weights(self, tails, heads, missing=-1):
+        '''
+        Weight of every ``(tails[i], heads[i])`` pair, ``missing`` when the
+        pair is not an edge.
+        '''
+        positions = self.find(tails, heads)
+        found = positions >= 0
+        result = np.full(len(positions), missing, dtype=np.int64)
+        result[found] = self._edges[positions[found], 2]
+        return result
+
+    def position(self, tail, head):
+        position = int(self.find([tail], [head])[0])
+        return position if position >= 0 else None
+
+    def weight(self, tail, head):
+        position = self.position(tail, head)
+        if position is None:
+            return None
+        return int(self._edges[position, 2])
+
+    def reweighted(self, edges):
+        '''
+        EdgeIndex of ``edges``, which only differ from the indexed ones by
+        their weights. The hash tables are shared with this index.
+        '''
+        index = EdgeIndex.__new__(EdgeIndex)
+        index.__dict__.update(self.__dict__)
+        index._edges = edges
+        index._shared = self._shared = True
+        return index
+
+    def updated(self, edges, directed, old_directed, removed, mapping,
+                copy=True):
+        '''
+        EdgeIndex of ``edges``: the rows of the indexed ones (whose
+        ``directed`` flags were ``old_directed``) except the ``removed``
+        ones, renumbered by ``mapping`` from old to new rows, followed by
+        new rows. Only the keys of the removed and new rows are
+        hashed. With ``copy``, this index is left as it is.
+        '''
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 3)
+        directed = np.asarray(directed, dtype=np.bool_)
+        old_edges = self._edges
+        removed = np.unique(np.asarray(removed, dtype=np.int64))
+        index = EdgeIndex.__new__(EdgeIndex)
+        index._edges = edges
+        index._shared = False
+        copy = copy or self._shared
+        index._edge_table = self._edge_table.copy() if copy \
+            else self._edge_table
+        index._arc_table = self._arc_table.copy() if copy \
+            else self._arc_table
+
+        duplicate = np.zeros(len(old_edges), dtype=np.bool_)
+        duplicate[self.duplicates] = True
+        gone = np.zeros(len(old_edges), dtype=np.bool_)
+        gone[removed] = True
+        indexed_gone = removed[~duplicate[removed]]
+        duplicates = self.duplicates[~gone[self.duplicates]]
+        old_directed = np.asarray(old_directed, dtype=np.bool_)
+
+        # a duplicate takes the place of the removed record of its pair
+        taking_over = []
+        for table, ordered in ((index._edge_table, False),
+                               (index._arc_table, True)):
+            rows = indexed_gone[old_directed[indexed_gone] == ordered]
+            if not len(rows):
+                continue
+            keys = _keys(old_edges[rows], ordered)
+            table.remove(keys)
+            candidates = duplicates[old_directed[duplicates] == ordered]
+            candidate_keys = _keys(old_edges[candidates], ordered)
+            matching = np.isin(candidate_keys, keys)
+            keys, first = np.unique(candidate_keys[matching],
+                                    return_index=True)
+            rows = candidates[matching][first]
+            table.insert(keys, rows)
+            taking_over.append(rows)
+        if taking_over:
+            duplicates = np.setdiff1d(duplicates,
+                                      np.concatenate(taking_over))
+
+        index._edge_table.remap(mapping)
+        index._arc_table.remap(mapping)
+        duplicates = [mapping[duplicates]]
+
+        start = len(old_edges) - len(removed)
+        _check_ids(edges[start:, :2])
+        positions = np.arange(start, len(edges), dtype=np.int64)
+        for table, ordered in ((index._edge_table, False),
+                               (index._arc_table, True)):
+            new = positions[directed[start:] == ordered]
+            keys = _keys(edges[new], ordered)
+            known = table.lookup(keys) >= 0
+            duplicates.append(new[known])
+            keys, new = keys[~known], new[~known]
+            unique_keys, first = np.unique(keys, return_index=True)
+            table.insert(unique_keys, new[first])
+            repeated = np.ones(len(new), dtype=np.bool_)
+            repeated[first] = False
+            duplicates.append(new[repeated])
+        index.duplicates = np.sort(np.concatenate(duplicates))
+        return index
+
+    def _build_table(self, records, positions, ordered):
+        keys = _keys(records, ordered)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        repeated = np.zeros(len(keys), dtype=np.bool_)
+        repeated[1:] = sorted_keys[1:] == sorted_keys[:-1]
+        first = order[~repeated]
+        table = PackedKeyTable(keys[first], positions[first])
+        return table, positions[order[repeated]]
+
+
+_ID_LIMIT = 0xFFFFFFFF
+
+
+def _keys(records, ordered):
+    if ordered:
+        return _pack(records[:, 0], records[:, 1])
+    return _pack(np.minimum(records[:, 0], records[:, 1]),
+                 np.maximum(records[:, 0], records[:, 1]))
+
+
+def _check_ids(pairs):
+    if pairs.size and (pairs.min() < 0 or pairs.max() >= _ID_LIMIT):
+        raise ValueError('Node ids must fit in 32 bits to be indexed.')
+
+
+def _pack(high, low):
+    high = np.asarray(high, dtype=np.int64).astype(np.uint64)
+    low = np.asarray(low, dtype=np.int64).astype(np.uint64)
+    return (high << np.uint64(32)) | low
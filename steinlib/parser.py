@@ -1,15 +1,12 @@
-import argparse
+import os
 import re
+import threading
+import time
 
-from steinlib.exceptions import SteinlibParsingException, \
+from steinlib.exceptions import ParsingCancelledException, \
+                                SteinlibParsingException, \
                                 UnrecognizedSectionException
-from steinlib.section import CoordinatesSectionParser, \
-                             CommentSectionParser, \
-                             GraphSectionParser, \
-                             MaximumDegreesSectionParser, \
-                             ObstaclesSectionParser, \
-                             PresolveSectionParser, \
-                             TerminalsSectionParser
+from steinlib.section import SECTIONS
 
 from steinlib.state import ParsingState
 
@@ -62,18 +59,13 @@ class RootEofParser(RootParser):
 class RootSectionParser(RootParser):
     '''
     Aggregates the Secion parsers and call the appropriate classes.
+
+    ``section_parsers`` is the mapping of the section registry, so the
+    sections added with steinlib.section.register_section() are known too.
     '''
     token_regex = r'^SECTION(?:\s+)(\w+)$'
     callback_method = 'section'
-    section_parsers = {
-        'Comment': CommentSectionParser,
-        'Coordinates': CoordinatesSectionParser,
-        'Graph': GraphSectionParser,
-        'MaximumDegrees': MaximumDegreesSectionParser,
-        'Obstacles': ObstaclesSectionParser,
-        'Presolve': PresolveSectionParser,
-        'Terminals': TerminalsSectionParser,
-    }
+    section_parsers = SECTIONS.parsers
 
     @classmethod
     def get_section_parser(cls, line, steiner_instance):
@@ -99,58 +91,266 @@ class RootSectionParser(RootParser):
         return section_parser
 
 
+class Diagnostic(object):
+    '''
+    A problem found by the tolerant parser: where it is and what is wrong.
+
+    ``offset`` is the position of the line start, counted in characters of
+    the given lines, which is the byte offset for ASCII STP files.
+    '''
+
+    def __init__(self, line_number, offset, line, message):
+        self.line_number = line_number
+        self.offset = offset
+        self.line = line
+        self.message = message
+
+    def __repr__(self):
+        return 'Diagnostic(line_number=%r, offset=%r, line=%r, message=%r)' % (
+            self.line_number, self.offset, self.line, self.message)
+
+    def __str__(self):
+        return 'line %s (offset %s): %s' % (self.line_number, self.offset,
+                                            self.message)
+
+
+class ParseProgress(object):
+    '''
+    What the progress callback of SteinlibParser is given: the number of
+    ``lines`` read, the ``position`` in the input and its ``total`` size
+    when known, the ``elapsed`` seconds, and ``done`` on the last report.
+
+    Positions count characters, as Diagnostic offsets do, except for
+    gzipped files where they are bytes of the compressed file.
+    '''
+
+    def __init__(self, lines, position, total, elapsed, done=False):
+        self.lines = lines
+        self.position = position
+        self.total = total
+        self.elapsed = elapsed
+        self.done = done
+
+    @property
+    def fraction(self):
+        if not self.total:
+            return None
+        return min(float(self.position) / self.total, 1.0)
+
+    @property
+    def eta(self):
+        '''
+        Estimated seconds left, from the rate so far, or None while unknown.
+        '''
+        if self.done:
+            return 0.0
+        if not self.total or not self.position:
+            return None
+        left = max(self.total - self.position, 0)
+        return self.elapsed * left / self.position
+
+    def __repr__(self):
+        return 'ParseProgress(lines=%r, position=%r, total=%r, elapsed=%r, ' \
+            'done=%r)' % (self.lines, self.position, self.total, self.elapsed,
+                          self.done)
+
+
+class CancellationToken(object):
+    '''
+    Lets another thread stop a parse: SteinlibParser checks ``cancelled``
+    between chunks of lines and raises a ParsingCancelledException once it
+    is set.
+    '''
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+
 class SteinlibParser(object):
     '''
     Parser for the SteinLib format.
+
+    By default the first problem raises a SteinlibParsingException, which
+    knows the line number and offset where it happened. With
+    ``tolerant=True`` the problems are collected in ``diagnostics`` instead
+    and parsing goes on: bad lines inside a section are skipped, unknown
+    sections are skipped up to their ``END``, and a ``SECTION`` or ``EOF``
+    line closes a section with a missing ``END``.
+
+    ``progress`` is called with a ParseProgress every ``progress_bytes``
+    characters or ``progress_lines`` lines, whichever comes first, and once
+    more at the end. The total size is known for files and sequences of
+    lines, or can be given as ``total_size``. Parsing stops with a
+    ParsingCancelledException once the ``cancel`` token (see
+    CancellationToken) is cancelled. Both are checked every
+    ``check_lines`` lines only, to keep the main loop fast.
     '''
     comment_symbol = '#'
+    root_section_parser = RootSectionParser
+    check_lines = 4096
 
-    def __init__(self, lines, steiner_instance):
+    def __init__(self, lines, steiner_instance, tolerant=False,
+                 progress=None, progress_bytes=1 << 20, progress_lines=None,
+                 cancel=None, total_size=None):
         self._lines = lines
         self._state = ParsingState.wait_for_header
         self._steiner_instance = steiner_instance
+        self._section_class = None
+        self._tolerant = tolerant
+        self._progress = progress
+        self._progress_bytes = progress_bytes
+        self._progress_lines = progress_lines
+        self._cancel = cancel
+        self._total_size = total_size
+        self.diagnostics = []
 
     def parse(self):
         '''
         Main parsing loop.
         '''
-        section_class = None
+        line_number = 0
+        offset = 0
+        self._start_checks()
 
         for raw_line in self._lines:
+            line_number += 1
+            offset += len(raw_line)
+            if line_number == self._next_check:
+                self._check(line_number, offset)
             line = self._cleanup_line(raw_line)
 
             if not line or self._is_comment(line):
                 continue
 
-            if self._state == ParsingState.wait_for_header:
-                _ = RootHeaderParser.matches(line, self._steiner_instance)
-                self._state = ParsingState.wait_for_section
+            try:
+                self._parse_line(line)
+            except SteinlibParsingException as ex:
+                ex.locate(line_number, offset - len(raw_line))
+                if not self._tolerant:
+                    raise
+                self._recover(ex, line)
 
-            elif self._state == ParsingState.wait_for_section:
-                try:
-                    section_class = RootSectionParser.get_section_parser(
-                                        line, self._steiner_instance)
-                    self._state = section_class.section_start(line)
+        if self._progress is not None:
+            self._report_progress(line_number, offset, done=True)
 
-                except UnrecognizedSectionException as ex:
-                    raise ex  # pragma: no cover
+        if self._state != ParsingState.end:
+            ex = SteinlibParsingException('Illegal state.')
+            ex.locate(line_number, offset)
+            if not self._tolerant:
+                raise ex
+            self._report(ex, None)
 
-                except SteinlibParsingException as ex:
-                    if RootEofParser.matches(line, self._steiner_instance):
-                        self._state = ParsingState.end
+        return self._steiner_instance
 
-            elif self._state == ParsingState.inside_section:
-                self._state = section_class.parse_token(
-                                line, self._steiner_instance)
+    def _start_checks(self):
+        self._next_check = -1
+        if self._progress is None and self._cancel is None:
+            return
+        if self._cancel is not None and self._cancel.cancelled:
+            raise ParsingCancelledException(0, 0)
+        self._chunk = self.check_lines
+        if self._progress_lines:
+            self._chunk = min(self._chunk, self._progress_lines)
+        self._next_check = self._chunk
+        self._started = time.perf_counter()
+        self._reported = (0, 0)
+        self._position = None
+        if self._progress is not None and self._total_size is None:
+            self._total_size, self._position = _input_size(self._lines)
+
+    def _check(self, line_number, offset):
+        self._next_check = line_number + self._chunk
+        if self._cancel is not None and self._cancel.cancelled:
+            raise ParsingCancelledException(line_number, offset)
+        if self._progress is None:
+            return
+        lines, characters = self._reported
+        if offset - characters >= self._progress_bytes or (
+                self._progress_lines and
+                line_number - lines >= self._progress_lines):
+            self._report_progress(line_number, offset)
+
+    def _report_progress(self, line_number, offset, done=False):
+        self._reported = (line_number, offset)
+        position = self._position() if self._position else offset
+        total = self._total_size
+        if done and total is not None:
+            position = total
+        self._progress(ParseProgress(line_number, position, total,
+                                     time.perf_counter() - self._started,
+                                     done))
+
+    def _parse_line(self, line):
+        if self._state == ParsingState.wait_for_header:
+            _ = RootHeaderParser.matches(line, self._steiner_instance)
+            self._state = ParsingState.wait_for_section
+
+        elif self._state == ParsingState.wait_for_section:
+            try:
+                self._section_class = \
+                    self.root_section_parser.get_section_parser(
+                        line, self._steiner_instance)
+                self._state = self._section_class.section_start(line)
+
+            except UnrecognizedSectionException as ex:
+                raise ex  # pragma: no cover
+
+            except SteinlibParsingException as ex:
+                if RootEofParser.matches(line, self._steiner_instance):
+                    self._state = ParsingState.end
+
+        elif self._state == ParsingState.inside_section:
+            self._state = self._section_class.parse_token(
+                            line, self._steiner_instance)
+
+        elif self._state == ParsingState.skip_section:
+            if re.search(r'^END$', line, re.IGNORECASE):
+                self._state = ParsingState.wait_for_section
+            elif self._is_resync_line(line):
+                self._state = ParsingState.wait_for_section
+                self._parse_line(line)
 
-            elif self._state == ParsingState.end:
-                # See test.test_parser.test_unexpected_eof()
-                raise SteinlibParsingException('Unexpected "EOF".')
+        elif self._state == ParsingState.end:
+            # See test.test_parser.test_unexpected_eof()
+            raise SteinlibParsingException('Unexpected "EOF".')
 
-        if self._state != ParsingState.end:
-            raise SteinlibParsingException('Illegal state.')
-
-        return self._steiner_instance
+    def _recover(self, ex, line):
+        '''
+        Record the problem and bring the parser back to a state where the
+        next lines make sense.
+        '''
+        self._report(ex, line)
+
+        if isinstance(ex, UnrecognizedSectionException):
+            self._state = ParsingState.skip_section
+
+        elif self._state in (ParsingState.inside_section,
+                             ParsingState.wait_for_header) and \
+                self._is_resync_line(line):
+            missing = ('END' if self._state == ParsingState.inside_section
+                       else 'header')
+            self.diagnostics[-1].message = 'Missing %s before: %s' % (
+                missing, line)
+            self._state = ParsingState.wait_for_section
+            try:
+                self._parse_line(line)
+            except SteinlibParsingException as again:
+                again.locate(ex.line_number, ex.offset)
+                self._recover(again, line)
+
+    def _report(self, ex, line):
+        self.diagnostics.append(Diagnostic(ex.line_number, ex.offset, line,
+                                           ex.message))
+
+    def _is_resync_line(self, line):
+        return bool(re.search(r'^(SECTION\s|EOF$)', line, re.IGNORECASE))
 
     def _cleanup_line(self, line):
         '''
@@ -163,3 +363,29 @@ class SteinlibParser(object):
         Check if a given line is a comment.
         '''
         return line.startswith(self.comment_symbol)
+
+
+def _input_size(lines):
+    '''
+    Size of the input of a parse, and for gzipped files a function telling
+    how much of the compressed file was read: ``(None, None)`` when unknown.
+    '''
+    if isinstance(lines, (list, tuple)):
+        return sum(len(line) for line in lines), None
+    compressed = getattr(getattr(lines, 'buffer', None), 'fileobj', None)
+    try:
+        if compressed is not None:
+            return os.fstat(compressed.fileno()).st_size, compressed.tell
+        return os.fstat(lines.fileno()).st_size, None
+    except (AttributeError, OSError, ValueError):
+        return None, None
+
+
+def open_stp(path):
+    '''
+    Open an STP file for reading as text, decompressing ``.gz`` files.
+    '''
+    if path.endswith('.gz'):
+        import gzip
+        return gzip.open(path, 'rt')
+    return open(path)
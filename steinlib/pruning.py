@@ -0,0 +1,159 @@
+'''
+Removal of the parts of an instance that cannot belong to any solution:
+connected components without terminals and, for instances with arcs and a
+``RootP`` root, the nodes that the root cannot reach.
+'''
+import numpy as np
+
+from steinlib._ranges import expand_ranges
+from steinlib.arrays import SteinlibArrays
+
+
+def connected_components(instance):
+    '''
+    Label of the connected component of every node id, ignoring the
+    direction of arcs: an array of length ``id_bound`` where two ids have
+    the same label when they are connected. The label of a component is
+    its smallest node id.
+
+    This is a vectorized union-find: every round hooks, for all the links
+    at once, the larger of the two roots onto the smaller one, then
+    flattens the trees by pointer jumping, until no link joins two trees.
+    '''
+    parent = np.arange(instance.id_bound, dtype=np.int64)
+    tails, heads = instance.edges[:, 0], instance.edges[:, 1]
+    while True:
+        tail_roots, head_roots = parent[tails], parent[heads]
+        joining = tail_roots != head_roots
+        if not joining.any():
+            return parent
+        low = np.minimum(tail_roots[joining], head_roots[joining])
+        high = np.maximum(tail_roots[joining], head_roots[joining])
+        np.minimum.at(parent, high, low)
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+        tails, heads = tails[joining], heads[joining]
+
+
+def reachable_from(instance, sources):
+    '''
+    Mask over node ids of the nodes reachable from ``sources`` following
+    the arcs forward and the edges both ways, by a breadth first search
+    over the CSR adjacency that expands a whole frontier at a time.
+    '''
+    indptr, indices, _ = instance.csr()
+    seen = np.zeros(instance.id_bound, dtype=np.bool_)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    seen[frontier] = True
+    while len(frontier):
+        starts = indptr[frontier]
+        neighbours = indices[expand_ranges(starts,
+                                           indptr[frontier + 1] - starts)]
+        frontier = np.unique(neighbours[~seen[neighbours]])
+        seen[frontier] = True
+    return seen
+
+
+class PruneResult(object):
+    '''
+    Outcome of prune():
+
+     - ``instance``: the pruned SteinlibArrays, with dense node ids
+       ``0..n-1`` and ``original_ids`` pointing back to the file ids;
+     - ``node_ids``: for every new node, its id in the input instance;
+     - ``node_map``: the other way around, the new id of every input node
+       id, or -1 for the pruned ones;
+     - ``edge_ids``: for every new ``edges`` row, its row in the input;
+     - ``metrics``: counts before and after, and what was dropped why.
+    '''
+
+    def __init__(self, instance, node_ids, node_map, edge_ids, metrics):
+        self.instance = instance
+        self.node_ids = node_ids
+        self.node_map = node_map
+        self.edge_ids = edge_ids
+        self.metrics = metrics
+
+
+def prune(instance, use_root=True):
+    '''
+    Drop the connected components without terminals and, when the instance
+    has arcs and a ``RootP`` root (and ``use_root`` is true), every node
+    the root cannot reach, with the links, terminals, coordinates and
+    degree limits of the dropped nodes.
+
+    Unreachable terminals make a rooted instance infeasible; they are
+    dropped too but counted in ``metrics['dropped_terminals']``. Obstacles,
+    presolve data and extra records are kept as they are.
+    '''
+    first_id = instance.first_id
+    labels = connected_components(instance)
+    nodes = np.zeros(instance.id_bound, dtype=np.bool_)
+    nodes[first_id:instance.num_nodes + first_id] = True
+    nodes[instance.edges[:, :2].ravel()] = True
+
+    keep = nodes & np.isin(labels, labels[instance.terminals])
+    metrics = {'components': int(len(np.unique(labels[nodes]))),
+               'terminal_free_nodes': int(np.count_nonzero(nodes & ~keep))}
+
+    root = instance.root
+    if use_root and root is not None and instance.num_arcs:
+        reachable = reachable_from(instance, [root])
+        metrics['unreachable_nodes'] = int(np.count_nonzero(
+            keep & ~reachable))
+        keep &= reachable
+
+    node_ids = np.flatnonzero(keep)
+    mapping = np.full(instance.id_bound, -1, dtype=np.int64)
+    mapping[node_ids] = np.arange(len(node_ids))
+
+    edges = instance.edges
+    edge_ids = np.flatnonzero(keep[edges[:, 0]] & keep[edges[:, 1]])
+    kept_terminals = keep[instance.terminals]
+    kept_coordinates = keep[instance.coordinate_ids]
+
+    degrees = instance.maximum_degrees
+    if len(degrees):
+        records = node_ids - first_id
+        known = records < len(degrees)
+        degrees = np.zeros(len(node_ids), dtype=np.int64)
+        degrees[known] = instance.maximum_degrees[records[known]]
+
+    pruned = SteinlibArrays(
+        num_nodes=len(node_ids),
+        edges=np.column_stack((mapping[edges[edge_ids, 0]],
+                               mapping[edges[edge_ids, 1]],
+                               edges[edge_ids, 2])),
+        directed=instance.directed[edge_ids],
+        terminals=mapping[instance.terminals[kept_terminals]],
+        terminal_kinds=instance.terminal_kinds[kept_terminals],
+        coordinate_ids=mapping[instance.coordinate_ids[kept_coordinates]],
+        coordinates=instance.coordinates[kept_coordinates],
+        obstacles=instance.obstacles,
+        maximum_degrees=degrees,
+        presolve=instance.presolve,
+        presolve_records=instance.presolve_records,
+        extra_records=instance.extra_records,
+        comment=instance.comment,
+        header=instance.header,
+        original_ids=instance.to_original_ids(node_ids),
+        memory_budget=instance.memory_budget)
+
+    nodes_before = int(np.count_nonzero(nodes))
+    metrics.update({
+        'nodes_before': nodes_before,
+        'nodes_after': len(node_ids),
+        'links_before': len(edges),
+        'links_after': len(edge_ids),
+        'terminals_before': len(instance.terminals),
+        'terminals_after': int(np.count_nonzero(kept_terminals)),
+        'dropped_terminals': int(np.count_nonzero(~kept_terminals)),
+        'node_reduction': (1.0 - float(len(node_ids)) / nodes_before
+                           if nodes_before else 0.0),
+        'link_reduction': (1.0 - float(len(edge_ids)) / len(edges)
+                           if len(edges) else 0.0),
+    })
+    return PruneResult(pruned, node_ids, mapping, edge_ids, metrics)
@@ -1,187 +1,167 @@
-import re
-
 from steinlib.exceptions import SteinlibParsingException
+from steinlib.grammar import INT, STRING, TEXT, Record, Section
 from steinlib.state import ParsingState
 
 
 class SectionParser(object):
     """
-    Superclass for all the sections parsing.
+    Superclass for all the section parsers. Subclasses define
+    ``parse_token(line, steiner_instance)``, which handles one line of the
+    section and returns the next parsing state. The sections of the format
+    are GrammarSectionParser subclasses, see register_section().
     """
-    DEFAULT_SECTION_END = {'regex': r"^END$",
-                           'next_state': ParsingState.wait_for_section}
 
     @classmethod
     def section_start(cls, line):
         return ParsingState.inside_section
 
-    @classmethod
-    def _convert_int_digits_when_possible(cls, tokens):
-        '''
-        Cast numbers to provide better callback arguments with actual numbers
-        and not string representations.
-        '''
-        converted_tokens = []
-        for t in tokens:
-            converted_tokens.append(int(t) if t.isdigit() else t)
-
-        return converted_tokens
-
-    @classmethod
-    def _get_regex_for_token(cls, token, meta, line):
-        '''
-        Provide a hook to collect the regex. Important because sections can
-        override it and have custom implementations to create dynamic regex.
-
-        See a custom implementation in CoordinatesSectionParser.
-        '''
-        return meta['regex']
 
-    @classmethod
-    def _get_parsed_tokens(cls, line):
-        matching_name = None
-        extracted_tokens = None
-        next_state = ParsingState.inside_section
-        known_tokens = cls._get_known_tokens()
-
-        for name, meta in known_tokens.items():
-            token_regex = cls._get_regex_for_token(name, meta, line)
-            matches = re.search(token_regex, line, re.IGNORECASE)
-            if matches:
-                matching_name = name
-                extracted_tokens = matches.groups()
-                next_state = meta.get('next_state',
-                                      ParsingState.inside_section)
-
-        return matching_name, extracted_tokens, next_state
+class GrammarSectionParser(SectionParser):
+    """
+    Section parser compiled from a steinlib.grammar.Section: the first word
+    of a line picks its record, whose converter checks and converts the
+    values in one go.
+    """
+    section = None
+    _records = {}
 
     @classmethod
     def parse_token(cls, line, steiner_instance):
-        name, tokens, next_state = cls._get_parsed_tokens(line)
-
-        if name:
-            method_name = "%s__%s" % (cls.callback_token, name)
-            converted_tokens = cls._convert_int_digits_when_possible(tokens)
-            callback = getattr(steiner_instance, method_name)
-            callback(line, converted_tokens)
-        else:
+        words = line.split(None, 1)
+        record = cls._records.get(words[0].lower()) if words else None
+        tokens = record[1](line, words) if record else None
+
+        if tokens is None:
             raise SteinlibParsingException(
                 "Error parsing the following line: %s" % line)
+        callback = getattr(steiner_instance, record[0])
+        callback(line, tokens)
 
-        return next_state
-
-
-class CommentSectionParser(SectionParser):
-    callback_token = "comment"
-
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            "name": {'regex': r"^Name(?:\s+)\"(.+)\"$"},
-            "creator": {'regex': r"^Creator(?:\s+)\"(.+)\"$"},
-            "remark": {'regex': r"^Remark(?:\s+)\"(.+)\"$"},
-            "problem": {'regex': r"^Problem(?:\s+)\"(.+)\"$"},
-            "end": SectionParser.DEFAULT_SECTION_END
-        }
-
-
-class CoordinatesSectionParser(SectionParser):
-    callback_token = "coordinates"
+        return record[2]
 
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            "dd": {},
-            "end": SectionParser.DEFAULT_SECTION_END
-        }
-
-    @classmethod
-    def _get_regex_for_token(cls, token, meta, line):
-        token_regex = meta.get('regex', None)
 
-        if token == "dd":
-            token_regex = cls._get_dd_regex(token, meta, line)
-
-        return token_regex
+class SectionRegistry(object):
+    """
+    The sections known to the parser, by name as in ``SECTION <name>``.
+    ``parsers`` maps the names to their parser classes.
+    """
 
-    @classmethod
-    def _get_dd_regex(cls, token, meta, line):
+    def __init__(self):
+        self.sections = {}
+        self.parsers = {}
+
+    def register(self, section, replace=False):
+        """
+        Compile a steinlib.grammar.Section into a GrammarSectionParser
+        subclass and make it known to the parser. Returns the class.
+        """
+        if section.name in self.parsers and not replace:
+            raise ValueError('Section "%s" is already registered' %
+                             section.name)
+        parser = _compile_parser(section)
+        self.sections[section.name] = section
+        self.parsers[section.name] = parser
+        return parser
+
+    def reference_parsers(self):
         '''
-        This function count how many tokens the dd line contain and
-        validate as all of them are numbers.
+        Parsers of the registered sections that match every line with a
+        regular expression (see steinlib.grammar.Record.compile()), by
+        section name.
         '''
-        token_count = len(line.split()[1:])  # ignore the first "DD"
-        token_regex = r'^DD%s$' % (token_count * r'\s+(\d+)')
-        return token_regex
+        return dict((name, _compile_parser(section, regex=True))
+                    for name, section in self.sections.items())
 
+    def unregister(self, name):
+        del self.sections[name]
+        del self.parsers[name]
 
-class GraphSectionParser(SectionParser):
-    callback_token = "graph"
+    def bulk_keywords(self):
+        """
+        ``{lowercase section name: (lowercase bulk keywords, ...)}``.
+        """
+        return dict((name.lower(), section.bulk_keywords())
+                    for name, section in self.sections.items())
 
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            "obstacles": {'regex': r"^Obstacles(?:\s+)(.+)$"},
-            "nodes": {'regex': r"^Nodes\s+(\d+)$"},
-            "edges": {'regex': r"^Edges\s+(\d+)$"},
-            "arcs": {'regex': r"^Arcs\s+(\d+)$"},
-            "e": {'regex': r"^E\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            "a": {'regex': r"^A\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            "end": SectionParser.DEFAULT_SECTION_END,
-        }
+    def bulk_records(self):
+        """
+        ``(section, record)`` pairs of the fixed arity bulk records.
+        """
+        return [(section, record)
+                for _, section in sorted(self.sections.items())
+                for record in section.records
+                if record.bulk and record.arity is not None]
 
 
-class MaximumDegreesSectionParser(SectionParser):
-    callback_token = "maximum_degrees"
+def _compile_parser(section, regex=False):
+    return type('%sSectionParser' % section.name, (GrammarSectionParser,),
+                {'callback_token': section.callback_token,
+                 'section': section,
+                 '_records': section.compile(regex),
+                 '__module__': __name__})
 
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            "md": {'regex': r"^MD\s+(\d+)$"},
-            "end": SectionParser.DEFAULT_SECTION_END
-        }
 
+SECTIONS = SectionRegistry()
 
-class PresolveSectionParser(SectionParser):
-    callback_token = "presolve"
-
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            "fixed": {'regex': r"^FIXED\s+(\d+)$"},
-            "lower": {'regex': r"^LOWER\s+(\d+)$"},
-            "upper": {'regex': r"^UPPER\s+(\d+)$"},
-            "time": {'regex': r"^TIME\s+(\d+)$"},
-            "orgnodes": {'regex': r"^ORGNODES\s+(\d+)$"},
-            "orgedges": {'regex': r"^ORGEDGES\s+(\d+)$"},
-            "ea": {'regex': r"^EA\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            "ec": {'regex': r"^EC\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            "ed": {'regex': r"^ED\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            "es": {'regex': r"^ES\s+(\d+)\s+(\d+)$"},
-            "end": SectionParser.DEFAULT_SECTION_END
-        }
-
-
-class ObstaclesSectionParser(SectionParser):
-    callback_token = "obstacles"
-
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            'rr': {'regex': r"^RR\s+(\d+)\s+(\d+)\s+(\d+)\s+(\d+)$"},
-            'end': SectionParser.DEFAULT_SECTION_END,
-        }
 
+def register_section(name, records, callback_token=None, replace=False):
+    """
+    Declare a new section of the format, e.g. node weights::
 
-class TerminalsSectionParser(SectionParser):
-    callback_token = "terminals"
+        register_section('NodeWeights', [Record('NW', (INT, INT))])
 
-    @classmethod
-    def _get_known_tokens(cls):
-        return {
-            'terminals': {'regex': r"^Terminals\s+(\d+)$"},
-            'rootp': {'regex': r"^RootP\s+(\d+)$"},
-            't': {'regex': r"^T\s+(\d+)$"},
-            'tp': {'regex': r"^TP\s+(\d+)$"},
-            'end': SectionParser.DEFAULT_SECTION_END,
-        }
+    makes the parser accept ``SECTION NodeWeights`` and call
+    ``node_weights__nw(line, [node, weight])`` for every ``NW`` line.
+    Returns the compiled parser class.
+    """
+    return SECTIONS.register(Section(name, records, callback_token),
+                             replace)
+
+
+CommentSectionParser = register_section('Comment', [
+    Record('Name', (STRING,)),
+    Record('Creator', (STRING,)),
+    Record('Remark', (STRING,)),
+    Record('Problem', (STRING,)),
+])
+
+CoordinatesSectionParser = register_section('Coordinates', [
+    Record('DD', variadic=INT),
+])
+
+GraphSectionParser = register_section('Graph', [
+    Record('Obstacles', (TEXT,)),
+    Record('Nodes', (INT,), bulk=False),
+    Record('Edges', (INT,), bulk=False),
+    Record('Arcs', (INT,), bulk=False),
+    Record('E', (INT, INT, INT)),
+    Record('A', (INT, INT, INT)),
+])
+
+MaximumDegreesSectionParser = register_section('MaximumDegrees', [
+    Record('MD', (INT,)),
+])
+
+PresolveSectionParser = register_section('Presolve', [
+    Record('FIXED', (INT,), bulk=False),
+    Record('LOWER', (INT,), bulk=False),
+    Record('UPPER', (INT,), bulk=False),
+    Record('TIME', (INT,), bulk=False),
+    Record('ORGNODES', (INT,), bulk=False),
+    Record('ORGEDGES', (INT,), bulk=False),
+    Record('EA', (INT, INT, INT, INT)),
+    Record('EC', (INT, INT, INT)),
+    Record('ED', (INT, INT, INT)),
+    Record('ES', (INT, INT)),
+])
+
+ObstaclesSectionParser = register_section('Obstacles', [
+    Record('RR', (INT, INT, INT, INT)),
+])
+
+TerminalsSectionParser = register_section('Terminals', [
+    Record('Terminals', (INT,), bulk=False),
+    Record('RootP', (INT,)),
+    Record('T', (INT,)),
+    Record('TP', (INT,)),
+])
@@ -0,0 +1,462 @@
+'''
+A local server of parsed instances, shared between processes.
+
+The server parses an instance on the first request for its file, keeps the
+arrays in a shared memory block and answers every request for the same file
+with the handle of that block: clients attach to it without parsing nor
+copying anything. Blocks are kept in an LRU of bounded size, and dropped
+when their file changes (mtime or size).
+
+Requests are JSON lines over a Unix socket (or a localhost TCP socket when
+the address is a ``(host, port)`` pair). Start it with::
+
+    python -m steinlib.server --socket /tmp/steinlib.sock --capacity 64
+
+and use it with::
+
+    with InstanceClient('/tmp/steinlib.sock') as client:
+        with client.get('b01.stp') as attached:
+            solve(attached.instance)
+
+Dropping a block unlinks it, which leaves the clients already attached to
+it alone; a client that comes too late gets a fresh handle.
+'''
+import collections
+import json
+import os
+import socket
+import socketserver
+import stat
+import sys
+import threading
+import time
+from concurrent.futures import Future
+
+from steinlib.arrays import parse_arrays
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.parser import open_stp
+from steinlib.shared import SharedInstanceBlock, SharedInstanceHandle
+
+
+_LATENCY_SAMPLES = 1000
+
+
+def _parse_file(path):
+    with open_stp(path) as stp_file:
+        return parse_arrays(stp_file)
+
+
+class InstanceLRU(object):
+    '''
+    Shared memory blocks of parsed instances, by file path, least recently
+    used first. At most ``capacity`` instances and ``max_bytes`` bytes of
+    blocks are kept; the least recently used ones are closed beyond that,
+    except the last one, which is kept whatever its size.
+
+    It is safe to use from several threads. Concurrent requests for the same
+    file wait for a single parse.
+    '''
+
+    def __init__(self, capacity=64, max_bytes=None, parse=_parse_file):
+        if capacity < 1:
+            raise ValueError('The capacity must be positive, got %s' %
+                             capacity)
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self._parse = parse
+        self._entries = collections.OrderedDict()
+        self._loading = {}
+        self._bytes = 0
+        self._latencies = collections.deque(maxlen=_LATENCY_SAMPLES)
+        self._parse_count = 0
+        self._parse_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path):
+        '''
+        ``(block, hit)`` for the instance in ``path``: its
+        SharedInstanceBlock and whether it was cached.
+        '''
+        path = os.path.abspath(path)
+        stamp = _stamp(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[1] != stamp:
+                self.invalidations += 1
+                self._drop(path)
+                entry = None
+            if entry is not None:
+                self.hits += 1
+                self._entries.move_to_end(path)
+                self._shrink()
+                return entry[0], True
+            self.misses += 1
+            loading = self._loading.get(path)
+            if loading is None:
+                loading = self._loading[path] = Future()
+                owner = True
+            else:
+                owner = False
+        if not owner:
+            return loading.result(), False
+
+        try:
+            start = time.perf_counter()
+            block = SharedInstanceBlock(self._parse(path))
+            seconds = time.perf_counter() - start
+        except BaseException as ex:
+            with self._lock:
+                del self._loading[path]
+            loading.set_exception(ex)
+            raise
+        with self._lock:
+            del self._loading[path]
+            self._parse_count += 1
+            self._parse_seconds += seconds
+            self._latencies.append(seconds)
+            self._entries[path] = (block, stamp)
+            self._bytes += block.handle.size
+            self._shrink()
+        loading.set_result(block)
+        return block, False
+
+    def invalidate(self, path=None):
+        '''
+        Drop the instance of ``path``, or all of them.
+        '''
+        with self._lock:
+            paths = list(self._entries) if path is None else \
+                [os.path.abspath(path)]
+            for key in paths:
+                if key in self._entries:
+                    self.invalidations += 1
+                    self._drop(key)
+
+    def invalidate_stale(self):
+        '''
+        Drop the instances whose file changed or disappeared. Returns their
+        number.
+        '''
+        with self._lock:
+            stale = [path for path, (_, stamp) in self._entries.items()
+                     if _stamp(path) != stamp]
+            for path in stale:
+                self.invalidations += 1
+                self._drop(path)
+        return len(stale)
+
+    def close(self):
+        with self._lock:
+            for path in list(self._entries):
+                self._drop(path)
+
+    def metrics(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            requests = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': float(self.hits) / requests if requests else 0.0,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions,
+                'parses': self._parse_count,
+                'parse_seconds': self._parse_seconds,
+                'parse_seconds_mean': (self._parse_seconds /
+                                       self._parse_count
+                                       if self._parse_count else 0.0),
+                'parse_seconds_p50': _percentile(latencies, 0.5),
+                'parse_seconds_p95': _percentile(latencies, 0.95),
+                'parse_seconds_max': latencies[-1] if latencies else 0.0,
+            }
+
+    def _shrink(self):
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.capacity or
+                (self.max_bytes is not None and
+                 self._bytes > self.max_bytes)):
+            self.evictions += 1
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, path):
+        block, _ = self._entries.pop(path)
+        self._bytes -= block.handle.size
+        block.close()
+
+
+def _stamp(path):
+    try:
+        status = os.stat(path)
+    except OSError:
+        return None
+    return (status.st_mtime_ns, status.st_size)
+
+
+def _remove_stale_socket(address):
+    # a socket left behind by a server that is gone; anything else at the
+    # address (a file, a socket that still accepts) is not ours to remove
+    try:
+        mode = os.lstat(address).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError('%s exists and is not a socket' % address)
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(address)
+    except OSError:
+        os.remove(address)
+    else:
+        raise FileExistsError('A server already listens on %s' % address)
+    finally:
+        probe.close()
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = self.server.respond(json.loads(line))
+            except Exception as ex:
+                response = {'error': type(ex).__name__, 'message': str(ex)}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn,
+                  socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class InstanceServer(object):
+    '''
+    Serves the instances of an InstanceLRU on ``address``: the path of a
+    Unix socket, or a ``(host, port)`` pair for TCP (port 0 picks a free
+    one, see ``address`` once started). A socket left at the path by a
+    server that is gone is replaced; any other file there, or a socket a
+    server still listens on, raises a FileExistsError.
+
+    Every ``watch_interval`` seconds, a background thread drops the
+    instances whose file changed, so that their memory is released before
+    the next request for them.
+
+    Requests are JSON objects, one per line, answered by one line:
+
+     - ``{"op": "get", "path": ...}``: ``{"handle": ..., "hit": ...}``;
+     - ``{"op": "invalidate", "path": ...}`` (all without a path);
+     - ``{"op": "metrics"}``: InstanceLRU.metrics().
+
+    Errors are answered with ``{"error": <exception type>, "message": ...}``.
+    '''
+
+    def __init__(self, address, capacity=64, max_bytes=None,
+                 parse=_parse_file, watch_interval=5.0):
+        self.cache = InstanceLRU(capacity, max_bytes, parse)
+        self.watch_interval = watch_interval
+        if isinstance(address, str):
+            _remove_stale_socket(address)
+            self._server = _UnixServer(address, _RequestHandler)
+        else:
+            self._server = _TCPServer(tuple(address), _RequestHandler)
+        self._server.respond = self.respond
+        self.address = self._server.server_address
+        self._stop = threading.Event()
+        self._threads = []
+
+    def respond(self, request):
+        op = request.get('op')
+        if op == 'get':
+            block, hit = self.cache.get(request['path'])
+            handle = block.handle
+            return {'hit': hit, 'handle': {
+                'name': handle.name, 'size': handle.size,
+                'fields': handle.fields, 'metadata': handle.metadata}}
+        if op == 'invalidate':
+            self.cache.invalidate(request.get('path'))
+            return {}
+        if op == 'metrics':
+            return self.cache.metrics()
+        raise ValueError('Unknown operation: %s' % op)
+
+    def serve_forever(self):
+        self._watch_in_background()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._close()
+
+    def start(self):
+        '''
+        Serve from background threads; see shutdown().
+        '''
+        self._watch_in_background()
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._close()
+
+    def _watch_in_background(self):
+        if not self.watch_interval:
+            return
+        thread = threading.Thread(target=self._watch)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            self.cache.invalidate_stale()
+
+    def _close(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._server.server_close()
+        self.cache.close()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+
+class InstanceClient(object):
+    '''
+    Connection to an InstanceServer. get() returns an AttachedInstance (see
+    steinlib.shared), to close once done with its arrays.
+    '''
+
+    def __init__(self, address, timeout=None):
+        family = socket.AF_UNIX if isinstance(address, str) \
+            else socket.AF_INET
+        self._socket = socket.socket(family, socket.SOCK_STREAM)
+        self._socket.settimeout(timeout)
+        self._socket.connect(address if isinstance(address, str)
+                             else tuple(address))
+        self._stream = self._socket.makefile('rwb')
+
+    def get(self, path, retries=2):
+        '''
+        The instance in ``path`` attached from the server. The file is read
+        by the server, so ``path`` is made absolute here.
+        '''
+        path = os.path.abspath(path)
+        for attempt in range(retries + 1):
+            handle = self._request({'op': 'get', 'path': path})['handle']
+            try:
+                return SharedInstanceHandle(
+                    handle['name'], handle['size'],
+                    [(name, dtype, tuple(shape), offset)
+                     for name, dtype, shape, offset in handle['fields']],
+                    handle['metadata']).attach()
+            except FileNotFoundError:
+                # dropped from the server between the answer and now
+                if attempt == retries:
+                    raise
+
+    def invalidate(self, path=None):
+        request = {'op': 'invalidate'}
+        if path is not None:
+            request['path'] = os.path.abspath(path)
+        self._request(request)
+
+    def metrics(self):
+        return self._request({'op': 'metrics'})
+
+    def close(self):
+        self._stream.close()
+        self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _request(self, request):
+        self._stream.write(json.dumps(request).encode('utf-8') + b'\n')
+        self._stream.flush()
+        line = self._stream.readline()
+        if not line:
+            raise IOError('The instance server closed the connection')
+        response = json.loads(line)
+        if 'error' in response:
+            raise _ERRORS.get(response['error'], RuntimeError)(
+                response['message'])
+        return response
+
+
+_ERRORS = {
+    'SteinlibParsingException': SteinlibParsingException,
+    'UnrecognizedSectionException': SteinlibParsingException,
+    'FileNotFoundError': FileNotFoundError,
+    'PermissionError': PermissionError,
+    'IsADirectoryError': IsADirectoryError,
+    'OSError': IOError,
+    'ValueError': ValueError,
+    'KeyError': ValueError,
+}
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='python -m steinlib.server',
+        description='Serve parsed instances through shared memory.')
+    parser.add_argument('--socket', help='path of the Unix socket')
+    parser.add_argument('--port', type=int,
+                        help='serve on localhost TCP instead')
+    parser.add_argument('--capacity', type=int, default=64,
+                        help='instances to keep (default: 64)')
+    parser.add_argument('--max-bytes', type=int,
+                        help='bytes of instances to keep')
+    parser.add_argument('--watch-interval', type=float, default=5.0,
+                        help='seconds between file checks (default: 5)')
+    arguments = parser.parse_args(argv)
+    if (arguments.socket is None) == (arguments.port is None):
+        parser.error('give either --socket or --port')
+
+    address = arguments.socket or ('127.0.0.1', arguments.port)
+    server = InstanceServer(address, arguments.capacity, arguments.max_bytes,
+                            watch_interval=arguments.watch_interval)
+    sys.stderr.write('Serving instances on %s\n' % (server.address,))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays
+
+
+_ALIGNMENT = 64
+
+
+class SharedInstanceHandle(object):
+    '''
+    Small picklable description of an instance exported to shared memory:
+    the block name and where each array lives inside it. Send this to the
+    workers and call attach() there.
+    '''
+
+    def __init__(self, name, size, fields, metadata):
+        self.name = name
+        self.size = size
+        self.fields = fields
+        self.metadata = metadata
+
+    def attach(self):
+        return AttachedInstance(self)
+
+
+class SharedInstanceBlock(object):
+    '''
+    Owner side of an instance exported to one shared memory block.
+
+    The owner must outlive the workers that attached to it, and call close()
+    (or use it as a context manager) once they are done: that releases and
+    unlinks the block.
+    '''
+
+    def __init__(self, instance):
+        fields = []
+        size = 0
+        for name, values in instance.arrays():
+            values = np.ascontiguousarray(values)
+            fields.append((name, values.dtype.str, values.shape, size))
+            size += -(-values.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        self._memory = SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, offset), (_, values) in zip(
+                fields, instance.arrays()):
+            target = np.ndarray(shape, dtype=dtype, buffer=self._memory.buf,
+                                offset=offset)
+            target[...] = values
+            del target
+
+        self.handle = SharedInstanceHandle(self._memory.name, size, fields,
+                                           instance.metadata())
+
+    @property
+    def closed(self):
+        return self._memory is None
+
+    def close(self):
+        if self._memory is not None:
+            self._memory.close()
+            # attaching from a process that shares our resource tracker
+            # (this one, or a child) took the block away from it, see
+            # _attach(): track it again for unlink() to untrack it
+            resource_tracker.register(self._memory._name, 'shared_memory')
+            self._memory.unlink()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class AttachedInstance(object):
+    '''
+    Worker side of an instance exported to shared memory. ``instance`` is a
+    SteinlibArrays whose arrays are read-only views over the shared block,
+    so attaching copies nothing.
+
+    close() detaches from the block but leaves it alive for the others. All
+    the references to ``instance`` and its arrays must be dropped before,
+    otherwise the block cannot be released and BufferError is raised.
+    '''
+
+    def __init__(self, handle):
+        self._memory = _attach(handle.name)
+        arrays = []
+        for name, dtype, shape, offset in handle.fields:
+            values = np.ndarray(shape, dtype=dtype, buffer=self._memory.buf,
+                                offset=offset)
+            values.setflags(write=False)
+            arrays.append((name, values))
+        self.instance = SteinlibArrays.from_arrays(arrays, handle.metadata)
+
+    def close(self):
+        self.instance = None
+        if self._memory is not None:
+            self._memory.close()
+            self._memory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def export_shared(instance):
+    '''
+    Copy all the arrays of ``instance`` into a new shared memory block.
+    '''
+    return SharedInstanceBlock(instance)
+
+
+def _attach(name):
+    try:
+        return SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Before Python 3.13 every process that attaches registers the block with
+    # its resource tracker, which then unlinks it when that process exits,
+    # under the feet of the owner: take it back from the tracker.
+    memory = SharedMemory(name=name)
+    resource_tracker.unregister(memory._name, 'shared_memory')
+    return memory
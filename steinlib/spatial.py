@@ -0,0 +1,283 @@
+import itertools
+
+import numpy as np
+
+from steinlib._ranges import expand_ranges
+
+
+METRICS = {
+    'l1': 1,
+    'l2': 2,
+    'linf': np.inf,
+}
+
+
+def distances(differences, metric='l2'):
+    '''
+    Norm of every row of ``differences`` under one of ``METRICS``.
+    '''
+    try:
+        order = METRICS[metric]
+    except KeyError:
+        raise ValueError('Unknown metric "%s". Known metrics: %s.' %
+                         (metric, ', '.join(sorted(METRICS))))
+    differences = np.abs(differences)
+    if order == 1:
+        return differences.sum(axis=-1)
+    if order == 2:
+        return np.sqrt((differences * differences).sum(axis=-1))
+    return differences.max(axis=-1)
+
+
+def obstacle_boxes(obstacles):
+    '''
+    ``RR`` records as ``(xmin, ymin, xmax, ymax)`` boxes. The records give
+    two opposite corners, in no particular order.
+    '''
+    obstacles = np.asarray(obstacles, dtype=np.int64).reshape(-1, 4)
+    return np.column_stack((
+        np.minimum(obstacles[:, 0], obstacles[:, 2]),
+        np.minimum(obstacles[:, 1], obstacles[:, 3]),
+        np.maximum(obstacles[:, 0], obstacles[:, 2]),
+        np.maximum(obstacles[:, 1], obstacles[:, 3])))
+
+
+class PointGridIndex(object):
+    '''
+    Uniform grid over the ``DD`` points, with about one point per cell.
+
+    Points are stored sorted by cell, with a CSR style ``indptr`` over the
+    cells, so the points of any block of cells are gathered with one
+    vectorized pass.
+    '''
+
+    def __init__(self, ids, coordinates):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        coordinates = np.asarray(coordinates, dtype=np.float64)
+        self.dimensions = coordinates.shape[1] if coordinates.ndim == 2 else 0
+
+        count = len(self.ids)
+        root = 1.0 / max(1, self.dimensions)
+        per_dimension = max(1, int(round(count ** root)))
+        self._shape = np.full(self.dimensions, per_dimension, dtype=np.int64)
+        if count:
+            self._low = coordinates.min(axis=0)
+            extent = coordinates.max(axis=0) - self._low
+        else:
+            self._low = np.zeros(self.dimensions)
+            extent = np.zeros(self.dimensions)
+        self._width = np.maximum(extent, 1.0) / per_dimension
+
+        cells = self._flat_cells(self._cells_of(coordinates))
+        order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=int(np.prod(self._shape)))
+        self._indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._indptr[1:])
+        self._order = order
+        self._coordinates = coordinates[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def within(self, low, high):
+        '''
+        Ids of the points inside the box ``[low, high]``, bounds included.
+        '''
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        if not len(self.ids) or (low > high).any():
+            return np.empty(0, dtype=np.int64)
+
+        first = self._cells_of(low[np.newaxis])[0]
+        last = self._cells_of(high[np.newaxis])[0]
+        ranges = [np.arange(a, b + 1) for a, b in zip(first, last)]
+        cells = np.stack([axis.ravel() for axis in
+                          np.meshgrid(*ranges, indexing='ij')], axis=1)
+        positions = self._points_in(self._flat_cells(cells))
+        points = self._coordinates[positions]
+        inside = ((points >= low) & (points <= high)).all(axis=1)
+        return self.ids[self._order[positions[inside]]]
+
+    def query(self, lows, highs):
+        '''
+        Batched within(). Returns ``(indptr, ids)``: the ids found for box
+        ``i`` are ``ids[indptr[i]:indptr[i + 1]]``.
+        '''
+        found = [self.within(low, high) for low, high in zip(lows, highs)]
+        return _concatenate_results(found)
+
+    def nearest(self, points, k=1, metric='l2'):
+        '''
+        The ``k`` nearest indexed points to each of ``points``.
+
+        Returns ``(ids, dists)``, both shaped ``(len(points), k)``; when the
+        index holds fewer than ``k`` points, the rows are padded with id -1
+        and an infinite distance.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(
+            -1, self.dimensions)
+        ids = np.full((len(points), k), -1, dtype=np.int64)
+        dists = np.full((len(points), k), np.inf)
+        for row, point in enumerate(points):
+            found, found_dists = self._nearest_one(point, k, metric)
+            ids[row, :len(found)] = found
+            dists[row, :len(found)] = found_dists
+        return ids, dists
+
+    def _nearest_one(self, point, k, metric):
+        center = self._cells_of(point[np.newaxis])[0]
+        gap = self._width.min()
+        positions = []
+        dists = []
+        best = np.empty(0)
+        for ring in itertools.count():
+            ring_positions = self._points_in(self._ring_cells(center, ring))
+            if len(ring_positions):
+                positions.append(ring_positions)
+                dists.append(distances(self._coordinates[ring_positions] -
+                                       point, metric))
+                best = np.concatenate(dists)
+            # any point outside the rings seen so far is at least ring * gap
+            # away along one of the axes
+            done_rings = ring >= self._shape.max()
+            if done_rings or (len(best) >= k and
+                              np.partition(best, k - 1)[k - 1] <= ring * gap):
+                break
+
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        positions = np.concatenate(positions)
+        closest = np.argsort(best, kind='stable')[:k]
+        return self.ids[self._order[positions[closest]]], best[closest]
+
+    def _ring_cells(self, center, ring):
+        ranges = [np.arange(max(0, c - ring), min(size, c + ring + 1))
+                  for c, size in zip(center, self._shape)]
+        cells = np.stack([axis.ravel() for axis in
+                          np.meshgrid(*ranges, indexing='ij')], axis=1)
+        on_ring = np.abs(cells - center).max(axis=1) == ring
+        return self._flat_cells(cells[on_ring])
+
+    def _points_in(self, cells):
+        starts = self._indptr[cells]
+        counts = self._indptr[cells + 1] - starts
+        return expand_ranges(starts, counts)
+
+    def _cells_of(self, coordinates):
+        cells = np.floor((coordinates - self._low) / self._width)
+        return np.clip(cells, 0, self._shape - 1).astype(np.int64)
+
+    def _flat_cells(self, cells):
+        if not self.dimensions:
+            return np.zeros(len(cells), dtype=np.int64)
+        return np.ravel_multi_index(cells.T, self._shape).astype(np.int64)
+
+
+class RectangleIndex(object):
+    '''
+    Static two level R-tree over axis aligned boxes, packed with the
+    Sort-Tile-Recursive layout: leaves hold ``leaf_size`` boxes that are
+    close in space, and queries test the leaf bounding boxes first.
+    '''
+
+    def __init__(self, boxes, leaf_size=16):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        count = len(boxes)
+        leaves = max(1, -(-count // leaf_size))
+        slices = max(1, int(np.ceil(np.sqrt(leaves))))
+        per_slice = slices * leaf_size
+
+        centers = (boxes[:, :2] + boxes[:, 2:]) / 2
+        order = np.argsort(centers[:, 0], kind='stable')
+        slice_of = np.arange(count) // per_slice
+        order = order[np.lexsort((centers[order, 1], slice_of))]
+
+        self._order = order
+        self._boxes = boxes[order]
+        # leaves never straddle two slices
+        position_in_slice = np.arange(count) % per_slice
+        starts = np.flatnonzero(position_in_slice % leaf_size == 0)
+        self._leaf_starts = starts
+        self._leaf_ends = np.append(starts[1:], count)[:len(starts)]
+        if count:
+            self._leaf_boxes = np.column_stack((
+                np.minimum.reduceat(self._boxes[:, 0], starts),
+                np.minimum.reduceat(self._boxes[:, 1], starts),
+                np.maximum.reduceat(self._boxes[:, 2], starts),
+                np.maximum.reduceat(self._boxes[:, 3], starts)))
+        else:
+            self._leaf_boxes = np.empty((0, 4))
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def intersecting(self, box):
+        '''
+        Rows of the indexed boxes that intersect or touch ``box``, given as
+        ``(xmin, ymin, xmax, ymax)``.
+        '''
+        box = np.asarray(box, dtype=np.float64)
+        leaves = np.flatnonzero(_overlaps(self._leaf_boxes, box))
+        positions = expand_ranges(self._leaf_starts[leaves],
+                                  self._leaf_ends[leaves] -
+                                  self._leaf_starts[leaves])
+        hits = positions[_overlaps(self._boxes[positions], box)]
+        return np.sort(self._order[hits])
+
+    def query(self, boxes):
+        '''
+        Batched intersecting(). Returns ``(indptr, rows)`` laid out like
+        PointGridIndex.query().
+        '''
+        found = [self.intersecting(box) for box in
+                 np.asarray(boxes, dtype=np.float64).reshape(-1, 4)]
+        return _concatenate_results(found)
+
+    def containing(self, points):
+        '''
+        Batched lookup of the boxes that contain each point, boundary
+        included.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return self.query(np.hstack((points, points)))
+
+    def nearest(self, points, metric='l2'):
+        '''
+        Row of the closest box to each point, with its distance (0 when the
+        point is inside), or -1 and infinity when nothing is indexed.
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        rows = np.full(len(points), -1, dtype=np.int64)
+        dists = np.full(len(points), np.inf)
+        for position, point in enumerate(points):
+            leaf_dists = _box_distances(self._leaf_boxes, point, metric)
+            for leaf in np.argsort(leaf_dists, kind='stable'):
+                if leaf_dists[leaf] > dists[position]:
+                    break
+                start, end = self._leaf_starts[leaf], self._leaf_ends[leaf]
+                box_dists = _box_distances(self._boxes[start:end], point,
+                                           metric)
+                best = int(np.argmin(box_dists))
+                if box_dists[best] < dists[position]:
+                    dists[position] = box_dists[best]
+                    rows[position] = self._order[start + best]
+        return rows, dists
+
+
+def _overlaps(boxes, box):
+    return ((boxes[:, 0] <= box[2]) & (boxes[:, 2] >= box[0]) &
+            (boxes[:, 1] <= box[3]) & (boxes[:, 3] >= box[1]))
+
+
+def _box_distances(boxes, point, metric):
+    below = np.maximum(boxes[:, :2] - point, 0)
+    above = np.maximum(point - boxes[:, 2:], 0)
+    return distances(below + above, metric)
+
+
+def _concatenate_results(found):
+    indptr = np.zeros(len(found) + 1, dtype=np.int64)
+    np.cumsum([len(values) for values in found], out=indptr[1:])
+    if not found:
+        return indptr, np.empty(0, dtype=np.int64)
+    return indptr, np.concatenate(found).astype(np.int64)
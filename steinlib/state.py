@@ -5,4 +5,5 @@ class ParsingState(object):
     wait_for_header = 0
     wait_for_section = 1
     inside_section = 2
+    skip_section = 3
     end = 4
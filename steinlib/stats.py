@@ -0,0 +1,125 @@
+'''
+Summary statistics of an instance, computed in one streaming pass over its
+lines: nothing but a degree counter per node is kept in memory, and only
+the standard library is needed.
+'''
+from array import array
+
+from steinlib.instance import SteinlibInstance
+from steinlib.parser import SteinlibParser
+
+
+class StatsInstance(SteinlibInstance):
+    '''
+    Counts nodes, edges, arcs and terminals, the degree of every node and
+    the weights, by power of two buckets, as the records are parsed.
+    '''
+
+    def __init__(self):
+        self.name = None
+        self.num_nodes = 0
+        self.num_edges = 0
+        self.num_arcs = 0
+        self.num_terminals = 0
+        self.weight_total = 0
+        self.weight_min = None
+        self.weight_max = None
+        self._degrees = array('q')
+        self._weight_buckets = {}
+
+    def comment__name(self, raw_line, tokens):
+        self.name = tokens[0]
+
+    def graph__nodes(self, raw_line, tokens):
+        self.num_nodes = tokens[0]
+        self._reserve(tokens[0])
+
+    def graph__e(self, raw_line, tokens):
+        self.num_edges += 1
+        self._add_link(tokens)
+
+    def graph__a(self, raw_line, tokens):
+        self.num_arcs += 1
+        self._add_link(tokens)
+
+    def terminals__t(self, raw_line, tokens):
+        self.num_terminals += 1
+
+    def terminals__tp(self, raw_line, tokens):
+        self.num_terminals += 1
+
+    def terminals__rootp(self, raw_line, tokens):
+        self.num_terminals += 1
+
+    def _add_link(self, tokens):
+        tail, head, weight = tokens
+        self._reserve(max(tail, head))
+        self._degrees[tail] += 1
+        self._degrees[head] += 1
+
+        self.weight_total += weight
+        if self.weight_min is None or weight < self.weight_min:
+            self.weight_min = weight
+        if self.weight_max is None or weight > self.weight_max:
+            self.weight_max = weight
+        bucket = weight.bit_length()
+        self._weight_buckets[bucket] = self._weight_buckets.get(bucket, 0) + 1
+
+    def _reserve(self, node):
+        missing = node + 1 - len(self._degrees)
+        if missing > 0:
+            self._degrees.extend(array('q', bytes(8 * missing)))
+
+    def degree_distribution(self):
+        '''
+        ``[(degree, number of nodes), ...]`` by increasing degree, over the
+        nodes ``1`` to ``max(Nodes, largest id used)``.
+        '''
+        counts = {}
+        for degree in self._degrees[1:]:
+            counts[degree] = counts.get(degree, 0) + 1
+        return sorted(counts.items())
+
+    def weight_histogram(self):
+        '''
+        ``[(low, high, number of links), ...]`` with the weights bucketed by
+        powers of two: ``[0, 0]``, ``[1, 1]``, ``[2, 3]``, ``[4, 7]``, ...
+        '''
+        return [((1 << bucket) >> 1, (1 << bucket) - 1, count)
+                for bucket, count in sorted(self._weight_buckets.items())]
+
+    def summary(self):
+        '''
+        All the statistics as a dictionary of plain values, ready for JSON.
+        '''
+        distribution = self.degree_distribution()
+        nodes = sum(count for _, count in distribution)
+        links = self.num_edges + self.num_arcs
+        return {
+            'name': self.name,
+            'nodes': self.num_nodes,
+            'edges': self.num_edges,
+            'arcs': self.num_arcs,
+            'terminals': self.num_terminals,
+            'degree': {
+                'min': distribution[0][0] if distribution else None,
+                'max': distribution[-1][0] if distribution else None,
+                'mean': 2.0 * links / nodes if nodes else None,
+                'distribution': [list(item) for item in distribution],
+            },
+            'weight': {
+                'min': self.weight_min,
+                'max': self.weight_max,
+                'total': self.weight_total,
+                'histogram': [list(item) for item in self.weight_histogram()],
+            },
+        }
+
+
+def read_stats(lines):
+    '''
+    StatsInstance.summary() of the instance in ``lines``.
+    '''
+    instance = StatsInstance()
+    SteinlibParser(lines, instance).parse()
+    return instance.summary()
@@ -0,0 +1,108 @@
+'''
+Consistency checks of an instance beyond what the parser enforces line by
+line: declared counts against the records, node ids against ``Nodes``,
+repeated terminals and so on.
+'''
+import numpy as np
+
+from steinlib.arrays import ROOT, ArraySteinlibInstance
+from steinlib.parser import SteinlibParser
+
+
+class DeclaringArraySteinlibInstance(ArraySteinlibInstance):
+    '''
+    ArraySteinlibInstance that also remembers the declared counts
+    (``Nodes``, ``Edges``, ``Arcs``, ``Terminals``, ``Obstacles``) to check
+    them against the records.
+    '''
+
+    def __init__(self, compact=False):
+        super(DeclaringArraySteinlibInstance, self).__init__(compact)
+        self.declared = {}
+
+    def graph__nodes(self, raw_line, tokens):
+        super(DeclaringArraySteinlibInstance, self).graph__nodes(raw_line,
+                                                                 tokens)
+        self.declared['nodes'] = tokens[0]
+
+    def graph__edges(self, raw_line, tokens):
+        self.declared['edges'] = tokens[0]
+
+    def graph__arcs(self, raw_line, tokens):
+        self.declared['arcs'] = tokens[0]
+
+    def graph__obstacles(self, raw_line, tokens):
+        self.declared['obstacles'] = tokens[0]
+
+    def terminals__terminals(self, raw_line, tokens):
+        self.declared['terminals'] = tokens[0]
+
+
+def validate(lines):
+    '''
+    Parse ``lines`` in tolerant mode and check the result. Returns a
+    dictionary with the parser ``diagnostics`` (line number, offset and
+    message), the ``problems`` found in the parsed instance, as messages,
+    and whether the instance is ``valid``, i.e. has neither.
+    '''
+    builder = DeclaringArraySteinlibInstance()
+    parser = SteinlibParser(lines, builder, tolerant=True)
+    parser.parse()
+    problems = check(builder.build(), builder.declared)
+    diagnostics = [{'line': diagnostic.line_number,
+                    'offset': diagnostic.offset,
+                    'message': diagnostic.message}
+                   for diagnostic in parser.diagnostics]
+    return {'valid': not diagnostics and not problems,
+            'diagnostics': diagnostics,
+            'problems': problems}
+
+
+def check(instance, declared=None):
+    '''
+    Problems of a SteinlibArrays, as a list of messages. ``declared`` holds
+    the counts declared in the file, by lowercase keyword; when given, a
+    missing ``Nodes`` declaration is a problem too (without it, the number
+    of nodes is the largest id used).
+    '''
+    problems = []
+    if declared is not None and 'nodes' not in declared:
+        problems.append('Nodes is not declared')
+    declared = dict((keyword, value)
+                    for keyword, value in (declared or {}).items()
+                    if keyword != 'nodes')
+    found = {
+        'edges': instance.num_edges,
+        'arcs': instance.num_arcs,
+        'terminals': len(instance.terminals),
+        'obstacles': len(instance.obstacles),
+    }
+    for keyword in sorted(declared):
+        if declared[keyword] != found[keyword]:
+            problems.append('%s declares %s but %d found' % (
+                keyword.capitalize(), declared[keyword], found[keyword]))
+
+    if instance.compact:
+        return problems
+
+    low, high = instance.first_id, instance.num_nodes
+    for label, ids in (('edge endpoints', instance.edges[:, :2]),
+                       ('terminals', instance.terminals),
+                       ('coordinates', instance.coordinate_ids)):
+        outside = np.count_nonzero((ids < low) | (ids > high))
+        if outside:
+            problems.append('%d %s outside %d..%d' % (outside, label, low,
+                                                      high))
+
+    repeated = len(instance.terminals) - len(np.unique(instance.terminals))
+    if repeated:
+        problems.append('%d terminals are repeated' % repeated)
+    roots = np.count_nonzero(instance.terminal_kinds == ROOT)
+    if roots > 1:
+        problems.append('%d RootP terminals, at most one expected' % roots)
+
+    degrees = len(instance.maximum_degrees)
+    if degrees and degrees != instance.num_nodes:
+        problems.append('%d MD records for %d nodes' %
+                        (degrees, instance.num_nodes))
+    return problems
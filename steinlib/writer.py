@@ -0,0 +1,161 @@
+import numpy as np
+
+from steinlib.arrays import PRESOLVE_RECORDS, PRESOLVE_VALUES, \
+                            TERMINAL_KIND_NAMES
+from steinlib.pruning import connected_components
+from steinlib.section import SECTIONS
+
+
+DEFAULT_HEADER = 'STP File, STP Format Version 1.0'
+COMMENT_FIELDS = ('name', 'creator', 'remark', 'problem')
+
+
+def write_stp(instance, stream, relabel=True, chunk_rows=1 << 16):
+    '''
+    Write a SteinlibArrays to a text stream in STP format.
+
+    Compacted instances are written with their original node ids unless
+    ``relabel`` is false. Records are formatted ``chunk_rows`` at a time.
+    The extra records are written, as they are, in the sections they were
+    registered with.
+    '''
+    to_ids = instance.to_original_ids if relabel else np.asarray
+    writer = _SectionWriter(stream, chunk_rows)
+
+    stream.write('33D32945 %s\n' % (instance.header or DEFAULT_HEADER))
+
+    comment = [(field.capitalize(), instance.comment[field])
+               for field in COMMENT_FIELDS if field in instance.comment]
+    if comment:
+        writer.section('Comment', ['%s "%s"' % item for item in comment])
+
+    edges = instance.edges
+    num_nodes = instance.num_nodes
+    if relabel and instance.compact:
+        # the written ids go up to the largest original id
+        num_nodes = max(int(instance.original_ids.max()), num_nodes)
+    declarations = ['Nodes %d' % num_nodes]
+    if instance.num_edges or not instance.num_arcs:
+        declarations.append('Edges %d' % instance.num_edges)
+    if instance.num_arcs:
+        declarations.append('Arcs %d' % instance.num_arcs)
+    if len(instance.obstacles):
+        declarations.append('Obstacles %d' % len(instance.obstacles))
+    writer.section('Graph', declarations,
+                   np.where(instance.directed, 'A', 'E'),
+                   np.column_stack((to_ids(edges[:, 0]), to_ids(edges[:, 1]),
+                                    edges[:, 2])))
+
+    if len(instance.terminals):
+        writer.section('Terminals', ['Terminals %d' % len(instance.terminals)],
+                       np.array(TERMINAL_KIND_NAMES)[instance.terminal_kinds],
+                       to_ids(instance.terminals)[:, np.newaxis])
+
+    if len(instance.coordinate_ids):
+        writer.section('Coordinates', [], 'DD',
+                       np.column_stack((to_ids(instance.coordinate_ids),
+                                        instance.coordinates)))
+
+    if len(instance.obstacles):
+        writer.section('Obstacles', [], 'RR', instance.obstacles)
+
+    if len(instance.maximum_degrees):
+        degrees = instance.maximum_degrees
+        if relabel and instance.compact:
+            records = instance.original_ids - 1
+            known = records >= 0
+            degrees = np.zeros(records.max() + 1 if known.any() else 0,
+                               dtype=np.int64)
+            degrees[records[known]] = instance.maximum_degrees[known]
+        writer.section('MaximumDegrees', [], 'MD', degrees[:, np.newaxis])
+
+    presolve_records = [(name, instance.presolve_records[name])
+                        for name in sorted(PRESOLVE_RECORDS)
+                        if len(instance.presolve_records[name])]
+    if instance.presolve or presolve_records:
+        values = ['%s %d' % (name.upper(), instance.presolve[name])
+                  for name in PRESOLVE_VALUES if name in instance.presolve]
+        writer.section('Presolve', values, close=not presolve_records)
+        for name, records in presolve_records:
+            writer.records(name.upper(), records)
+        if presolve_records:
+            stream.write('END\n\n')
+
+    sections = {}
+    for section, record in SECTIONS.bulk_records():
+        name = '%s__%s' % (section.callback_token, record.callback)
+        if name in instance.extra_records:
+            sections.setdefault(section.name, []).append(
+                (record.keyword, instance.extra_records[name]))
+    for section_name in sorted(sections):
+        writer.section(section_name, [], close=False)
+        for keyword, records in sections[section_name]:
+            writer.records(keyword, records)
+        stream.write('END\n\n')
+
+    stream.write('EOF\n')
+
+
+class _SectionWriter(object):
+
+    def __init__(self, stream, chunk_rows):
+        self._stream = stream
+        self._chunk_rows = chunk_rows
+
+    def section(self, name, lines, keywords=None, records=None, close=True):
+        self._stream.write('SECTION %s\n' % name)
+        for line in lines:
+            self._stream.write(line + '\n')
+        if records is not None:
+            self.records(keywords, records)
+        if close:
+            self._stream.write('END\n\n')
+
+    def records(self, keywords, records):
+        '''
+        One line per row of ``records``, prefixed by its keyword: a single
+        string or one per row.
+        '''
+        records = np.asarray(records, dtype=np.int64)
+        if not len(records):
+            return
+        keywords = np.broadcast_to(np.asarray(keywords), len(records))
+        template = ' '.join(['%s'] + ['%d'] * records.shape[1]) + '\n'
+        for start in range(0, len(records), self._chunk_rows):
+            stop = start + self._chunk_rows
+            rows = records[start:stop].tolist()
+            self._stream.write(''.join(
+                template % ((keyword,) + tuple(row))
+                for keyword, row in zip(keywords[start:stop].tolist(), rows)))
+
+
+def write_solution(instance, stream, chunk_rows=1 << 16):
+    '''
+    Write the links of a SteinlibArrays, taken as a solution subgraph, in
+    the ``Finalsolution`` format of the DIMACS Steiner tree challenge: the
+    vertices it spans (endpoints and terminals) and its edges, by original
+    node ids.
+
+    The instance must hold a solution, e.g. the tree a solver saved as an
+    STP file: whole instances, whose links have cycles, raise a ValueError.
+    Weights are not part of the format, so it cannot be read back as an
+    instance.
+    '''
+    spanned = np.unique(instance.edges[:, :2])
+    components = len(np.unique(connected_components(instance)[spanned]))
+    if len(instance.edges) > len(spanned) - components:
+        raise ValueError('The links have cycles: only a solution tree (or '
+                         'forest) can be written as a solution')
+
+    writer = _SectionWriter(stream, chunk_rows)
+    edges = instance.to_original_ids(instance.edges[:, :2])
+    vertices = np.union1d(edges.ravel(),
+                          instance.to_original_ids(instance.terminals))
+
+    if 'name' in instance.comment:
+        writer.section('Comment', ['Name "%s"' % instance.comment['name']])
+    writer.section('Finalsolution', ['Vertices %d' % len(vertices)], 'V',
+                   vertices[:, np.newaxis], close=False)
+    stream.write('Edges %d\n' % len(edges))
+    writer.records('E', edges)
+    stream.write('END\n')
@@ -0,0 +1,108 @@
+import os
+import unittest
+
+from steinlib.adapters import to_igraph, to_networkx, to_scipy_sparse
+from steinlib.arrays import SteinlibArrays, parse_arrays
+
+try:
+    import networkx
+except ImportError:  # pragma: no cover
+    networkx = None
+
+try:
+    import igraph
+except ImportError:  # pragma: no cover
+    igraph = None
+
+try:
+    import scipy
+except ImportError:  # pragma: no cover
+    scipy = None
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class AdapterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._instance = parse_arrays(stp_file)
+        self._mixed = SteinlibArrays(
+            edges=[[1, 2, 5], [2, 3, 7], [3, 2, 2]],
+            directed=[False, True, False],
+            terminals=[1, 3], terminal_kinds=[2, 0])
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._compact = parse_arrays(stp_file, compact=True)
+
+
+@unittest.skipUnless(networkx, 'networkx is not installed')
+class TestToNetworkx(AdapterTestCase):
+
+    def test_undirected(self):
+        graph = to_networkx(self._instance)
+        self.assertFalse(graph.is_directed())
+        self.assertEqual(graph.number_of_nodes(), 7)
+        self.assertEqual(graph.number_of_edges(), 9)
+        self.assertEqual(graph[7][2]['weight'], 1)
+        self.assertEqual(graph.nodes[3]['terminal'], 'T')
+        self.assertEqual(graph.nodes[3]['pos'], (55, 5))
+        self.assertEqual(graph.graph['name'], 'Odd Wheel')
+
+    def test_arcs(self):
+        graph = to_networkx(self._mixed)
+        self.assertTrue(graph.is_directed())
+        self.assertEqual(graph[2][1]['weight'], 5)
+        self.assertFalse(graph.has_edge(3, 1))
+        self.assertEqual(graph.nodes[1]['terminal'], 'RootP')
+
+    def test_compacted(self):
+        graph = to_networkx(self._compact)
+        self.assertEqual(sorted(graph.nodes), list(range(7)))
+        self.assertEqual(graph.number_of_edges(), 9)
+
+
+@unittest.skipUnless(igraph, 'igraph is not installed')
+class TestToIgraph(AdapterTestCase):
+
+    def test_undirected(self):
+        graph = to_igraph(self._instance)
+        self.assertFalse(graph.is_directed())
+        self.assertEqual(graph.vcount(), 8)
+        self.assertEqual(graph.ecount(), 9)
+        self.assertEqual(graph.vs[5]['terminal'], 'T')
+        self.assertIsNone(graph.vs[2]['terminal'])
+
+    def test_arcs(self):
+        graph = to_igraph(self._mixed)
+        self.assertTrue(graph.is_directed())
+        self.assertEqual(graph.ecount(), 5)
+
+    def test_compacted(self):
+        graph = to_igraph(self._compact)
+        self.assertEqual(graph.vcount(), 7)
+        self.assertEqual(graph.ecount(), 9)
+
+
+@unittest.skipUnless(scipy, 'scipy is not installed')
+class TestToScipySparse(AdapterTestCase):
+
+    def test_undirected_is_symmetric(self):
+        matrix = to_scipy_sparse(self._instance)
+        self.assertEqual(matrix.shape, (8, 8))
+        self.assertEqual(matrix.nnz, 18)
+        self.assertEqual((matrix - matrix.T).nnz, 0)
+
+    def test_compacted(self):
+        matrix = to_scipy_sparse(self._compact)
+        self.assertEqual(matrix.shape, (7, 7))
+        self.assertEqual(matrix.nnz, 18)
+
+    def test_lightest_of_parallel_edges(self):
+        matrix = to_scipy_sparse(self._mixed, format='coo').tocsr()
+        self.assertEqual(matrix[3, 2], 2)
+        self.assertEqual(matrix[2, 3], 2)
+        self.assertEqual(matrix[1, 2], 5)
+        self.assertEqual(matrix[2, 1], 5)
+        parallel = SteinlibArrays(edges=[[1, 2, 5], [2, 1, 3]])
+        self.assertEqual(to_scipy_sparse(parallel)[1, 2], 3)
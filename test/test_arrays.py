@@ -0,0 +1,176 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import ArraySteinlibInstance, SteinlibArrays, \
+                            parse_arrays, parse_arrays_tolerant, \
+                            POTENTIAL_TERMINAL, ROOT, TERMINAL
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.parser import SteinlibParser
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestArraySteinlibInstance(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._sut = parse_arrays(stp_file)
+
+    def test_graph_section(self):
+        self.assertEqual(self._sut.num_nodes, 7)
+        self.assertEqual(self._sut.num_edges, 9)
+        self.assertEqual(self._sut.num_arcs, 0)
+        self.assertEqual(self._sut.edges.shape, (9, 3))
+        self.assertEqual(self._sut.edges[0].tolist(), [1, 2, 1])
+        self.assertEqual(self._sut.edges[-1].tolist(), [7, 2, 1])
+
+    def test_terminals_section(self):
+        self.assertEqual(self._sut.terminals.tolist(), [1, 3, 5, 7])
+        self.assertTrue((self._sut.terminal_kinds == TERMINAL).all())
+        self.assertIsNone(self._sut.root)
+
+    def test_coordinates_section(self):
+        self.assertEqual(self._sut.coordinate_ids.tolist(),
+                         [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(self._sut.coordinates.shape, (7, 2))
+        self.assertEqual(self._sut.coordinates[2].tolist(), [55, 5])
+
+    def test_comment_section(self):
+        self.assertEqual(self._sut.comment['name'], 'Odd Wheel')
+        self.assertEqual(self._sut.header,
+                         'STP File, STP Format Version 1.0')
+
+    def test_csr_lists_both_directions_of_edges(self):
+        self.assertEqual(sorted(self._sut.neighbors(1).tolist()), [2, 4, 6])
+        self.assertEqual(sorted(self._sut.neighbors(2).tolist()), [1, 3, 7])
+        indptr, indices, edge_ids = self._sut.csr()
+        self.assertEqual(len(indptr), self._sut.id_bound + 1)
+        self.assertEqual(len(indices), 18)
+        self.assertEqual(len(edge_ids), 18)
+
+    def test_round_trip_through_arrays_and_metadata(self):
+        rebuilt = SteinlibArrays.from_arrays(self._sut.arrays(),
+                                             self._sut.metadata())
+        rebuilt_arrays = dict(rebuilt.arrays())
+        for name, values in self._sut.arrays():
+            np.testing.assert_array_equal(rebuilt_arrays[name], values)
+        self.assertEqual(rebuilt.comment, self._sut.comment)
+
+    def test_round_trip_through_npz(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'hello.npz')
+            self._sut.compacted().to_npz(path)
+            loaded = SteinlibArrays.from_npz(path)
+        finally:
+            shutil.rmtree(directory)
+        self.assertTrue(loaded.compact)
+        np.testing.assert_array_equal(
+            loaded.to_original_ids(loaded.edges[:, :2]),
+            self._sut.edges[:, :2])
+        self.assertEqual(loaded.metadata(), self._sut.compacted().metadata())
+
+    def test_pickle(self):
+        self._sut.csr()
+        for protocol in (2, pickle.HIGHEST_PROTOCOL):
+            loaded = pickle.loads(pickle.dumps(self._sut, protocol))
+            self.assertIsNone(loaded.cached_index('csr'))
+            self.assertEqual(loaded.metadata(), self._sut.metadata())
+            loaded_arrays = dict(loaded.arrays())
+            for name, values in self._sut.arrays():
+                self.assertEqual(loaded_arrays[name].dtype, values.dtype)
+                np.testing.assert_array_equal(loaded_arrays[name], values)
+
+    def test_pickle_buffers_out_of_band(self):
+        buffers = []
+        data = pickle.dumps(self._sut, 5, buffer_callback=buffers.append)
+        self.assertEqual(len(buffers), len(self._sut.arrays()))
+        self.assertLess(len(data), 1024)
+        loaded = pickle.loads(data, buffers=buffers)
+        self.assertTrue(np.shares_memory(loaded.edges, self._sut.edges))
+        self.assertEqual(loaded.coordinates.tolist(),
+                         self._sut.coordinates.tolist())
+
+
+class TestArraySteinlibInstanceRecords(unittest.TestCase):
+
+    def test_arcs_and_special_terminals(self):
+        lines = (
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph',
+            'Nodes 3',
+            'Arcs 2',
+            'A 1 2 5',
+            'A 2 3 7',
+            'END',
+            'SECTION Terminals',
+            'Terminals 2',
+            'RootP 1',
+            'TP 3',
+            'END',
+            'SECTION Presolve',
+            'LOWER 10',
+            'UPPER 12',
+            'EA 1 2 3 4',
+            'END',
+            'EOF',
+        )
+        sut = parse_arrays(lines)
+        self.assertEqual(sut.num_arcs, 2)
+        self.assertEqual(sut.root, 1)
+        self.assertEqual(sut.terminal_kinds.tolist(),
+                         [ROOT, POTENTIAL_TERMINAL])
+        self.assertEqual(sut.presolve, {'lower': 10, 'upper': 12})
+        self.assertEqual(sut.presolve_records['ea'].tolist(), [[1, 2, 3, 4]])
+        self.assertEqual(sut.neighbors(2).tolist(), [3])
+        self.assertEqual(sut.neighbors(3).tolist(), [])
+
+    def test_mixed_coordinate_dimensions(self):
+        lines = (
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Coordinates',
+            'DD 1 1 1',
+            'DD 2 1 1 1',
+            'END',
+            'EOF',
+        )
+        with self.assertRaises(SteinlibParsingException):
+            SteinlibParser(lines, ArraySteinlibInstance()).parse()
+
+    def test_coordinates_without_node(self):
+        lines = (
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Coordinates',
+            'DD',
+            'END',
+            'EOF',
+        )
+        with self.assertRaises(SteinlibParsingException):
+            SteinlibParser(lines, ArraySteinlibInstance()).parse()
+
+    def test_empty_instance(self):
+        sut = parse_arrays(('33D32945 STP File, STP Format Version 1.0',
+                            'EOF'))
+        self.assertEqual(sut.num_nodes, 0)
+        self.assertEqual(sut.edges.shape, (0, 3))
+        self.assertEqual(sut.csr()[0].tolist(), [0, 0])
+
+    def test_tolerant_parse(self):
+        lines = (
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph',
+            'E 1 2 3',
+            'E 1 2',
+            'E 2 3 4',
+            'END',
+            'EOF',
+        )
+        sut, diagnostics = parse_arrays_tolerant(lines)
+        self.assertEqual(sut.edges.tolist(), [[1, 2, 3], [2, 3, 4]])
+        self.assertEqual([d.line_number for d in diagnostics], [4])
@@ -0,0 +1,171 @@
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import parse_arrays
+from steinlib.batch import BatchLoader, pack, packed_size
+from steinlib.cache import InstanceCache
+from steinlib.generator import generate, generate_lines
+
+
+def _instance(records, terminals, nodes=4):
+    lines = ['33D32945 STP File, STP Format Version 1.0', 'SECTION Graph',
+             'Nodes %d' % nodes]
+    lines.extend(records)
+    lines.extend(['END', 'SECTION Terminals'])
+    lines.extend(terminals)
+    lines.extend(['END', 'EOF'])
+    return parse_arrays(lines)
+
+
+class TestPack(unittest.TestCase):
+
+    def setUp(self):
+        self.first = _instance(['E 1 2 5', 'A 2 3 7'], ['RootP 1', 'T 3'],
+                               nodes=3)
+        self.second = _instance(['E 4 1 2'], ['T 4'], nodes=4)
+
+    def test_disjoint_union(self):
+        batch = pack([self.first, self.second], ['a', 'b'])
+        self.assertEqual(batch.names, ['a', 'b'])
+        self.assertEqual(batch.node_offsets.tolist(), [0, 3, 7])
+        self.assertEqual(batch.edge_offsets.tolist(), [0, 3, 5])
+        self.assertEqual(batch.edge_index.tolist(),
+                         [[0, 1, 1, 6, 3], [1, 2, 0, 3, 6]])
+        self.assertEqual(batch.edge_weight.tolist(), [5, 7, 5, 2, 2])
+        self.assertEqual(batch.batch.tolist(), [0, 0, 0, 1, 1, 1, 1])
+        self.assertEqual(np.flatnonzero(batch.terminal_mask).tolist(),
+                         [0, 2, 6])
+        self.assertEqual(np.flatnonzero(batch.root_mask).tolist(), [0])
+
+    def test_not_symmetric(self):
+        batch = pack([self.first, self.second], symmetric=False)
+        self.assertEqual(batch.edge_index.tolist(), [[0, 1, 6], [1, 2, 3]])
+        self.assertEqual(batch.names, [0, 1])
+
+    def test_graph(self):
+        batch = pack([self.first, self.second])
+        edge_index, weights, terminals = batch.graph(1)
+        self.assertEqual(edge_index.tolist(), [[3, 0], [0, 3]])
+        self.assertEqual(weights.tolist(), [2, 2])
+        self.assertEqual(terminals.tolist(), [False, False, False, True])
+
+    def test_padded(self):
+        padded = pack([self.first, self.second]).padded()
+        self.assertEqual(padded['edge_index'].shape, (2, 3, 2))
+        self.assertEqual(padded['edge_index'][1].tolist(),
+                         [[3, 0], [0, 3], [0, 0]])
+        self.assertEqual(padded['edge_mask'].tolist(),
+                         [[True, True, True], [True, True, False]])
+        self.assertEqual(padded['node_mask'].sum(axis=1).tolist(), [3, 4])
+        self.assertEqual(padded['terminal_mask'].tolist(),
+                         [[True, False, True, False],
+                          [False, False, False, True]])
+
+    def test_pickle(self):
+        batch = pack([self.first, self.second])
+        buffers = []
+        loaded = pickle.loads(
+            pickle.dumps(batch, 5, buffer_callback=buffers.append),
+            buffers=buffers)
+        self.assertEqual(len(buffers), 6)
+        self.assertEqual(loaded.names, batch.names)
+        self.assertEqual(loaded.edge_index.tolist(),
+                         batch.edge_index.tolist())
+        self.assertEqual(pickle.loads(pickle.dumps(batch, 4)).nbytes,
+                         batch.nbytes)
+
+    def test_packed_size(self):
+        batch = pack([self.first])
+        self.assertEqual(packed_size(self.first),
+                         batch.nbytes - 8 * len(batch.node_offsets))
+
+    def test_empty(self):
+        batch = pack([])
+        self.assertEqual((len(batch), batch.num_nodes, batch.num_links),
+                         (0, 0, 0))
+        self.assertEqual(batch.padded()['edge_index'].shape, (0, 0, 2))
+
+
+class TestBatchLoader(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for seed in range(7):
+            path = os.path.join(self.directory, 'i%d.stp' % seed)
+            with open(path, 'w') as stp_file:
+                stp_file.writelines(generate_lines(
+                    nodes=10 + seed, edges=20, arcs=seed, terminals=3,
+                    seed=seed))
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_batches_in_order(self):
+        batches = list(BatchLoader(self.paths, batch_size=3, workers=2))
+        self.assertEqual([len(batch) for batch in batches], [3, 3, 1])
+        self.assertEqual(sum((batch.names for batch in batches), []),
+                         self.paths)
+        self.assertEqual(batches[2].num_nodes, 16)
+        expected = pack([generate(nodes=16, edges=20, arcs=6, terminals=3,
+                                  seed=6)])
+        self.assertEqual(batches[2].edge_index.tolist(),
+                         expected.edge_index.tolist())
+
+    def test_memory_bound(self):
+        loader = BatchLoader(self.paths, batch_size=10, max_batch_bytes=2500)
+        batches = list(loader)
+        self.assertGreater(len(batches), 1)
+        self.assertEqual(sum(len(batch) for batch in batches), 7)
+        for batch in batches:
+            self.assertTrue(len(batch) == 1 or batch.nbytes <= 2500 + 64)
+
+    def test_cache_and_shuffle(self):
+        cache = InstanceCache(os.path.join(self.directory, 'cache'))
+        loader = BatchLoader(self.paths, batch_size=4, cache=cache,
+                             shuffle=True, seed=1)
+        first = sum((batch.names for batch in loader), [])
+        second = sum((batch.names for batch in loader), [])
+        self.assertEqual(sorted(first), self.paths)
+        self.assertNotEqual(first, second)
+        self.assertEqual((cache.misses, cache.hits), (7, 7))
+
+    def test_cache_misses_are_parsed_concurrently(self):
+        # every parse waits for the other worker: serialized parses would
+        # break the barrier
+        barrier = threading.Barrier(2, timeout=10)
+
+        def parse(lines):
+            barrier.wait()
+            return parse_arrays(lines)
+
+        cache = InstanceCache(os.path.join(self.directory, 'cache'), parse)
+        batches = list(BatchLoader(self.paths[:4], batch_size=4, cache=cache,
+                                   workers=2))
+        self.assertEqual(batches[0].names, self.paths[:4])
+        self.assertEqual(cache.misses, 4)
+        reopened = InstanceCache(cache.directory)
+        self.assertTrue(all(path in reopened for path in self.paths[:4]))
+
+    def test_errors_are_raised(self):
+        with open(self.paths[4], 'w') as stp_file:
+            stp_file.write('not an instance\n')
+        with self.assertRaises(Exception):
+            list(BatchLoader(self.paths, batch_size=2))
+
+    def test_early_stop(self):
+        threads = threading.active_count()
+        for batch in BatchLoader(self.paths, batch_size=1, prefetch=1):
+            break
+        self.assertEqual(threading.active_count(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import pickle
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import parse_arrays
+from steinlib.budget import MemoryBudget, external_csr
+
+
+def _random_lines(nodes, records, seed=0):
+    rng = np.random.RandomState(seed)
+    lines = ['33D32945 STP File, STP Format Version 1.0', 'SECTION Graph',
+             'Nodes %d' % nodes]
+    for position in range(records):
+        tail, head = rng.randint(1, nodes + 1, 2)
+        lines.append('%s %d %d %d' % ('A' if position % 3 else 'E', tail,
+                                      head, rng.randint(1, 100)))
+    lines.extend(['END', 'SECTION Terminals', 'T 1', 'END', 'EOF'])
+    return lines
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    def setUp(self):
+        self._lines = _random_lines(300, 5000)
+        self._expected = parse_arrays(self._lines)
+
+    def test_edges_spill_to_mapped_files(self):
+        budget = MemoryBudget(1 << 14)
+        result = parse_arrays(self._lines, memory_budget=budget)
+        self.assertGreater(budget.spilled_bytes, 0)
+        np.testing.assert_array_equal(result.edges, self._expected.edges)
+        np.testing.assert_array_equal(result.directed,
+                                      self._expected.directed)
+        self.assertFalse(result.edges.flags.writeable)
+        self.assertEqual(result.num_edges, self._expected.num_edges)
+
+        loaded = pickle.loads(pickle.dumps(result, 5))
+        np.testing.assert_array_equal(loaded.edges, self._expected.edges)
+        self.assertNotIsInstance(loaded.edges, np.memmap)
+        self.assertEqual(loaded.memory_budget.limit, budget.limit)
+
+    def test_out_of_core_csr_matches_the_in_memory_one(self):
+        result = parse_arrays(self._lines, memory_budget=1 << 14)
+        for expected, actual in zip(self._expected.csr(), result.csr()):
+            np.testing.assert_array_equal(actual, expected)
+        self.assertIsInstance(result.csr()[1], np.memmap)
+        self.assertEqual(sorted(result.neighbors(7).tolist()),
+                         sorted(self._expected.neighbors(7).tolist()))
+
+    def test_small_instances_stay_in_memory(self):
+        budget = MemoryBudget(1 << 30)
+        result = parse_arrays(self._lines, memory_budget=budget)
+        result.csr()
+        self.assertEqual(budget.spill_files, 0)
+        report = budget.report()
+        self.assertEqual(report['spilled_bytes'], 0)
+        self.assertGreater(report['peak_rss'], 0)
+
+    def test_no_arcs(self):
+        indptr, indices, edge_ids = external_csr(
+            np.empty((0, 3), dtype=np.int64), np.empty(0, dtype=np.bool_), 4,
+            MemoryBudget(1))
+        self.assertEqual(indptr.tolist(), [0, 0, 0, 0, 0])
+        self.assertEqual((len(indices), len(edge_ids)), (0, 0))
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            MemoryBudget(0)
@@ -0,0 +1,108 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from steinlib.catalog import Catalog, read_metadata
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+HELLO = os.path.join(EXAMPLES_DIR, 'hello.stp')
+
+
+class TestReadMetadata(unittest.TestCase):
+
+    def test_declared_counts_and_comment(self):
+        with open(HELLO) as stp_file:
+            values = read_metadata(stp_file)
+        self.assertEqual(values['name'], 'Odd Wheel')
+        self.assertEqual(values['nodes'], 7)
+        self.assertEqual(values['edges'], 9)
+        self.assertEqual(values['arcs'], 0)
+        self.assertEqual(values['terminals'], 4)
+
+    def test_undeclared_counts_and_bounds(self):
+        lines = (
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph',
+            'A 1 2 3',
+            'A 2 3 3',
+            'END',
+            'SECTION Terminals',
+            'RootP 1',
+            'T 3',
+            'END',
+            'SECTION Presolve',
+            'LOWER 3',
+            'UPPER 6',
+            'ES 1 2',
+            'END',
+            'EOF',
+        )
+        values = read_metadata(lines)
+        self.assertEqual((values['arcs'], values['terminals']), (2, 2))
+        self.assertEqual((values['lower'], values['upper']), (3, 6))
+
+
+class TestCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        for name in ('a.stp', 'b.stp'):
+            shutil.copy(HELLO, os.path.join(self._directory, name))
+        with open(os.path.join(self._directory, 'broken.stp'), 'w') as f:
+            f.write('not an instance\n')
+        self._sut = Catalog(os.path.join(self._directory, 'catalog.db'))
+
+    def tearDown(self):
+        self._sut.close()
+        shutil.rmtree(self._directory)
+
+    def test_initial_update(self):
+        summary = self._sut.update_directory(self._directory)
+        self.assertEqual(summary['added'], 3)
+        self.assertEqual(len(self._sut), 3)
+        broken = self._sut.get(os.path.join(self._directory, 'broken.stp'))
+        self.assertIsNotNone(broken['error'])
+
+    def test_unreadable_archives(self):
+        with open(HELLO, 'rb') as stp_file:
+            data = gzip.compress(stp_file.read())
+        with open(os.path.join(self._directory, 'cut.stp.gz'), 'wb') as f:
+            f.write(data[:len(data) // 2])
+        with open(os.path.join(self._directory, 'plain.stp.gz'), 'wb') as f:
+            f.write(b'not gzip data\n')
+        summary = self._sut.update_directory(self._directory)
+        self.assertEqual(summary['added'], 5)
+        for name in ('cut.stp.gz', 'plain.stp.gz'):
+            row = self._sut.get(os.path.join(self._directory, name))
+            self.assertTrue(row['error'])
+            self.assertIsNone(row['edges'])
+
+    def test_select(self):
+        self._sut.update_directory(self._directory)
+        rows = self._sut.select('edges > ? AND terminals < ?', (5, 10))
+        self.assertEqual([os.path.basename(row['path']) for row in rows],
+                         ['a.stp', 'b.stp'])
+        self.assertEqual(rows[0]['sha1'], rows[1]['sha1'])
+
+    def test_incremental_update(self):
+        self._sut.update_directory(self._directory)
+        summary = self._sut.update_directory(self._directory)
+        self.assertEqual(summary['unchanged'], 3)
+
+        path_a = os.path.join(self._directory, 'a.stp')
+        later = time.time() + 10
+        os.utime(path_a, (later, later))
+        path_b = os.path.join(self._directory, 'b.stp')
+        with open(path_b, 'a') as stp_file:
+            stp_file.write('\n')
+        os.remove(os.path.join(self._directory, 'broken.stp'))
+
+        summary = self._sut.update_directory(self._directory)
+        self.assertEqual(
+            summary, {'added': 0, 'updated': 1, 'touched': 1,
+                      'unchanged': 0, 'removed': 1})
+        self.assertEqual(len(self._sut), 2)
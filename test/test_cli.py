@@ -0,0 +1,125 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from steinlib.cli import main
+from steinlib.stats import read_stats
+
+try:
+    import pyarrow
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+HELLO = os.path.join(EXAMPLES_DIR, 'hello.stp')
+
+
+def _read_lines(path):
+    with open(path) as stp_file:
+        return stp_file.readlines()
+
+
+def _run(*argv):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        status = main(list(argv))
+    return status, [json.loads(line) for line in
+                    output.getvalue().splitlines()]
+
+
+class TestCommandLine(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_stats(self):
+        status, results = _run('stats', HELLO, HELLO)
+        self.assertEqual(status, 0)
+        self.assertEqual([result['edges'] for result in results], [9, 9])
+        self.assertEqual(results[0]['path'], HELLO)
+
+    def test_errors_are_reported_per_file(self):
+        missing = os.path.join(self._directory, 'missing.stp')
+        status, results = _run('stats', missing, HELLO)
+        self.assertEqual(status, 1)
+        self.assertIn('error', results[0])
+        self.assertEqual(results[1]['nodes'], 7)
+
+    def test_validate(self):
+        broken = os.path.join(self._directory, 'broken.stp')
+        with open(broken, 'w') as stp_file:
+            stp_file.write('33D32945 STP File\nSECTION Graph\nNodes 1\n'
+                           'E 1 2 1\nEND\nEOF\n')
+        status, results = _run('validate', HELLO, broken)
+        self.assertEqual(status, 1)
+        self.assertEqual([result['valid'] for result in results],
+                         [True, False])
+
+    def test_convert_chain(self):
+        _run('convert', '--to', 'npz', '-o', self._directory, HELLO)
+        npz = os.path.join(self._directory, 'hello.npz')
+        status, results = _run('convert', '--to', 'stp.gz', npz)
+        self.assertEqual(status, 0)
+        with gzip.open(results[0]['output'], 'rt') as converted:
+            self.assertEqual(read_stats(converted),
+                             read_stats(_read_lines(HELLO)))
+
+    @unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+    def test_convert_parquet_back(self):
+        _run('convert', '--to', 'parquet', '-o', self._directory, HELLO)
+        parquet = os.path.join(self._directory, 'hello.parquet')
+        status, results = _run('convert', '--to', 'stp', parquet)
+        self.assertEqual(status, 0)
+        self.assertEqual(read_stats(_read_lines(results[0]['output'])),
+                         read_stats(_read_lines(HELLO)))
+
+    def test_solutions_are_written_only(self):
+        status, results = _run('convert', '--to', 'solution', '-o',
+                               self._directory, HELLO)
+        self.assertEqual(status, 1)
+        self.assertIn('cycles', results[0]['error'])
+        self.assertEqual(os.listdir(self._directory), [])
+        path = os.path.join(self._directory, 'tree.sol')
+        with open(path, 'w') as solution:
+            solution.write('SECTION Finalsolution\nEND\n')
+        status, results = _run('convert', '--to', 'stp', path)
+        self.assertEqual(status, 1)
+        self.assertIn('written only', results[0]['error'])
+
+    def test_convert_does_not_overwrite_its_input(self):
+        status, results = _run('convert', '--to', 'stp', HELLO)
+        self.assertEqual(status, 1)
+        self.assertIn('overwrite', results[0]['error'])
+
+    def test_bench(self):
+        status, results = _run('bench', '-e', 'callback', '-e', 'arrays',
+                               '-r', '1', HELLO)
+        self.assertEqual(status, 0)
+        self.assertEqual(sorted(results[0]['engines']),
+                         ['arrays', 'callback'])
+        self.assertEqual(results[0]['lines'], 41)
+
+    def test_parallel_runs_keep_the_order(self):
+        paths = [HELLO, os.path.join(self._directory, 'missing.stp')] * 2
+        status, results = _run('stats', '--jobs', '2', *paths)
+        self.assertEqual([result['path'] for result in results], paths)
+        self.assertEqual(['error' in result for result in results],
+                         [False, True, False, True])
+
+    def test_module_entry_point(self):
+        process = subprocess.run(
+            [sys.executable, '-m', 'steinlib', 'stats', HELLO],
+            stdout=subprocess.PIPE, universal_newlines=True, check=True,
+            cwd=os.path.join(os.path.dirname(__file__), '..'))
+        self.assertEqual(json.loads(process.stdout)['terminals'], 4)
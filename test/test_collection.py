@@ -0,0 +1,94 @@
+import io
+import multiprocessing
+import os
+import tarfile
+import gzip
+import unittest
+
+from steinlib.collection import iter_concatenated, iter_tar, \
+                                iter_tar_members
+from steinlib.exceptions import SteinlibParsingException
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+def _instance(name, edges):
+    lines = ['33D32945 STP File, STP Format Version 1.0',
+             'SECTION Comment', 'Name "%s"' % name, 'END',
+             'SECTION Graph', 'Nodes 3']
+    lines.extend('E %d %d 1' % edge for edge in edges)
+    lines.extend(['END', 'EOF'])
+    return '\n'.join(lines) + '\n'
+
+
+def _names(results):
+    return [result.comment['name'] for result in results]
+
+
+class TestIterConcatenated(unittest.TestCase):
+
+    def test_split_at_headers(self):
+        stream = io.StringIO(_instance('a', [(1, 2)]) + '\n# between\n' +
+                             _instance('b', [(1, 2), (2, 3)]) +
+                             _instance('c', []))
+        results = list(iter_concatenated(stream))
+        self.assertEqual(_names(results), ['a', 'b', 'c'])
+        self.assertEqual([len(result.edges) for result in results],
+                         [1, 2, 0])
+
+    def test_results_are_streamed(self):
+        stream = io.StringIO(_instance('a', []) + _instance('b', []))
+        results = iter_concatenated(stream)
+        self.assertEqual(next(results).comment['name'], 'a')
+        self.assertGreater(len(stream.read()), 0)
+
+    def test_trailing_garbage_is_an_error(self):
+        stream = io.StringIO(_instance('a', []) + 'E 1 2 3\n')
+        with self.assertRaises(SteinlibParsingException):
+            list(iter_concatenated(stream))
+
+    def test_empty_stream(self):
+        self.assertEqual(list(iter_concatenated(io.StringIO('\n\n'))), [])
+
+
+class TestIterTar(unittest.TestCase):
+
+    def setUp(self):
+        self._archive = io.BytesIO()
+        with tarfile.open(fileobj=self._archive, mode='w:gz') as tar:
+            self._add(tar, 'set/one.stp',
+                      (_instance('a', [(1, 2)]) +
+                       _instance('b', [(2, 3)])).encode())
+            self._add(tar, 'set/two.stp.gz',
+                      gzip.compress(_instance('c', []).encode()))
+            self._add(tar, 'set/README', b'not an instance')
+        self._archive.seek(0)
+
+    def _add(self, tar, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        tar.addfile(info, io.BytesIO(data))
+
+    def test_members(self):
+        members = list(iter_tar_members(self._archive))
+        self.assertEqual([name for name, _ in members],
+                         ['set/one.stp', 'set/two.stp.gz'])
+        self.assertTrue(members[1][1].startswith(b'33D32945'))
+
+    def test_instances_in_archive_order(self):
+        results = list(iter_tar(self._archive))
+        self.assertEqual([name for name, _ in results],
+                         ['set/one.stp', 'set/one.stp', 'set/two.stp.gz'])
+        self.assertEqual(_names(result for _, result in results),
+                         ['a', 'b', 'c'])
+
+    def test_worker_pool(self):
+        pool = multiprocessing.get_context('spawn').Pool(2)
+        try:
+            results = list(iter_tar(self._archive, pool=pool))
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(_names(result for _, result in results),
+                         ['a', 'b', 'c'])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from steinlib.arrays import parse_arrays
+
+try:
+    import pyarrow
+    from steinlib.columnar import (ColumnarWriter, read_instance,
+                                   read_table, to_tables)
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+@unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+class TestToTables(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._instance = parse_arrays(stp_file)
+
+    def test_sections_become_tables(self):
+        tables = to_tables(self._instance)
+        self.assertEqual(tables['edges'].num_rows, 9)
+        self.assertEqual(tables['edges'].column('w').to_pylist(), [1] * 9)
+        self.assertEqual(tables['terminals'].column('kind').to_pylist(),
+                         ['T'] * 4)
+        self.assertEqual(tables['coordinates'].column_names,
+                         ['id', 'x0', 'x1'])
+        self.assertEqual(tables['instances'].column('name').to_pylist(),
+                         ['Odd Wheel'])
+        self.assertEqual(tables['presolve_records'].num_rows, 0)
+
+    def test_degree_ids_follow_the_node_ids(self):
+        lines = ('33D32945 STP File, STP Format Version 1.0',
+                 'SECTION Graph', 'Nodes 3', 'E 1 2 1', 'E 2 3 1', 'END',
+                 'SECTION MaximumDegrees', 'MD 1', 'MD 2', 'MD 1', 'END',
+                 'EOF')
+        for compact, first in ((False, 1), (True, 0)):
+            tables = to_tables(parse_arrays(lines, compact=compact))
+            self.assertEqual(
+                tables['maximum_degrees'].column('id').to_pylist(),
+                [first, first + 1, first + 2])
+            self.assertEqual(
+                min(tables['edges'].column('u').to_pylist()), first)
+
+    def test_presolve_records(self):
+        instance = parse_arrays((
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Presolve',
+            'LOWER 4',
+            'EA 1 2 3 4',
+            'ES 5 6',
+            'END',
+            'EOF',
+        ))
+        tables = to_tables(instance, name='p')
+        records = tables['presolve_records'].to_pydict()
+        self.assertEqual(records['kind'], ['EA', 'ES'])
+        self.assertEqual(records['c1'], [2, 6])
+        self.assertEqual(records['c3'], [4, None])
+        self.assertEqual(tables['presolve'].to_pydict(),
+                         {'name': ['lower'], 'value': [4],
+                          'instance': ['p']})
+
+
+@unittest.skipUnless(pyarrow, 'pyarrow is not installed')
+class TestColumnarWriter(unittest.TestCase):
+
+    def setUp(self):
+        self._root = tempfile.mkdtemp()
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._instance = parse_arrays(stp_file)
+
+    def tearDown(self):
+        shutil.rmtree(self._root)
+
+    def test_many_instances_make_one_dataset(self):
+        for format in ('parquet', 'arrow'):
+            root = os.path.join(self._root, format)
+            with ColumnarWriter(root, format=format, batch_rows=10) as sut:
+                for name in ('a', 'b', 'c'):
+                    sut.write(name, self._instance)
+            edges = read_table(root, 'edges', format=format)
+            self.assertEqual(edges.num_rows, 27)
+            self.assertEqual(sorted(set(edges.column('instance').to_pylist())),
+                             ['a', 'b', 'c'])
+            # 9 edges per instance: a part at 18 rows, the rest on close
+            self.assertEqual(len(os.listdir(os.path.join(root, 'edges'))), 2)
+
+    def test_read_instance(self):
+        with ColumnarWriter(self._root, batch_rows=10) as sut:
+            for name in ('a', 'b'):
+                sut.write(name, self._instance)
+        instance = read_instance(self._root, 'b')
+        for (name, expected), (_, values) in zip(self._instance.arrays(),
+                                                 instance.arrays()):
+            self.assertEqual(values.tolist(), expected.tolist(), name)
+        self.assertEqual(instance.metadata(), self._instance.metadata())
+        self.assertRaises(ValueError, read_instance, self._root)
+        self.assertRaises(ValueError, read_instance, self._root, 'c')
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ColumnarWriter(self._root, format='csv')
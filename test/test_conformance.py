@@ -0,0 +1,155 @@
+import os
+import random
+import unittest
+
+from steinlib.arrays import parse_arrays
+from steinlib.conformance import ENGINES, MUTATIONS, Engine, \
+                                 RecordingInstance, _normalize_arrays, \
+                                 check, fuzz, reference_parser, run
+from steinlib.generator import generate, generate_lines, synthetic_corpus
+from steinlib.grammar import INT, Record
+from steinlib.parser import SteinlibParser
+from steinlib.section import SECTIONS, register_section
+
+HELLO = os.path.join(os.path.dirname(__file__), '..', 'examples',
+                     'hello.stp')
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_generate_is_reproducible(self):
+        self.assertEqual(generate_lines(seed=4, arcs=10, dimensions=2),
+                         generate_lines(seed=4, arcs=10, dimensions=2))
+        self.assertNotEqual(generate_lines(seed=4), generate_lines(seed=5))
+
+    def test_generated_lines_parse_back(self):
+        expected = generate(nodes=30, edges=50, arcs=10, terminals=5,
+                            root=True, potential_terminals=2, dimensions=3,
+                            degree_limits=True, presolve=True, seed=1)
+        instance = parse_arrays(generate_lines(
+            nodes=30, edges=50, arcs=10, terminals=5, root=True,
+            potential_terminals=2, dimensions=3, degree_limits=True,
+            presolve=True, seed=1))
+        self.assertEqual((instance.num_nodes, instance.num_edges,
+                          instance.num_arcs), (30, 50, 10))
+        self.assertEqual(instance.root, expected.root)
+        self.assertEqual(instance.edges.tolist(), expected.edges.tolist())
+        self.assertEqual(instance.coordinates.shape, (30, 3))
+        self.assertEqual(len(instance.maximum_degrees), 30)
+        self.assertFalse((instance.edges[:, 0] == instance.edges[:, 1])
+                         .any())
+
+    def test_too_many_terminals(self):
+        with self.assertRaises(ValueError):
+            generate(nodes=3, terminals=4)
+
+
+class TestConformance(unittest.TestCase):
+
+    def test_recording_instance(self):
+        instance = RecordingInstance()
+        reference_parser()(generate_lines(nodes=3, edges=2, terminals=1,
+                                          seed=0), instance).parse()
+        names = [name for name, _ in instance.events()]
+        self.assertEqual(names[0], 'header')
+        self.assertIn('graph__e', names)
+        self.assertEqual(names[-1], 'eof')
+
+    def test_engines_agree_on_synthetic_and_fuzzed_inputs(self):
+        with open(HELLO) as stp_file:
+            corpus = [('hello', stp_file.readlines())]
+        corpus.extend(synthetic_corpus(6, seed=2))
+        report = run(corpus, fuzz_count=15, seed=3)
+        self.assertTrue(report.ok, report.format())
+        self.assertEqual((report.instances, report.fuzzed), (7, 105))
+        self.assertEqual(set(report.throughput),
+                         set((engine.kind, engine.name)
+                             for engine in ENGINES))
+        self.assertIn('speedup', report.format())
+
+    def test_fuzz_mutations(self):
+        lines = generate_lines(nodes=5, edges=4, terminals=2, seed=0)
+        rng = random.Random(0)
+        seen = set()
+        for _ in range(100):
+            name, mutated = fuzz(lines, rng)
+            seen.add(name)
+        self.assertEqual(seen, set(name for name, _ in MUTATIONS))
+        self.assertEqual(lines, generate_lines(nodes=5, edges=4,
+                                               terminals=2, seed=0))
+
+    def test_broken_engine_is_reported(self):
+        def skip_last_edge(lines, reference):
+            lines = [line for line in lines if not line.startswith('E ')]
+            return _normalize_arrays(parse_arrays(lines))
+
+        engines = ENGINES + (Engine('broken', 'arrays', skip_last_edge),)
+        report = run(synthetic_corpus(1), engines)
+        self.assertEqual([(mismatch['kind'], mismatch['engine'])
+                          for mismatch in report.mismatches],
+                         [('arrays', 'broken')])
+
+    def test_errors_are_compared(self):
+        lines = generate_lines(nodes=5, edges=4, terminals=2, seed=0)
+        lines.insert(4, 'E 1 x 3\n')
+
+        class LenientParser(SteinlibParser):
+            def parse(self):
+                try:
+                    super(LenientParser, self).parse()
+                except Exception:
+                    pass
+
+        def lenient(lines, reference):
+            instance = RecordingInstance()
+            LenientParser(lines, instance).parse()
+            return instance.events()
+
+        mismatches = check(lines, ENGINES[:1] +
+                           (Engine('lenient', 'events', lenient),))
+        self.assertEqual(len(mismatches), 1)
+        kind, engine, expected, actual = mismatches[0]
+        self.assertEqual(expected[:2], ('error', 'SteinlibParsingException'))
+        self.assertEqual(expected[2], 5)
+        self.assertEqual(actual[0], 'ok')
+
+    def test_fixed_trace(self):
+        lines = ['33D32945 STP File, STP Format Version 1.0',
+                 'SECTION Comment', 'Name "tiny"', 'END',
+                 'SECTION Graph', 'Nodes 3', 'e 1 2 5', 'A  2\t3 6', 'END',
+                 'SECTION Terminals', 'RootP 1', 'T 3', 'END',
+                 'SECTION Coordinates', 'DD 1 0 0', 'DD', 'END', 'EOF']
+        expected = [
+            ('header', ('STP File, STP Format Version 1.0',)),
+            ('section', ('Comment',)), ('comment', ('Comment',)),
+            ('comment__name', ('tiny',)), ('comment__end', ()),
+            ('section', ('Graph',)), ('graph', ('Graph',)),
+            ('graph__nodes', (3,)), ('graph__e', (1, 2, 5)),
+            ('graph__a', (2, 3, 6)), ('graph__end', ()),
+            ('section', ('Terminals',)), ('terminals', ('Terminals',)),
+            ('terminals__rootp', (1,)), ('terminals__t', (3,)),
+            ('terminals__end', ()),
+            ('section', ('Coordinates',)), ('coordinates', ('Coordinates',)),
+            ('coordinates__dd', (1, 0, 0)), ('coordinates__dd', ()),
+            ('coordinates__end', ()), ('eof', ())]
+        for parser in (SteinlibParser, reference_parser()):
+            instance = RecordingInstance()
+            parser(lines, instance).parse()
+            self.assertEqual(instance.events(), expected)
+
+    def test_grammar_changes_are_caught(self):
+        section = SECTIONS.sections['MaximumDegrees']
+        register_section('MaximumDegrees', [Record('MD', (INT, INT))],
+                         replace=True)
+        try:
+            lines = generate_lines(nodes=4, edges=3, terminals=2,
+                                   degree_limits=True, seed=0)
+            mismatches = check(lines, ENGINES[:2])
+        finally:
+            SECTIONS.register(section, replace=True)
+        self.assertEqual([mismatch[:2] for mismatch in mismatches],
+                         [('events', 'compiled')])
+
+
+if __name__ == '__main__':
+    unittest.main()
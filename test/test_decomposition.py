@@ -0,0 +1,162 @@
+import itertools
+import pickle
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import POTENTIAL_TERMINAL, ROOT, SteinlibArrays
+from steinlib.decomposition import biconnected_blocks, decompose
+from steinlib.generator import generate
+from steinlib.pruning import connected_components
+
+try:
+    import networkx
+except ImportError:
+    networkx = None
+
+
+# Two triangles joined at 3, a path 5-6-7 hanging from 5, a square
+# 7-8-9-10 with a chord, and a pendant 11 without terminals.
+EDGES = [[1, 2, 1], [2, 3, 1], [1, 3, 3], [3, 4, 2], [4, 5, 2], [3, 5, 1],
+         [5, 6, 4], [6, 7, 4], [7, 8, 1], [8, 9, 1], [9, 10, 1], [10, 7, 1],
+         [7, 9, 5], [10, 11, 2], [8, 8, 1]]
+
+
+def _instance(terminals, kinds=None):
+    return SteinlibArrays(num_nodes=11, edges=EDGES, terminals=terminals,
+                          terminal_kinds=kinds, maximum_degrees=[2] * 11,
+                          coordinate_ids=np.arange(1, 12),
+                          coordinates=np.arange(22).reshape(11, 2))
+
+
+def _optimum(instance):
+    # cheapest connected set of rows touching every terminal, by brute force
+    terminals = set(instance.terminals.tolist())
+    best = (0, [])
+    if len(terminals) < 2:
+        return best
+    best = (None, None)
+    for size in range(1, len(instance.edges) + 1):
+        for subset in itertools.combinations(range(len(instance.edges)),
+                                             size):
+            chosen = instance.edges[list(subset)]
+            cost = int(chosen[:, 2].sum())
+            if best[0] is not None and cost >= best[0]:
+                continue
+            nodes = set(chosen[:, :2].ravel().tolist())
+            if not terminals <= nodes:
+                continue
+            graph = SteinlibArrays(num_nodes=instance.num_nodes,
+                                   edges=chosen)
+            labels = connected_components(graph)
+            if len(set(labels[list(nodes)].tolist())) == 1:
+                best = (cost, list(subset))
+    return best
+
+
+class TestBlocks(unittest.TestCase):
+
+    def test_blocks(self):
+        labels = biconnected_blocks(_instance([1, 9]))
+        self.assertEqual(labels[-1], -1)
+        groups = sorted(sorted(np.flatnonzero(labels == label).tolist())
+                        for label in np.unique(labels[labels >= 0]))
+        self.assertEqual(groups, [[0, 1, 2], [3, 4, 5], [6], [7],
+                                  [8, 9, 10, 11, 12], [13]])
+
+    def test_long_path_is_not_recursive(self):
+        count = 50000
+        ids = np.arange(1, count + 1)
+        path = SteinlibArrays(
+            num_nodes=count,
+            edges=np.column_stack((ids[:-1], ids[1:], np.ones(count - 1))))
+        labels = biconnected_blocks(path)
+        self.assertEqual(len(np.unique(labels)), count - 1)
+
+    def test_parallel_edges_form_a_block(self):
+        instance = SteinlibArrays(num_nodes=3, edges=[[1, 2, 1], [2, 1, 2],
+                                                      [2, 3, 1]])
+        self.assertEqual(len(set(biconnected_blocks(instance)[:2])), 1)
+        self.assertNotEqual(biconnected_blocks(instance)[2],
+                            biconnected_blocks(instance)[0])
+
+    @unittest.skipUnless(networkx, 'networkx is not installed')
+    def test_matches_networkx(self):
+        for seed in range(5):
+            instance = generate(nodes=60, edges=80, terminals=4, seed=seed)
+            pairs = np.sort(instance.edges[:, :2], axis=1)
+            _, unique = np.unique(pairs, axis=0, return_index=True)
+            instance = SteinlibArrays(num_nodes=60,
+                                      edges=instance.edges[np.sort(unique)],
+                                      terminals=instance.terminals)
+            labels = biconnected_blocks(instance)
+            graph = networkx.Graph()
+            graph.add_edges_from(instance.edges[:, :2].tolist())
+            expected = sorted(
+                sorted(tuple(sorted(edge)) for edge in component)
+                for component in networkx.biconnected_component_edges(graph))
+            actual = sorted(
+                sorted(tuple(sorted(edge)) for edge in
+                       instance.edges[labels == label, :2].tolist())
+                for label in np.unique(labels))
+            self.assertEqual(actual, expected)
+            self.assertEqual(
+                decompose(instance).articulation_points.tolist(),
+                sorted(networkx.articulation_points(graph)))
+
+
+class TestDecompose(unittest.TestCase):
+
+    def test_terminal_sets(self):
+        decomposition = decompose(_instance([1, 9]))
+        self.assertEqual(len(decomposition), 6)
+        self.assertEqual(decomposition.articulation_points.tolist(),
+                         [3, 5, 6, 7, 10])
+        terminals = dict(
+            (tuple(decomposition.edges_of(block).tolist()),
+             decomposition.terminals_of(block).tolist())
+            for block in range(len(decomposition)))
+        self.assertEqual(terminals, {
+            (0, 1, 2): [1, 3], (3, 4, 5): [3, 5], (6,): [5, 6], (7,): [6, 7],
+            (8, 9, 10, 11, 12): [7, 9], (13,): [10]})
+        needed = [tuple(decomposition.edges_of(block).tolist())
+                  for block in np.flatnonzero(decomposition.needed)]
+        self.assertEqual(sorted(needed), [(0, 1, 2), (3, 4, 5), (6,), (7,),
+                                          (8, 9, 10, 11, 12)])
+
+    def test_block_instances(self):
+        source = _instance([1, 9, 2], kinds=[ROOT, 0, 0])
+        decomposition = decompose(source)
+        block = int(decomposition.edge_blocks[0])
+        instance = decomposition.instance(block)
+        self.assertEqual(instance.original_ids.tolist(), [1, 2, 3])
+        self.assertEqual(instance.edges.tolist(),
+                         [[0, 1, 1], [1, 2, 1], [0, 2, 3]])
+        self.assertEqual(instance.terminals.tolist(), [0, 1, 2])
+        self.assertEqual(instance.terminal_kinds.tolist(), [ROOT, 0, 0])
+        self.assertEqual(instance.maximum_degrees.tolist(), [2, 2, 2])
+        self.assertEqual(instance.coordinates.tolist(),
+                         [[0, 1], [2, 3], [4, 5]])
+        copy = pickle.loads(pickle.dumps(instance))
+        self.assertEqual(copy.edges.tolist(), instance.edges.tolist())
+
+    def test_recombination_is_optimal(self):
+        for terminals in ([1, 9], [2, 4, 11], [6, 8], [1, 2]):
+            source = _instance(terminals)
+            decomposition = decompose(source)
+            solutions = [(block, _optimum(instance)[1])
+                         for block, instance in decomposition.instances()]
+            rows = decomposition.recombine(solutions)
+            self.assertEqual(int(source.edges[rows, 2].sum()),
+                             _optimum(source)[0])
+
+    def test_unsupported_instances(self):
+        self.assertRaises(ValueError, decompose, _instance(
+            [1, 9], kinds=[0, POTENTIAL_TERMINAL]))
+        mixed = SteinlibArrays(num_nodes=2, edges=[[1, 2, 1]],
+                               directed=[True])
+        self.assertRaises(ValueError, decompose, mixed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,284 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import POTENTIAL_TERMINAL, SteinlibArrays, parse_arrays
+from steinlib.cache import InstanceCache
+from steinlib.delta import InstanceDelta, apply_delta
+from steinlib.fingerprint import fingerprint
+from steinlib.generator import generate, generate_lines
+from steinlib.index import EdgeIndex
+
+
+def _fresh(instance):
+    return SteinlibArrays.from_arrays(instance.arrays(), instance.metadata())
+
+
+def _build_caches(instance):
+    instance.csr()
+    instance.edge_index()
+    instance.fingerprint_state()
+    return instance
+
+
+class TestDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.base = _build_caches(generate(nodes=40, edges=120, arcs=30,
+                                           terminals=5, seed=3))
+        self.edges = self.base.edges.copy()
+
+    def _delta(self):
+        edges = self.base.edges
+        delta = InstanceDelta()
+        delta.remove_edge(edges[3, 0], edges[3, 1])
+        delta.remove_edge(edges[100, 0], edges[100, 1])
+        delta.reweight(edges[7, 1], edges[7, 0], 999)
+        delta.add_edge(1, 2, 5)
+        delta.add_edge(40, 40, 6)
+        delta.add_edge(3, 9, 7, directed=True)
+        delta.remove_terminal(self.base.terminals[1])
+        delta.add_terminal(39, POTENTIAL_TERMINAL)
+        return delta
+
+    def _check_caches(self, instance):
+        expected = _fresh(instance)
+        for actual, wanted in zip(instance.csr(), expected.csr()):
+            self.assertEqual(actual.tolist(), wanted.tolist())
+        index, wanted = instance.edge_index(), expected.edge_index()
+        self.assertEqual(index.duplicates.tolist(),
+                         wanted.duplicates.tolist())
+        pairs = np.vstack((instance.edges[:, :2], [[1, 40], [39, 38]]))
+        self.assertEqual(index.find(pairs[:, 0], pairs[:, 1]).tolist(),
+                         wanted.find(pairs[:, 0], pairs[:, 1]).tolist())
+        self.assertEqual(index.weights(pairs[:, 1], pairs[:, 0]).tolist(),
+                         wanted.weights(pairs[:, 1], pairs[:, 0]).tolist())
+        self.assertEqual(instance.fingerprint_state().hexdigest(),
+                         fingerprint(expected))
+
+    def test_copy_on_write(self):
+        variant = apply_delta(self.base, self._delta())
+        self.assertEqual(len(variant.edges), 151)
+        self.assertEqual(variant.edges[-3:].tolist(),
+                         [[1, 2, 5], [40, 40, 6], [3, 9, 7]])
+        self.assertEqual(variant.directed[-3:].tolist(),
+                         [False, False, True])
+        self.assertEqual(int(variant.edge_index().weight(*self.edges[7, :2])),
+                         999)
+        self.assertEqual(variant.terminals[-1], 39)
+        self.assertNotIn(self.base.terminals[1], variant.terminals)
+        self.assertIs(variant.coordinates, self.base.coordinates)
+        self._check_caches(variant)
+
+        # the base is left as it was
+        self.assertEqual(self.base.edges.tolist(), self.edges.tolist())
+        self._check_caches(self.base)
+
+    def test_in_place(self):
+        instance = apply_delta(self.base, self._delta(), in_place=True)
+        self.assertIs(instance, self.base)
+        self.assertEqual(len(instance.edges), 151)
+        self._check_caches(instance)
+
+    def test_reweight_only(self):
+        delta = InstanceDelta(reweight_edges=[
+            (self.edges[0, 0], self.edges[0, 1], 1),
+            (self.edges[50, 0], self.edges[50, 1], 2)])
+        variant = apply_delta(self.base, delta)
+        self.assertIs(variant.csr(), self.base.csr())
+        self.assertEqual(variant.weights[[0, 50]].tolist(), [1, 2])
+        self.assertEqual(self.base.weights[0], self.edges[0, 2])
+        self._check_caches(variant)
+
+        # the shared index tables are copied before a structural change
+        variant = apply_delta(variant, InstanceDelta(
+            remove_edges=[self.edges[0, :2]]), in_place=True)
+        self._check_caches(variant)
+        self._check_caches(self.base)
+
+    def test_duplicates(self):
+        instance = _build_caches(parse_arrays(
+            ['33D32945 STP File, STP Format Version 1.0', 'SECTION Graph',
+             'Nodes 3', 'E 1 2 3', 'E 2 1 4', 'A 1 2 5', 'A 1 2 6',
+             'E 2 3 1', 'END', 'SECTION Terminals', 'T 1', 'END', 'EOF']))
+        # removing an indexed record promotes its first duplicate
+        delta = InstanceDelta(remove_edges=[(1, 2), (3, 2)],
+                              add_edges=[(1, 2, 9), (2, 1, 8), (2, 3, 7)],
+                              add_directed=[True, False, False])
+        variant = apply_delta(instance, delta)
+        self.assertEqual(variant.edge_index().weight(2, 1), 4)
+        self.assertEqual(variant.edge_index().weight(2, 3), 7)
+        self._check_caches(variant)
+        self.assertEqual(variant.edges.tolist(),
+                         [[2, 1, 4], [1, 2, 5], [1, 2, 6], [1, 2, 9],
+                          [2, 1, 8], [2, 3, 7]])
+
+        # removing a pair again removes its next record, edges first
+        with self.assertRaises(ValueError):
+            apply_delta(variant, InstanceDelta(remove_edges=[(1, 2)] * 3))
+        variant = apply_delta(variant, InstanceDelta(
+            remove_edges=[(1, 2), (1, 2)]))
+        self.assertEqual(variant.edges.tolist(),
+                         [[1, 2, 5], [1, 2, 6], [1, 2, 9], [2, 3, 7]])
+        self._check_caches(variant)
+
+    def test_lazy_caches(self):
+        base = generate(nodes=10, edges=20, terminals=2, seed=1)
+        variant = apply_delta(base, InstanceDelta(add_edges=[(1, 2, 3)]))
+        self.assertIsNone(variant.cached_index('csr'))
+        self.assertIsNone(base.cached_index('edge_index'))
+        self._check_caches(variant)
+
+    def test_compacted_ids(self):
+        base = _build_caches(parse_arrays(
+            ['33D32945 STP File, STP Format Version 1.0', 'SECTION Graph',
+             'E 10 20 1', 'E 20 30 2', 'END', 'SECTION Terminals', 'T 10',
+             'END', 'EOF'], compact=True))
+        variant = apply_delta(base, InstanceDelta(
+            add_edges=[(10, 30, 4)], add_terminals=[30],
+            remove_edges=[(30, 20)]))
+        self.assertEqual(variant.edges.tolist(), [[0, 1, 1], [0, 2, 4]])
+        self.assertEqual(variant.terminals.tolist(), [0, 2])
+        self._check_caches(variant)
+        with self.assertRaises(ValueError):
+            apply_delta(base, InstanceDelta(add_edges=[(10, 40, 4)]))
+
+    def test_invalid_changes(self):
+        for delta in (InstanceDelta(remove_edges=[(1, 1)]),
+                      InstanceDelta(reweight_edges=[(1, 41, 3)]),
+                      InstanceDelta(add_edges=[(0, 3, 1)]),
+                      InstanceDelta(remove_terminals=[
+                          np.setdiff1d(np.arange(1, 41),
+                                       self.base.terminals)[0]]),
+                      InstanceDelta(add_terminals=[self.base.terminals[0]]),
+                      InstanceDelta(remove_edges=[self.edges[0, :2]] * 2),
+                      InstanceDelta(base='0' * 64)):
+            with self.assertRaises(ValueError):
+                apply_delta(self.base, delta, in_place=True)
+        self.assertEqual(self.base.edges.tolist(), self.edges.tolist())
+        self._check_caches(self.base)
+
+    def test_base_is_checked_without_a_built_fingerprint(self):
+        fresh = _fresh(self.base)
+        self.assertIsNone(fresh.cached_index('fingerprint_state'))
+        delta = InstanceDelta(add_edges=[(1, 2, 5)], base='0' * 64)
+        self.assertRaises(ValueError, apply_delta, fresh, delta)
+        delta.base = fingerprint(self.base)
+        self.assertEqual(len(apply_delta(fresh, delta).edges),
+                         len(self.edges) + 1)
+
+    def test_read_only_edges(self):
+        self.base.edges.setflags(write=False)
+        delta = InstanceDelta(reweight_edges=[(self.edges[0, 0],
+                                               self.edges[0, 1], 1)])
+        with self.assertRaises(ValueError):
+            apply_delta(self.base, delta, in_place=True)
+        self.assertEqual(apply_delta(self.base, delta).weights[0], 1)
+
+    def test_unpickled_from_read_only_buffers(self):
+        buffers = []
+        data = pickle.dumps(self.base, 5, buffer_callback=buffers.append)
+        copy = pickle.loads(data, buffers=[buffer.raw().tobytes()
+                                           for buffer in buffers])
+        self.assertFalse(copy.edges.flags.writeable)
+        delta = InstanceDelta(reweight_edges=[(self.edges[0, 0],
+                                               self.edges[0, 1], 1)])
+        with self.assertRaises(ValueError):
+            apply_delta(copy, delta, in_place=True)
+        self.assertEqual(apply_delta(copy, delta).weights[0], 1)
+
+    def test_npz_round_trip(self):
+        delta = self._delta()
+        delta.base = 'abc'
+        path = os.path.join(tempfile.mkdtemp(), 'delta.npz')
+        try:
+            delta.to_npz(path)
+            loaded = InstanceDelta.from_npz(path)
+        finally:
+            shutil.rmtree(os.path.dirname(path))
+        self.assertEqual(loaded.base, 'abc')
+        self.assertEqual(len(loaded), len(delta))
+        for (name, values), (_, expected) in zip(loaded.arrays(),
+                                                 delta.arrays()):
+            self.assertEqual(values.tolist(), expected.tolist(), name)
+
+    def test_pickle(self):
+        delta = self._delta()
+        loaded = pickle.loads(pickle.dumps(delta, 5))
+        self.assertEqual(
+            pickle.loads(pickle.dumps(InstanceDelta(base='abc'))).base,
+            'abc')
+        for (name, values), (_, expected) in zip(loaded.arrays(),
+                                                 delta.arrays()):
+            self.assertEqual(values.tolist(), expected.tolist(), name)
+        self.assertEqual(apply_delta(self.base, loaded).edges.tolist(),
+                         apply_delta(self.base, delta).edges.tolist())
+
+
+class TestIncrementalEdgeIndex(unittest.TestCase):
+
+    def test_random_updates_match_a_rebuild(self):
+        rng = np.random.RandomState(5)
+        edges = rng.randint(1, 8, (60, 3))
+        directed = rng.rand(60) < 0.3
+        index = EdgeIndex(edges, directed)
+        for _ in range(20):
+            removed = np.unique(rng.randint(0, len(edges), 5))
+            kept = np.ones(len(edges), dtype=np.bool_)
+            kept[removed] = False
+            mapping = np.full(len(edges), -1)
+            mapping[kept] = np.arange(kept.sum())
+            added = rng.randint(1, 8, (6, 3))
+            new_edges = np.vstack((edges[kept], added))
+            new_directed = np.concatenate((directed[kept],
+                                           rng.rand(6) < 0.3))
+            index = index.updated(new_edges, new_directed, directed,
+                                  removed, mapping, copy=rng.rand() < 0.5)
+            edges, directed = new_edges, new_directed
+            expected = EdgeIndex(edges, directed)
+            self.assertEqual(index.duplicates.tolist(),
+                             expected.duplicates.tolist())
+            tails, heads = np.meshgrid(np.arange(9), np.arange(9))
+            self.assertEqual(
+                index.find(tails.ravel(), heads.ravel()).tolist(),
+                expected.find(tails.ravel(), heads.ravel()).tolist())
+
+
+class TestCachedDeltas(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'base.stp')
+        with open(self.path, 'w') as stp_file:
+            stp_file.writelines(generate_lines(nodes=20, edges=50,
+                                               terminals=3, seed=2))
+        self.cache = InstanceCache(os.path.join(self.directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_variants(self):
+        base = self.cache.load(self.path)
+        node = np.setdiff1d(np.arange(1, 21), base.terminals)[0]
+        delta = InstanceDelta(add_edges=[(1, 20, 3)], add_terminals=[node])
+        self.cache.store_delta(self.path, 'more', delta)
+        self.assertEqual(delta.base, self.cache.fingerprint(self.path))
+        self.assertEqual(self.cache.deltas(self.path), ['more'])
+
+        cache = InstanceCache(self.cache.directory)
+        base = cache.load(self.path)
+        self.assertEqual(len(base.edges), 50)
+        variant = cache.load_variant(self.path, 'more')
+        self.assertEqual(len(variant.edges), 51)
+        self.assertIn(node, variant.terminals.tolist())
+        self.assertEqual(cache.hits, 2)
+        with self.assertRaises(ValueError):
+            cache.store_delta(self.path, '../x', delta)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays
+from steinlib.distance import DistanceProvider
+from steinlib.spatial import distances
+
+
+class TestDistanceProvider(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(3)
+        self._points = random.randint(0, 100, size=(50, 2))
+        self._ids = np.arange(1, 51) * 2
+        self._sut = DistanceProvider(self._ids, self._points, 'l1',
+                                     block_size=8, cache_blocks=4)
+
+    def _dense(self, metric='l1'):
+        return distances(self._points[:, np.newaxis] -
+                         self._points[np.newaxis], metric).astype(float)
+
+    def test_pairs_and_rows(self):
+        dense = self._dense()
+        self.assertEqual(self._sut.distance(2, 4), dense[0, 1])
+        np.testing.assert_array_equal(self._sut.pairs([2, 100], [100, 6]),
+                                      [dense[0, 49], dense[49, 2]])
+        np.testing.assert_array_equal(self._sut.row(22), dense[10])
+
+    def test_blocks_are_cached_with_lru(self):
+        self._sut.block(0, 1)
+        self._sut.block(0, 1)
+        self.assertEqual((self._sut.hits, self._sut.misses), (1, 1))
+        for column in range(2, 6):
+            self._sut.block(0, column)
+        self.assertEqual(len(self._sut._cache), 4)
+        self._sut.block(0, 1)
+        self.assertEqual(self._sut.misses, 6)
+        with self.assertRaises(IndexError):
+            self._sut.block(0, 7)
+
+    def test_streaming_nearest(self):
+        dense = self._dense()
+        np.fill_diagonal(dense, np.inf)
+        blocks = list(self._sut.iter_nearest(3))
+        self.assertEqual(len(blocks), 7)
+        ids = np.concatenate([block[0] for block in blocks])
+        found = np.vstack([block[2] for block in blocks])
+        np.testing.assert_array_equal(ids, self._ids)
+        np.testing.assert_array_equal(found, np.sort(dense, axis=1)[:, :3])
+        first_neighbors = blocks[0][1][0]
+        np.testing.assert_array_equal(
+            self._sut.pairs(np.full(3, 2), first_neighbors), found[0])
+
+    def test_unknown_ids(self):
+        with self.assertRaises(KeyError):
+            self._sut.distance(1, 2)
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            DistanceProvider(self._ids, self._points, 'cosine')
+
+
+class TestSteinlibArraysDistances(unittest.TestCase):
+
+    def test_distances_between_terminals(self):
+        instance = SteinlibArrays(coordinate_ids=[1, 2, 3],
+                                  coordinates=[[0, 0], [3, 4], [6, 8]],
+                                  terminals=[3, 1])
+        sut = instance.distances('linf', ids=instance.terminals)
+        self.assertEqual(len(sut), 2)
+        self.assertEqual(sut.row(3).tolist(), [0, 8])
+        self.assertEqual(instance.distances().distance(1, 2), 5)
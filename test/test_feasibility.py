@@ -0,0 +1,120 @@
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays
+from steinlib.feasibility import FeasibilityChecker, check_feasibility
+from steinlib.generator import generate
+
+
+def _expected(instance, rows):
+    degrees = {}
+    for row in rows:
+        for node in instance.edges[row, :2]:
+            degrees[int(node)] = degrees.get(int(node), 0) + 1
+    violations = 0
+    for offset, limit in enumerate(instance.maximum_degrees):
+        if degrees.get(offset + instance.first_id, 0) > limit:
+            violations += 1
+    terminals = set(int(node) for node in instance.terminals)
+    uncovered = len(terminals - set(degrees)) if len(terminals) > 1 else 0
+    return int(instance.edges[rows, 2].sum()), violations, uncovered
+
+
+class TestFeasibility(unittest.TestCase):
+
+    def setUp(self):
+        self.instance = generate(nodes=30, edges=80, terminals=6,
+                                 degree_limits=True, presolve=True, seed=11)
+        self.checker = FeasibilityChecker(self.instance)
+        rng = np.random.RandomState(4)
+        self.candidates = [
+            rng.choice(len(self.instance.edges), size, replace=False)
+            for size in rng.randint(0, 40, size=200)]
+
+    def test_matches_reference(self):
+        result = self.checker.check_batch(self.candidates)
+        self.assertEqual(len(result), 200)
+        for position, rows in enumerate(self.candidates):
+            cost, violations, uncovered = _expected(self.instance, rows)
+            self.assertEqual(int(result.cost[position]), cost)
+            self.assertEqual(int(result.degree_violations[position]),
+                             violations)
+            self.assertEqual(int(result.uncovered_terminals[position]),
+                             uncovered)
+        self.assertTrue(result.degree_violations.any())
+
+    def test_input_forms(self):
+        expected = self.checker.check_batch(self.candidates)
+        masks = np.zeros((200, len(self.instance.edges)), dtype=np.bool_)
+        for position, rows in enumerate(self.candidates):
+            masks[position, rows] = True
+        indptr = np.zeros(201, dtype=np.int64)
+        np.cumsum([len(rows) for rows in self.candidates], out=indptr[1:])
+        for result in (self.checker.check_batch(masks),
+                       self.checker.check_batch(list(masks)),
+                       self.checker.check_csr(
+                           indptr, np.concatenate(self.candidates))):
+            self.assertEqual(result.cost.tolist(), expected.cost.tolist())
+            self.assertEqual(result.degree_violations.tolist(),
+                             expected.degree_violations.tolist())
+            self.assertEqual(result.uncovered_terminals.tolist(),
+                             expected.uncovered_terminals.tolist())
+        self.assertRaises(ValueError, self.checker.check_batch, masks[:, 1:])
+        self.assertRaises(ValueError, self.checker.check_csr, indptr[1:],
+                          np.concatenate(self.candidates))
+
+    def test_pairs_are_two_candidates(self):
+        first, second = self.candidates[1], self.candidates[2]
+        result = self.checker.check_batch((first, second))
+        self.assertEqual(result.cost.tolist(),
+                         self.checker.check_batch([first, second])
+                         .cost.tolist())
+        rows = np.array([[0, 1], [2, 3]])
+        self.assertEqual(self.checker.check_batch(rows).cost.tolist(),
+                         self.checker.check_batch(list(rows)).cost.tolist())
+
+    def test_rows_outside_the_edges(self):
+        count = len(self.instance.edges)
+        for rows in ([-1], [count], [0, count + 5]):
+            self.assertRaises(ValueError, self.checker.check, rows)
+            self.assertRaises(ValueError, self.checker.over_limit, rows)
+            self.assertRaises(ValueError, self.checker.check_csr,
+                              [0, len(rows)], rows)
+
+    def test_sparse_counting(self):
+        # enough candidates for the sorted counting of the degrees
+        candidates = self.candidates * 20
+        result = self.checker.check_batch(candidates)
+        expected = self.checker.check_batch(self.candidates)
+        self.assertEqual(result.degree_violations.tolist(),
+                         expected.degree_violations.tolist() * 20)
+
+    def test_bounds(self):
+        instance = SteinlibArrays(
+            num_nodes=4, edges=[[1, 2, 5], [2, 3, 5], [3, 4, 5], [1, 4, 20]],
+            terminals=[1, 3], maximum_degrees=[1, 2, 2, 2],
+            presolve={'fixed': 2, 'lower': 12, 'upper': 20})
+        checker = FeasibilityChecker(instance)
+        self.assertEqual(checker.check([0, 1]), {
+            'cost': 10, 'degree_violations': 0, 'uncovered_terminals': 0,
+            'below_lower': False, 'above_upper': False, 'feasible': True})
+        self.assertTrue(checker.check([0])['below_lower'])
+        self.assertEqual(checker.check([0])['uncovered_terminals'], 1)
+        result = check_feasibility(instance, [True, True, True, True])
+        self.assertTrue(result['above_upper'])
+        self.assertEqual(result['degree_violations'], 1)
+        self.assertFalse(result['feasible'])
+        self.assertEqual(checker.over_limit([0, 3]).tolist(), [1])
+
+    def test_without_limits(self):
+        instance = generate(nodes=20, edges=40, terminals=1, seed=2)
+        result = FeasibilityChecker(instance).check_batch(
+            [np.arange(40), []])
+        self.assertEqual(result.degree_violations.tolist(), [0, 0])
+        self.assertEqual(result.uncovered_terminals.tolist(), [0, 0])
+        self.assertEqual(result.feasible.tolist(), [True, True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from steinlib.arrays import parse_arrays
+from steinlib.cache import InstanceCache
+from steinlib.fingerprint import find_duplicates, fingerprint
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+HELLO = os.path.join(EXAMPLES_DIR, 'hello.stp')
+
+
+def _instance(edges, name='x', terminals=(1,), presolve=()):
+    lines = ['33D32945 STP File, STP Format Version 1.0',
+             'SECTION Comment', 'Name "%s"' % name, 'END',
+             'SECTION Graph', 'Nodes 3']
+    lines.extend(edges)
+    lines.extend(['END', 'SECTION Terminals'])
+    lines.extend('T %d' % terminal for terminal in terminals)
+    lines.append('END')
+    if presolve:
+        lines.append('SECTION Presolve')
+        lines.extend(presolve)
+        lines.append('END')
+    lines.append('EOF')
+    return [line + '\n' for line in lines]
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_independent_of_order_and_formatting(self):
+        first = parse_arrays(_instance(['E 1 2 5', 'E 2 3 6'], 'a'))
+        second = parse_arrays(_instance(['e   3 2 6', 'E 2 1  5'], 'b'))
+        self.assertEqual(fingerprint(first), fingerprint(second))
+        self.assertEqual(fingerprint(first),
+                         fingerprint(first.compacted()))
+
+    def test_structure_changes_the_fingerprint(self):
+        base = fingerprint(parse_arrays(_instance(['E 1 2 5', 'E 2 3 6'])))
+        for edges, terminals in ((['E 1 2 5', 'E 2 3 7'], (1,)),
+                                 (['A 1 2 5', 'E 2 3 6'], (1,)),
+                                 (['E 1 2 5', 'E 2 3 6'], (2,))):
+            other = parse_arrays(_instance(edges, terminals=terminals))
+            self.assertNotEqual(fingerprint(other), base)
+
+    def test_arc_direction_matters(self):
+        first = parse_arrays(_instance(['A 1 2 5']))
+        second = parse_arrays(_instance(['A 2 1 5']))
+        self.assertNotEqual(fingerprint(first), fingerprint(second))
+
+
+class TestInstanceCache(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self._paths = []
+        for name, edges, presolve in (
+                ('a', ['E 1 2 5', 'E 2 3 6'], ()),
+                ('b', ['E 1 2 5', 'E 2 3 6'], ()),
+                ('c', ['E 1 3 1'], ()),
+                ('d', ['E 3 2 6', 'E 2 1 5'], ()),
+                ('e', ['E 1 2 5', 'E 2 3 6'], ('EC 1 2 3',))):
+            path = os.path.join(self._directory, name + '.stp')
+            with open(path, 'w') as stp_file:
+                stp_file.writelines(_instance(edges, name,
+                                              presolve=presolve))
+            self._paths.append(path)
+        self._sut = InstanceCache(os.path.join(self._directory, 'cache'))
+
+    def tearDown(self):
+        shutil.rmtree(self._directory)
+
+    def test_hits_and_misses(self):
+        first = self._sut.load(self._paths[0])
+        second = self._sut.load(self._paths[0])
+        self.assertEqual((self._sut.hits, self._sut.misses), (1, 1))
+        self.assertEqual(first.edges.tolist(), second.edges.tolist())
+        self.assertFalse(second.edges.flags.writeable)
+        self.assertIn(self._paths[0], self._sut)
+
+    def test_duplicates_share_arrays_but_not_metadata(self):
+        self._sut.load(self._paths[0])
+        self._sut.load(self._paths[1])
+        self.assertEqual(len(self._stored()), 1)
+        reopened = InstanceCache(self._sut.directory)
+        self.assertEqual(reopened.load(self._paths[1]).comment['name'], 'b')
+        self.assertEqual(reopened.hits, 1)
+
+    def test_equal_fingerprints_keep_their_own_arrays(self):
+        first = self._sut.load(self._paths[0])
+        reordered = self._sut.load(self._paths[3])
+        with_records = self._sut.load(self._paths[4])
+        self.assertEqual(len(set(self._sut.fingerprint(path) for path in
+                                 (self._paths[0], self._paths[3],
+                                  self._paths[4]))), 1)
+        self.assertEqual(len(self._stored()), 3)
+
+        reopened = InstanceCache(self._sut.directory)
+        for path, expected in ((self._paths[0], first),
+                               (self._paths[3], reordered),
+                               (self._paths[4], with_records)):
+            loaded = reopened.load(path)
+            self.assertEqual(loaded.edges.tolist(), expected.edges.tolist())
+            self.assertEqual(loaded.presolve_records['ec'].tolist(),
+                             expected.presolve_records['ec'].tolist())
+        self.assertEqual(reopened.load(self._paths[4])
+                         .presolve_records['ec'].tolist(), [[1, 2, 3]])
+        self.assertEqual(reopened.load(self._paths[0])
+                         .presolve_records['ec'].tolist(), [])
+        self.assertEqual(reopened.load(self._paths[3]).edges.tolist(),
+                         [[3, 2, 6], [2, 1, 5]])
+
+    def _stored(self):
+        return [name for name in os.listdir(self._sut.directory)
+                if name != InstanceCache.INDEX_NAME]
+
+    def test_changed_file_is_parsed_again(self):
+        self._sut.load(self._paths[2])
+        with open(self._paths[2], 'w') as stp_file:
+            stp_file.writelines(_instance(['E 1 3 2', 'E 1 2 2'], 'c'))
+        self.assertEqual(len(self._sut.load(self._paths[2]).edges), 2)
+        self.assertEqual(self._sut.misses, 2)
+
+    def test_find_duplicates(self):
+        groups = find_duplicates(self._paths, self._sut.load)
+        self.assertEqual(list(groups.values()),
+                         [self._paths[:2] + self._paths[3:]])
+        self.assertEqual(list(groups), [self._sut.fingerprint(self._paths[0])])
+        self.assertEqual(find_duplicates(self._paths), groups)
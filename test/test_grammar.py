@@ -0,0 +1,145 @@
+import io
+import unittest
+
+from mock import MagicMock
+
+from steinlib.arrays import SteinlibArrays, parse_arrays
+from steinlib.catalog import read_metadata
+from steinlib.exceptions import SteinlibParsingException, \
+                                UnrecognizedSectionException
+from steinlib.fingerprint import fingerprint
+from steinlib.grammar import INT, STRING, WORD, Record, Section
+from steinlib.parser import RootSectionParser, SteinlibParser
+from steinlib.section import SECTIONS, GrammarSectionParser, \
+                             register_section
+from steinlib.state import ParsingState
+from steinlib.writer import write_stp
+
+
+LINES = (
+    '33D32945 STP File, STP Format Version 1.0',
+    'SECTION Graph', 'Nodes 3', 'E 1 2 5', 'E 2 3 6', 'END',
+    'SECTION NodeWeights', 'NW 1 10', 'nw 3 30', 'END',
+    'SECTION Hops', 'HopLimit 4', 'Label "first try"', 'END',
+    'EOF',
+)
+
+
+class TestRecord(unittest.TestCase):
+
+    def _convert(self, record, line):
+        return record.compile()(line, line.split(None, 1))
+
+    def test_fixed_arity(self):
+        record = Record('E', (INT, INT, INT))
+        self.assertEqual(self._convert(record, 'e 1 2 3'), [1, 2, 3])
+        self.assertIsNone(self._convert(record, 'E 1 2'))
+        self.assertIsNone(self._convert(record, 'E 1 2 -3'))
+        self.assertEqual(record.arity, 3)
+        self.assertTrue(record.bulk)
+
+    def test_variadic(self):
+        record = Record('DD', variadic=INT)
+        self.assertEqual(self._convert(record, 'DD 1 2 3 4'), [1, 2, 3, 4])
+        self.assertEqual(self._convert(record, 'DD'), [])
+        self.assertEqual(record.compile(regex=True)('DD', ['DD']), [])
+        self.assertIsNone(self._convert(record, 'DD 1 x'))
+        self.assertIsNone(record.arity)
+        words = Record('Tags', (INT,), variadic=WORD)
+        self.assertEqual(self._convert(words, 'Tags 7 a 2'), [7, 'a', 2])
+
+    def test_strings(self):
+        record = Record('Name', (STRING,))
+        self.assertEqual(self._convert(record, 'name "A b"'), ['A b'])
+        self.assertIsNone(self._convert(record, 'Name A b'))
+        self.assertFalse(record.bulk)
+
+    def test_invalid_declarations(self):
+        with self.assertRaises(ValueError):
+            Record('X', ('float',))
+        with self.assertRaises(ValueError):
+            Record('X', (STRING,), variadic=INT)
+        with self.assertRaises(ValueError):
+            Section('X', [Record('A', (INT,)), Record('a', (INT,))])
+
+    def test_section_defaults(self):
+        section = Section('MaximumDegrees', [Record('MD', (INT,))])
+        self.assertEqual(section.callback_token, 'maximum_degrees')
+        records = section.compile()
+        self.assertEqual(sorted(records), ['end', 'md'])
+        self.assertEqual(records['end'][0], 'maximum_degrees__end')
+        self.assertEqual(records['end'][2], ParsingState.wait_for_section)
+
+
+class TestRegisterSection(unittest.TestCase):
+
+    def setUp(self):
+        self._parser = register_section('NodeWeights', [
+            Record('NW', (INT, INT)),
+        ])
+        register_section('Hops', [
+            Record('HopLimit', (INT,), bulk=False),
+            Record('Label', (STRING,)),
+        ])
+
+    def tearDown(self):
+        SECTIONS.unregister('NodeWeights')
+        SECTIONS.unregister('Hops')
+
+    def test_compiled_parser(self):
+        self.assertTrue(issubclass(self._parser, GrammarSectionParser))
+        self.assertEqual(self._parser.__name__, 'NodeWeightsSectionParser')
+        self.assertIs(RootSectionParser.section_parsers['NodeWeights'],
+                      self._parser)
+        with self.assertRaises(ValueError):
+            register_section('NodeWeights', [])
+
+    def test_callbacks(self):
+        instance = MagicMock()
+        SteinlibParser(LINES, instance).parse()
+        instance.nodeweights.assert_called_with(
+            'SECTION NodeWeights', ('NodeWeights',))
+        instance.node_weights__nw.assert_called_with('nw 3 30', [3, 30])
+        instance.hops__hoplimit.assert_called_with('HopLimit 4', [4])
+        instance.hops__label.assert_called_with('Label "first try"',
+                                                ['first try'])
+
+    def test_bad_record(self):
+        lines = LINES[:7] + ('NW 1',) + LINES[7:]
+        with self.assertRaises(SteinlibParsingException):
+            SteinlibParser(lines, MagicMock()).parse()
+
+    def test_unregistered_sections_are_unknown(self):
+        SECTIONS.unregister('Hops')
+        try:
+            with self.assertRaises(UnrecognizedSectionException):
+                SteinlibParser(LINES, MagicMock()).parse()
+        finally:
+            register_section('Hops', [])
+
+    def test_bulk_records_become_arrays(self):
+        instance = parse_arrays(LINES)
+        self.assertEqual(sorted(instance.extra_records),
+                         ['node_weights__nw'])
+        self.assertEqual(instance.extra_records['node_weights__nw'].tolist(),
+                         [[1, 10], [3, 30]])
+        rebuilt = SteinlibArrays.from_arrays(instance.arrays(),
+                                             instance.metadata())
+        self.assertEqual(rebuilt.extra_records['node_weights__nw'].tolist(),
+                         [[1, 10], [3, 30]])
+
+    def test_writer_and_fingerprint(self):
+        instance = parse_arrays(LINES)
+        stream = io.StringIO()
+        write_stp(instance, stream)
+        self.assertIn('SECTION NodeWeights\nNW 1 10\nNW 3 30\nEND',
+                      stream.getvalue())
+        stream.seek(0)
+        self.assertEqual(fingerprint(parse_arrays(stream)),
+                         fingerprint(instance))
+        lighter = parse_arrays([line.replace('NW 1 10', 'NW 1 9')
+                                for line in LINES])
+        self.assertNotEqual(fingerprint(lighter), fingerprint(instance))
+
+    def test_metadata_readers_skip_bulk_records(self):
+        self.assertEqual(read_metadata(LINES)['nodes'], 3)
@@ -0,0 +1,62 @@
+import os
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays, parse_arrays
+from steinlib.hanan import hanan_grid
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestHananGrid(unittest.TestCase):
+
+    def test_grid_without_obstacles(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            instance = parse_arrays(stp_file)
+        sut = hanan_grid(instance)
+        # 5 distinct x and 3 distinct y coordinates
+        self.assertEqual(sut.num_nodes, 15)
+        self.assertEqual(sut.num_edges, 4 * 3 + 5 * 2)
+        self.assertEqual(len(sut.terminals), 4)
+        terminal_points = sut.coordinates[sut.terminals - 1].tolist()
+        self.assertEqual(terminal_points,
+                         [[80, 50], [55, 5], [130, 50], [55, 95]])
+        # L1 weights, the total being every row and column spanned
+        self.assertEqual(sut.weights.sum(), 3 * 100 + 5 * 90)
+
+    def test_obstacle_interior_is_cut_out(self):
+        instance = SteinlibArrays(
+            coordinate_ids=[1, 2, 3, 4],
+            coordinates=[[0, 0], [10, 10], [5, 0], [0, 5]],
+            obstacles=[[8, 8, 2, 2]])
+        sut = hanan_grid(instance)
+        self.assertEqual(sut.num_nodes, 24)
+        self.assertEqual(sut.num_edges, 36)
+        self.assertNotIn([5, 5], sut.coordinates.tolist())
+        # border segments of the obstacle are kept, crossing ones are not
+        index = sut.edge_index()
+        self.assertEqual(index.weight(self._node_at(sut, 2, 2),
+                                      self._node_at(sut, 2, 5)), 3)
+        self.assertIsNone(index.weight(self._node_at(sut, 2, 5),
+                                       self._node_at(sut, 8, 5)))
+        self.assertEqual(len(sut.terminals), 4)
+
+    def _node_at(self, grid, x, y):
+        position = np.flatnonzero((grid.coordinates == [x, y]).all(axis=1))
+        return int(grid.coordinate_ids[position[0]])
+
+    def test_point_inside_obstacle(self):
+        instance = SteinlibArrays(
+            coordinate_ids=[1, 2, 3],
+            coordinates=[[0, 0], [10, 10], [5, 5]],
+            obstacles=[[2, 2, 8, 8]])
+        with self.assertRaises(ValueError):
+            hanan_grid(instance)
+
+    def test_needs_2d_coordinates(self):
+        instance = SteinlibArrays(coordinate_ids=[1],
+                                  coordinates=[[0, 0, 0]])
+        with self.assertRaises(ValueError):
+            hanan_grid(instance)
@@ -0,0 +1,60 @@
+import subprocess
+import sys
+import unittest
+
+import steinlib
+
+
+HEAVY_MODULES = ('numpy', 'argparse', 'pyarrow', 'scipy', 'networkx',
+                 'igraph')
+
+
+def _imported_modules(statement):
+    '''
+    Names of the modules loaded by ``statement`` in a fresh interpreter,
+    as reported by ``-X importtime``.
+    '''
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    modules = set()
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            modules.add(line.rsplit('|', 1)[1].strip())
+    return modules
+
+
+class TestImportTime(unittest.TestCase):
+
+    def assert_light(self, statement):
+        modules = _imported_modules(statement)
+        self.assertIn('steinlib', modules)
+        for module in HEAVY_MODULES:
+            self.assertNotIn(module, modules,
+                             '%s loaded by "%s"' % (module, statement))
+
+    def test_core_parser_only_needs_the_standard_library(self):
+        self.assert_light('import steinlib.parser, steinlib.instance')
+
+    def test_package_names_are_lazy(self):
+        self.assert_light('import steinlib; steinlib.SteinlibParser')
+
+    def test_catalog_does_not_load_numpy(self):
+        self.assert_light('import steinlib.catalog')
+
+    def test_array_names_load_on_first_use(self):
+        modules = _imported_modules('import steinlib; steinlib.parse_arrays')
+        self.assertIn('numpy', modules)
+
+
+class TestLazyNames(unittest.TestCase):
+
+    def test_lazy_names_resolve_to_their_modules(self):
+        from steinlib.parser import SteinlibParser
+        self.assertIs(steinlib.SteinlibParser, SteinlibParser)
+        self.assertIn('parse_arrays', dir(steinlib))
+
+    def test_unknown_name(self):
+        with self.assertRaises(AttributeError):
+            steinlib.no_such_name
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays
+from steinlib.index import EdgeIndex, PackedKeyTable
+
+
+class TestPackedKeyTable(unittest.TestCase):
+
+    def test_lookup_of_stored_and_missing_keys(self):
+        keys = np.arange(0, 3000, 3, dtype=np.uint64)
+        sut = PackedKeyTable(keys, np.arange(len(keys)))
+        self.assertEqual(len(sut), 1000)
+        np.testing.assert_array_equal(sut.lookup(keys), np.arange(1000))
+        self.assertTrue((sut.lookup(keys + np.uint64(1)) == -1).all())
+
+    def test_empty_table(self):
+        sut = PackedKeyTable([], [])
+        self.assertEqual(sut.lookup([1, 2]).tolist(), [-1, -1])
+
+
+class TestEdgeIndex(unittest.TestCase):
+
+    def setUp(self):
+        self._graph = SteinlibArrays(
+            edges=[[1, 2, 10], [3, 2, 20], [4, 5, 30], [2, 1, 40], [1, 2, 10]],
+            directed=[False, False, True, False, False])
+        self._sut = self._graph.edge_index()
+
+    def test_edges_match_both_orientations(self):
+        self.assertEqual(self._sut.weight(1, 2), 10)
+        self.assertEqual(self._sut.weight(2, 1), 10)
+        self.assertEqual(self._sut.weight(2, 3), 20)
+        self.assertTrue((2, 3) in self._sut)
+
+    def test_arcs_match_one_orientation(self):
+        self.assertEqual(self._sut.weight(4, 5), 30)
+        self.assertIsNone(self._sut.weight(5, 4))
+
+    def test_batched_lookups(self):
+        tails = np.array([1, 3, 5, 4, 7, -1])
+        heads = np.array([2, 2, 4, 5, 8, 2])
+        self.assertEqual(self._sut.find(tails, heads).tolist(),
+                         [0, 1, -1, 2, -1, -1])
+        self.assertEqual(self._sut.weights(tails, heads, missing=0).tolist(),
+                         [10, 20, 0, 30, 0, 0])
+        self.assertEqual(self._sut.contains(tails, heads).tolist(),
+                         [True, True, False, True, False, False])
+
+    def test_duplicates_are_reported(self):
+        self.assertTrue(self._sut.has_duplicates)
+        self.assertEqual(self._sut.duplicates.tolist(), [3, 4])
+        self.assertEqual(self._sut.parallel.tolist(), [3])
+
+    def test_index_is_built_once(self):
+        self.assertIs(self._graph.edge_index(), self._sut)
+
+    def test_node_ids_must_fit_32_bits(self):
+        with self.assertRaises(ValueError):
+            EdgeIndex([[1, 2 ** 40, 1]], [False])
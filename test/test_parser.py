@@ -1,10 +1,17 @@
+import gzip
+import os
+import shutil
+import tempfile
 import unittest
 
 from mock import MagicMock
 
-from steinlib.exceptions import SteinlibParsingException
+from steinlib.exceptions import (ParsingCancelledException,
+                                 SteinlibParsingException)
+from steinlib.generator import generate_lines
 from steinlib.instance import SteinlibInstance
-from steinlib.parser import SteinlibParser, RootHeaderParser
+from steinlib.parser import (CancellationToken, SteinlibParser,
+                             RootHeaderParser, open_stp)
 from steinlib.state import ParsingState
 
 
@@ -176,3 +183,152 @@ class TestSteinerInstance(unittest.TestCase):
             st.context,
             'HSE',
             'Callbacks not called in the expected order HSE: %s' % st.context)
+
+
+class TestSteinlibParserDiagnostics(unittest.TestCase):
+    LINES = (
+        TestSteinlibParser.HEADER,
+        'SECTION Graph',
+        'Nodes 3',
+        'E 1 2 3',
+        'E 1 x 3',  # <-- bad record, line 5
+        'E 2 3 4',
+        'SECTION Terminals',  # <-- missing END, line 7
+        'T 1',
+        'END',
+        'SECTION Bogus',  # <-- unknown section, line 10
+        'FOO 1',
+        'END',
+        'SECTION Comment',
+        'Name "ok"',
+        'END',
+        TestSteinlibParser.EOF,
+        'E 1 2 3',  # <-- trailing data, line 17
+    )
+
+    def test_strict_error_knows_the_line(self):
+        sut = SteinlibParser(self.LINES, SteinlibInstance())
+        try:
+            sut.parse()
+            self.fail('A SteinlibParsingException was expected.')
+        except SteinlibParsingException as ex:
+            self.assertEqual(ex.line_number, 5)
+            self.assertIn('(line 5)', str(ex))
+
+    def test_offsets_count_characters(self):
+        lines = [line + '\n' for line in self.LINES]
+        sut = SteinlibParser(lines, SteinlibInstance(), tolerant=True)
+        sut.parse()
+        first = sut.diagnostics[0]
+        self.assertEqual(first.offset, sum(len(line) for line in lines[:4]))
+
+    def test_tolerant_mode_collects_every_problem(self):
+        steiner_instance = MagicMock()
+        sut = SteinlibParser(self.LINES, steiner_instance, tolerant=True)
+        result = sut.parse()
+        self.assertIs(result, steiner_instance)
+        self.assertEqual([d.line_number for d in sut.diagnostics],
+                         [5, 7, 10, 17])
+        self.assertIn('Missing END', sut.diagnostics[1].message)
+        self.assertEqual(sut.diagnostics[0].line, 'E 1 x 3')
+        self.assertEqual(steiner_instance.graph__e.call_count, 2)
+        steiner_instance.terminals__t.assert_called_with('T 1', [1])
+        steiner_instance.comment__name.assert_called_with('Name "ok"',
+                                                          ['ok'])
+        self.assertEqual(sut._state, ParsingState.end)
+
+    def test_tolerant_mode_reports_missing_eof(self):
+        lines = (TestSteinlibParser.HEADER, 'SECTION Comment')
+        sut = SteinlibParser(lines, SteinlibInstance(), tolerant=True)
+        sut.parse()
+        self.assertEqual(len(sut.diagnostics), 1)
+        self.assertEqual(sut.diagnostics[0].message, 'Illegal state.')
+
+    def test_tolerant_mode_missing_header(self):
+        lines = ('SECTION Comment', 'END', TestSteinlibParser.EOF)
+        sut = SteinlibParser(lines, SteinlibInstance(), tolerant=True)
+        sut.parse()
+        self.assertEqual(len(sut.diagnostics), 1)
+        self.assertIn('Missing header', sut.diagnostics[0].message)
+        self.assertEqual(sut._state, ParsingState.end)
+
+
+class TestSteinlibParserProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.lines = [line + '\n' for line in
+                      generate_lines(nodes=200, edges=3000, seed=1)]
+        self.size = sum(len(line) for line in self.lines)
+        self.reports = []
+
+    def test_reports_are_throttled_by_lines(self):
+        SteinlibParser(self.lines, SteinlibInstance(),
+                       progress=self.reports.append,
+                       progress_lines=1000).parse()
+        self.assertEqual([report.lines for report in self.reports[:-1]],
+                         [1000, 2000, 3000])
+        last = self.reports[-1]
+        self.assertTrue(last.done)
+        self.assertEqual((last.lines, last.position, last.total),
+                         (len(self.lines), self.size, self.size))
+        self.assertEqual((last.fraction, last.eta), (1.0, 0.0))
+        middle = self.reports[1]
+        self.assertEqual(middle.position,
+                         sum(len(line) for line in self.lines[:2000]))
+        self.assertGreater(middle.eta, 0)
+
+    def test_reports_are_throttled_by_bytes(self):
+        sut = SteinlibParser(iter(self.lines), SteinlibInstance(),
+                             progress=self.reports.append,
+                             progress_bytes=self.size // 3)
+        sut.check_lines = 100
+        sut.parse()
+        self.assertEqual(len(self.reports), 3)
+        self.assertIsNone(self.reports[0].total)
+        self.assertIsNone(self.reports[0].eta)
+
+    def test_file_sizes(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name, opener in (('plain.stp', open),
+                                 ('packed.stp.gz', gzip.open)):
+                path = os.path.join(directory, name)
+                with opener(path, 'wt') as stp_file:
+                    stp_file.writelines(self.lines)
+                reports = []
+                with open_stp(path) as stp_file:
+                    SteinlibParser(stp_file, SteinlibInstance(),
+                                   progress=reports.append,
+                                   progress_lines=1000).parse()
+                size = os.path.getsize(path)
+                self.assertEqual(reports[0].total, size)
+                self.assertLessEqual(reports[0].position, size)
+                self.assertEqual(reports[-1].position, size)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cancellation(self):
+        token = CancellationToken()
+
+        def cancel_midway(report):
+            if report.lines >= 1000:
+                token.cancel()
+
+        sut = SteinlibParser(self.lines, SteinlibInstance(),
+                             progress=cancel_midway, progress_lines=500,
+                             cancel=token)
+        with self.assertRaises(ParsingCancelledException) as context:
+            sut.parse()
+        self.assertEqual(context.exception.line_number, 1500)
+        self.assertEqual(context.exception.offset,
+                         sum(len(line) for line in self.lines[:1500]))
+
+    def test_cancelled_tolerant_parse_raises(self):
+        token = CancellationToken()
+        token.cancel()
+        self.assertTrue(token.cancelled)
+        sut = SteinlibParser(self.lines, SteinlibInstance(), tolerant=True,
+                             cancel=token)
+        with self.assertRaises(ParsingCancelledException) as context:
+            sut.parse()
+        self.assertEqual(context.exception.line_number, 0)
@@ -0,0 +1,85 @@
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import parse_arrays
+from steinlib.pruning import connected_components, prune, reachable_from
+
+
+def _instance(records, terminals, nodes=9, degrees=()):
+    lines = ['33D32945 STP File, STP Format Version 1.0', 'SECTION Graph',
+             'Nodes %d' % nodes]
+    lines.extend(records)
+    lines.extend(['END', 'SECTION Terminals'])
+    lines.extend(terminals)
+    lines.append('END')
+    if degrees:
+        lines.append('SECTION MaximumDegrees')
+        lines.extend('MD %d' % degree for degree in degrees)
+        lines.append('END')
+    lines.append('EOF')
+    return parse_arrays(lines)
+
+
+class TestConnectivity(unittest.TestCase):
+
+    def test_components(self):
+        instance = _instance(['E 5 4 1', 'E 4 3 1', 'A 9 8 1', 'E 3 2 1'],
+                             ['T 2'])
+        labels = connected_components(instance)
+        self.assertEqual(labels[1:].tolist(), [1, 2, 2, 2, 2, 6, 7, 8, 8])
+
+    def test_components_of_a_long_path_match_a_sequential_search(self):
+        rng = np.random.RandomState(3)
+        order = rng.permutation(np.arange(1, 201))
+        records = ['E %d %d 1' % pair for pair in zip(order[:-1], order[1:])
+                   if pair[0] % 50 and pair[1] % 50]
+        labels = connected_components(_instance(records, ['T 1'], 200))
+        for record in records:
+            _, tail, head, _ = record.split()
+            self.assertEqual(labels[int(tail)], labels[int(head)])
+        self.assertEqual(len(np.unique(labels[1:])),
+                         200 - len(records))
+
+    def test_reachability_follows_arcs_forward(self):
+        instance = _instance(['A 1 2 1', 'A 3 2 1', 'E 2 4 1'], ['RootP 1'])
+        reachable = reachable_from(instance, [1])
+        self.assertEqual(np.flatnonzero(reachable).tolist(), [1, 2, 4])
+
+
+class TestPrune(unittest.TestCase):
+
+    def test_terminal_free_components_are_dropped(self):
+        instance = _instance(['E 1 2 3', 'E 2 3 4', 'E 5 6 1', 'E 7 8 2'],
+                             ['T 1', 'T 8'], degrees=range(1, 10))
+        result = prune(instance)
+        pruned = result.instance
+        self.assertEqual(result.node_ids.tolist(), [1, 2, 3, 7, 8])
+        self.assertEqual(pruned.to_original_ids(pruned.edges[:, :2])
+                         .tolist(), [[1, 2], [2, 3], [7, 8]])
+        self.assertEqual(pruned.edges[:, 2].tolist(), [3, 4, 2])
+        self.assertEqual(result.edge_ids.tolist(), [0, 1, 3])
+        self.assertEqual(pruned.to_original_ids(pruned.terminals).tolist(),
+                         [1, 8])
+        self.assertEqual(pruned.maximum_degrees.tolist(), [1, 2, 3, 7, 8])
+        self.assertEqual(result.node_map[[1, 5, 8]].tolist(), [0, -1, 4])
+        self.assertEqual(result.metrics['nodes_before'], 9)
+        self.assertEqual(result.metrics['nodes_after'], 5)
+        self.assertEqual(result.metrics['components'], 5)
+        self.assertEqual(result.metrics['dropped_terminals'], 0)
+
+    def test_unreachable_nodes_are_dropped_from_rooted_instances(self):
+        instance = _instance(['A 1 2 1', 'A 3 2 1', 'A 2 4 1', 'A 4 5 1',
+                              'A 6 5 1'], ['RootP 1', 'T 5', 'T 6'],
+                             nodes=6)
+        result = prune(instance)
+        self.assertEqual(result.node_ids.tolist(), [1, 2, 4, 5])
+        self.assertEqual(result.metrics['unreachable_nodes'], 2)
+        self.assertEqual(result.metrics['dropped_terminals'], 1)
+        self.assertEqual(len(prune(instance, use_root=False).node_ids), 6)
+
+    def test_pruning_a_compacted_instance_keeps_file_ids(self):
+        instance = _instance(['E 10 20 1', 'E 30 40 1'], ['T 40'], 4)
+        result = prune(instance.compacted())
+        self.assertEqual(result.instance.original_ids.tolist(), [30, 40])
+        self.assertAlmostEqual(result.metrics['link_reduction'], 0.5)
@@ -181,6 +181,10 @@ class TestCoordinatesSectionParser(unittest.TestCase):
         self._mock_graph.coordinates__dd.assert_called_with(
             dd, [777, 888, 999, 222])
 
+    def test_dd_callback_without_params(self):
+        self._sut.parse_token('DD', self._mock_graph)
+        self._mock_graph.coordinates__dd.assert_called_with('DD', [])
+
     def test_dd_callback_reject_unexpected_parameters(self):
         dd = 'DD 777 abc 999 222'
         with self.assertRaises(SteinlibParsingException):
@@ -0,0 +1,203 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import parse_arrays
+from steinlib.exceptions import SteinlibParsingException
+from steinlib.generator import generate_lines
+from steinlib.server import InstanceClient, InstanceLRU, InstanceServer
+
+
+class _Files(object):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.paths = []
+        for seed in range(3):
+            path = os.path.join(self.directory, 'i%d.stp' % seed)
+            self._write(path, seed)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _write(self, path, seed, nodes=10):
+        with open(path, 'w') as stp_file:
+            stp_file.writelines(generate_lines(nodes=nodes, edges=20,
+                                               terminals=3, seed=seed))
+
+    def _touch(self, path, seed):
+        stat = os.stat(path)
+        self._write(path, seed, nodes=12)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+class TestInstanceLRU(_Files, unittest.TestCase):
+
+    def test_hits_misses_and_invalidation(self):
+        cache = InstanceLRU(capacity=2)
+        try:
+            block, hit = cache.get(self.paths[0])
+            self.assertFalse(hit)
+            self.assertEqual(cache.get(self.paths[0]), (block, True))
+            self._touch(self.paths[0], 7)
+            fresh, hit = cache.get(self.paths[0])
+            self.assertFalse(hit)
+            self.assertTrue(block.closed)
+            self.assertEqual(fresh.handle.metadata['num_nodes'], 12)
+            metrics = cache.metrics()
+            self.assertEqual((metrics['hits'], metrics['misses'],
+                              metrics['invalidations'], metrics['parses']),
+                             (1, 2, 1, 2))
+            self.assertGreater(metrics['parse_seconds_max'], 0)
+        finally:
+            cache.close()
+
+    def test_capacity_and_bytes(self):
+        cache = InstanceLRU(capacity=2)
+        try:
+            first, _ = cache.get(self.paths[0])
+            cache.get(self.paths[1])
+            cache.get(self.paths[0])
+            second, _ = cache.get(self.paths[2])
+            self.assertEqual(len(cache), 2)
+            self.assertFalse(first.closed)
+            self.assertEqual(cache.evictions, 1)
+            self.assertFalse(cache.get(self.paths[1])[1])
+
+            cache.max_bytes = 1
+            cache.get(self.paths[2])
+            self.assertEqual(len(cache), 1)
+        finally:
+            cache.close()
+
+    def test_stale_files(self):
+        cache = InstanceLRU()
+        try:
+            for path in self.paths:
+                cache.get(path)
+            os.remove(self.paths[1])
+            self._touch(self.paths[2], 3)
+            self.assertEqual(cache.invalidate_stale(), 2)
+            self.assertEqual(len(cache), 1)
+        finally:
+            cache.close()
+
+    def test_one_parse_for_concurrent_requests(self):
+        calls = []
+
+        def slow_parse(path):
+            calls.append(path)
+            time.sleep(0.05)
+            with open(path) as stp_file:
+                return parse_arrays(stp_file)
+
+        cache = InstanceLRU(parse=slow_parse)
+        try:
+            blocks = []
+            threads = [threading.Thread(target=lambda: blocks.append(
+                cache.get(self.paths[0])[0])) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(len(set(map(id, blocks))), 1)
+        finally:
+            cache.close()
+
+
+class TestInstanceServer(_Files, unittest.TestCase):
+
+    def setUp(self):
+        super(TestInstanceServer, self).setUp()
+        self.server = InstanceServer(os.path.join(self.directory, 'socket'),
+                                     capacity=2, watch_interval=0.05)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.assertFalse(os.path.exists(self.server.address))
+        super(TestInstanceServer, self).tearDown()
+
+    def test_get(self):
+        with open(self.paths[1]) as stp_file:
+            expected = parse_arrays(stp_file)
+        with InstanceClient(self.server.address) as client:
+            for _ in range(2):
+                with client.get(self.paths[1]) as attached:
+                    for name, values in expected.arrays():
+                        shared = dict(attached.instance.arrays())[name]
+                        np.testing.assert_array_equal(shared, values)
+                    del shared
+            metrics = client.metrics()
+        self.assertEqual((metrics['hits'], metrics['misses']), (1, 1))
+
+    def test_changed_files_are_dropped_in_background(self):
+        with InstanceClient(self.server.address) as client:
+            client.get(self.paths[0]).close()
+            self._touch(self.paths[0], 5)
+            for _ in range(100):
+                if not client.metrics()['entries']:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(client.metrics()['invalidations'], 1)
+            with client.get(self.paths[0]) as attached:
+                self.assertEqual(attached.instance.num_nodes, 12)
+
+    def test_invalidate(self):
+        with InstanceClient(self.server.address) as client:
+            client.get(self.paths[0]).close()
+            client.get(self.paths[1]).close()
+            client.invalidate(self.paths[0])
+            self.assertEqual(client.metrics()['entries'], 1)
+            client.invalidate()
+            self.assertEqual(client.metrics()['entries'], 0)
+
+    def test_errors(self):
+        broken = os.path.join(self.directory, 'broken.stp')
+        with open(broken, 'w') as stp_file:
+            stp_file.write('not an instance\n')
+        with InstanceClient(self.server.address) as client:
+            with self.assertRaises(SteinlibParsingException):
+                client.get(broken)
+            with self.assertRaises(FileNotFoundError):
+                client.get(os.path.join(self.directory, 'missing.stp'))
+            with client.get(self.paths[2]) as attached:
+                self.assertEqual(attached.instance.num_nodes, 10)
+
+    def test_existing_files_at_the_address(self):
+        taken = os.path.join(self.directory, 'taken')
+        with open(taken, 'w') as other:
+            other.write('not a socket')
+        self.assertRaises(FileExistsError, InstanceServer, taken)
+        self.assertTrue(os.path.exists(taken))
+        self.assertRaises(FileExistsError, InstanceServer,
+                          self.server.address)
+
+        stale = os.path.join(self.directory, 'stale')
+        left = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        left.bind(stale)
+        left.close()
+        server = InstanceServer(stale, watch_interval=0).start()
+        try:
+            with InstanceClient(stale) as client:
+                self.assertEqual(client.metrics()['entries'], 0)
+        finally:
+            server.shutdown()
+
+    def test_tcp(self):
+        with InstanceServer(('127.0.0.1', 0), watch_interval=0) as server:
+            with InstanceClient(server.address) as client:
+                with client.get(self.paths[0]) as attached:
+                    self.assertEqual(attached.instance.num_edges, 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import multiprocessing
+import os
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import parse_arrays
+from steinlib.shared import SharedInstanceHandle, export_shared
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+def _total_weight(handle):
+    with handle.attach() as attached:
+        total = int(attached.instance.weights.sum())
+    return total
+
+
+class TestSharedInstance(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            self._instance = parse_arrays(stp_file)
+        self._block = self._instance.to_shared_memory()
+
+    def tearDown(self):
+        self._block.close()
+
+    def test_attached_arrays_are_equal_and_read_only(self):
+        attached = self._block.handle.attach()
+        for name, values in self._instance.arrays():
+            shared = dict(attached.instance.arrays())[name]
+            np.testing.assert_array_equal(shared, values)
+        self.assertFalse(attached.instance.edges.flags.writeable)
+        self.assertEqual(attached.instance.comment, self._instance.comment)
+        self.assertEqual(attached.instance.num_nodes, 7)
+        attached.close()
+        self.assertIsNone(attached.instance)
+
+    def test_workers_attach_through_the_handle(self):
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(2)
+        try:
+            totals = pool.map(_total_weight, [self._block.handle] * 4)
+        finally:
+            pool.close()
+            pool.join()
+        self.assertEqual(totals, [9] * 4)
+        # the workers are gone, the block is not
+        self.assertEqual(_total_weight(self._block.handle), 9)
+
+    def test_close_releases_the_block(self):
+        self.assertFalse(self._block.closed)
+        self._block.close()
+        self.assertTrue(self._block.closed)
+        with self.assertRaises(FileNotFoundError):
+            self._block.handle.attach()
+
+    def test_empty_instance(self):
+        instance = parse_arrays(('33D32945 STP File', 'EOF'))
+        with export_shared(instance) as block:
+            self.assertIsInstance(block.handle, SharedInstanceHandle)
+            attached = block.handle.attach()
+            self.assertEqual(attached.instance.edges.shape, (0, 3))
+            attached.close()
@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays
+from steinlib.spatial import PointGridIndex, RectangleIndex, distances, \
+                             obstacle_boxes
+
+
+class TestDistances(unittest.TestCase):
+
+    def test_metrics(self):
+        differences = np.array([[3, -4]])
+        self.assertEqual(distances(differences, 'l1').tolist(), [7])
+        self.assertEqual(distances(differences, 'l2').tolist(), [5])
+        self.assertEqual(distances(differences, 'linf').tolist(), [4])
+
+    def test_unknown_metric(self):
+        with self.assertRaises(ValueError):
+            distances(np.zeros((1, 2)), 'l3')
+
+
+class TestPointGridIndex(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(42)
+        self._points = random.randint(0, 1000, size=(500, 2))
+        self._ids = np.arange(1, 501)
+        self._sut = PointGridIndex(self._ids, self._points)
+
+    def test_within_matches_brute_force(self):
+        low, high = np.array([100, 200]), np.array([400, 450])
+        expected = self._ids[((self._points >= low) &
+                              (self._points <= high)).all(axis=1)]
+        self.assertEqual(sorted(self._sut.within(low, high).tolist()),
+                         expected.tolist())
+
+    def test_batched_query(self):
+        indptr, ids = self._sut.query([[0, 0], [2000, 2000]],
+                                      [[1000, 1000], [3000, 3000]])
+        self.assertEqual(indptr.tolist(), [0, 500, 500])
+        self.assertEqual(sorted(ids.tolist()), self._ids.tolist())
+
+    def test_nearest_matches_brute_force(self):
+        queries = np.array([[0, 0], [500, 500], [-300, 1200], [999, 1]])
+        for metric in ('l1', 'l2', 'linf'):
+            ids, dists = self._sut.nearest(queries, k=3, metric=metric)
+            for query, found in zip(queries, dists):
+                expected = np.sort(distances(self._points - query, metric))
+                np.testing.assert_allclose(found, expected[:3])
+
+    def test_nearest_with_too_few_points(self):
+        sut = PointGridIndex([7], [[1, 1]])
+        ids, dists = sut.nearest([[0, 0]], k=2)
+        self.assertEqual(ids.tolist(), [[7, -1]])
+        self.assertEqual(dists[0, 1], np.inf)
+
+
+class TestRectangleIndex(unittest.TestCase):
+
+    def setUp(self):
+        random = np.random.RandomState(7)
+        corners = random.randint(0, 1000, size=(300, 2))
+        sizes = random.randint(1, 50, size=(300, 2))
+        self._boxes = np.hstack((corners, corners + sizes))
+        self._sut = RectangleIndex(self._boxes, leaf_size=8)
+
+    def test_intersecting_matches_brute_force(self):
+        box = np.array([200, 300, 500, 420])
+        expected = np.flatnonzero(
+            (self._boxes[:, 0] <= box[2]) & (self._boxes[:, 2] >= box[0]) &
+            (self._boxes[:, 1] <= box[3]) & (self._boxes[:, 3] >= box[1]))
+        self.assertEqual(self._sut.intersecting(box).tolist(),
+                         expected.tolist())
+
+    def test_containing(self):
+        indptr, rows = self._sut.containing(self._boxes[:5, :2])
+        for position in range(5):
+            self.assertIn(position, rows[indptr[position]:
+                                         indptr[position + 1]].tolist())
+
+    def test_nearest(self):
+        rows, dists = self._sut.nearest([[-100, -100], [500, 500]], 'linf')
+        below = np.maximum(self._boxes[:, :2] - [-100, -100], 0)
+        self.assertEqual(dists[0], below.max(axis=1).min())
+        self.assertEqual(len(self._sut), 300)
+
+    def test_empty_index(self):
+        sut = RectangleIndex(np.empty((0, 4)))
+        self.assertEqual(sut.intersecting([0, 0, 1, 1]).tolist(), [])
+        self.assertEqual(sut.nearest([[0, 0]])[0].tolist(), [-1])
+
+
+class TestLazyIndexes(unittest.TestCase):
+
+    def test_indexes_are_built_on_first_use(self):
+        sut = SteinlibArrays(coordinate_ids=[1, 2], coordinates=[[0, 0],
+                                                                 [5, 5]],
+                             obstacles=[[4, 4, 1, 1]])
+        self.assertIsNone(sut.cached_index('point_index'))
+        self.assertEqual(sut.point_index().within([0, 0], [1, 1]).tolist(),
+                         [1])
+        self.assertIs(sut.point_index(), sut.point_index())
+        self.assertEqual(obstacle_boxes(sut.obstacles).tolist(),
+                         [[1, 1, 4, 4]])
+        self.assertEqual(sut.obstacle_index().intersecting(
+            [2, 2, 3, 3]).tolist(), [0])
@@ -0,0 +1,33 @@
+import os
+import unittest
+
+from steinlib.stats import read_stats
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestReadStats(unittest.TestCase):
+
+    def test_example(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            stats = read_stats(stp_file)
+        self.assertEqual((stats['name'], stats['nodes'], stats['edges'],
+                          stats['arcs'], stats['terminals']),
+                         ('Odd Wheel', 7, 9, 0, 4))
+        self.assertEqual(stats['degree']['distribution'], [[2, 3], [3, 4]])
+        self.assertEqual(stats['weight']['histogram'], [[1, 1, 9]])
+
+    def test_isolated_nodes_and_weight_buckets(self):
+        stats = read_stats([
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph', 'Nodes 5',
+            'E 1 2 0', 'A 2 3 3', 'E 3 1 12', 'END',
+            'SECTION Terminals', 'T 1', 'RootP 2', 'END', 'EOF'])
+        self.assertEqual(stats['degree']['distribution'], [[0, 2], [2, 3]])
+        self.assertEqual(stats['degree']['mean'], 1.2)
+        self.assertEqual(stats['weight']['histogram'],
+                         [[0, 0, 1], [2, 3, 1], [8, 15, 1]])
+        self.assertEqual((stats['weight']['min'], stats['weight']['max'],
+                          stats['weight']['total']), (0, 12, 15))
+        self.assertEqual(stats['terminals'], 2)
@@ -0,0 +1,52 @@
+import os
+import unittest
+
+from steinlib.validation import validate
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+
+class TestValidate(unittest.TestCase):
+
+    def test_valid_example(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            result = validate(stp_file)
+        self.assertEqual(result, {'valid': True, 'diagnostics': [],
+                                  'problems': []})
+
+    def test_problems(self):
+        result = validate([
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph', 'Nodes 3', 'Edges 3',
+            'E 1 2 1', 'E 2 4 1', 'END',
+            'SECTION Terminals', 'Terminals 2',
+            'T 1', 'T 1', 'RootP 2', 'RootP 3', 'END',
+            'SECTION MaximumDegrees', 'MD 2', 'END', 'EOF'])
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['diagnostics'], [])
+        self.assertEqual(result['problems'], [
+            'Edges declares 3 but 2 found',
+            'Terminals declares 2 but 4 found',
+            '1 edge endpoints outside 1..3',
+            '1 terminals are repeated',
+            '2 RootP terminals, at most one expected',
+            '1 MD records for 3 nodes',
+        ])
+
+    def test_missing_nodes(self):
+        result = validate([
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph', 'Edges 2', 'E 1 2 1', 'E 2 3 1', 'END',
+            'EOF'])
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['problems'], ['Nodes is not declared'])
+
+    def test_diagnostics(self):
+        result = validate([
+            '33D32945 STP File, STP Format Version 1.0',
+            'SECTION Graph', 'Nodes 2', 'E 1 x 1', 'E 1 2 1', 'END', 'EOF'])
+        self.assertFalse(result['valid'])
+        self.assertEqual(result['problems'], [])
+        self.assertEqual([item['line'] for item in result['diagnostics']],
+                         [4])
@@ -0,0 +1,123 @@
+import io
+import os
+import unittest
+
+import numpy as np
+
+from steinlib.arrays import SteinlibArrays, parse_arrays
+from steinlib.writer import write_solution, write_stp
+
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), '..', 'examples')
+
+SPARSE = (
+    '33D32945 STP File, STP Format Version 1.0',
+    'SECTION Graph',
+    'Nodes 3',
+    'Edges 2',
+    'A 1000 10 4',
+    'E 10 70000 5',
+    'END',
+    'SECTION Terminals',
+    'Terminals 2',
+    'RootP 1000',
+    'T 70000',
+    'END',
+    'SECTION Presolve',
+    'LOWER 9',
+    'EC 1 2 3',
+    'END',
+    'EOF',
+)
+
+
+def _round_trip(instance, **kwargs):
+    stream = io.StringIO()
+    write_stp(instance, stream, **kwargs)
+    stream.seek(0)
+    return parse_arrays(stream)
+
+
+class TestWriteStp(unittest.TestCase):
+
+    def _assert_same(self, first, second):
+        for (name, values), (_, other) in zip(first.arrays(),
+                                              second.arrays()):
+            np.testing.assert_array_equal(values, other, name)
+        self.assertEqual(first.metadata(), second.metadata())
+
+    def test_round_trip(self):
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            instance = parse_arrays(stp_file)
+        self._assert_same(_round_trip(instance, chunk_rows=4), instance)
+
+    def test_arcs_and_presolve(self):
+        instance = parse_arrays(SPARSE)
+        result = _round_trip(instance)
+        self._assert_same(result, instance)
+
+    def test_solution(self):
+        stream = io.StringIO()
+        write_solution(parse_arrays(SPARSE).compacted(), stream)
+        self.assertEqual(stream.getvalue().splitlines(), [
+            'SECTION Finalsolution', 'Vertices 3', 'V 10', 'V 1000',
+            'V 70000', 'Edges 2', 'E 1000 10', 'E 10 70000', 'END'])
+        with open(os.path.join(EXAMPLES_DIR, 'hello.stp')) as stp_file:
+            instance = parse_arrays(stp_file)
+        self.assertRaises(ValueError, write_solution, instance,
+                          io.StringIO())
+
+
+class TestCompaction(unittest.TestCase):
+
+    def setUp(self):
+        self._sut = parse_arrays(SPARSE, compact=True)
+
+    def test_ids_are_dense(self):
+        self.assertEqual(self._sut.num_nodes, 3)
+        self.assertEqual(self._sut.id_bound, 3)
+        self.assertEqual(self._sut.original_ids.tolist(), [10, 1000, 70000])
+        self.assertEqual(self._sut.edges.tolist(), [[1, 0, 4], [0, 2, 5]])
+        self.assertEqual(self._sut.terminals.tolist(), [1, 2])
+        self.assertEqual(self._sut.root, 1)
+        self.assertEqual(len(self._sut.csr()[0]), 4)
+
+    def test_maps(self):
+        self.assertEqual(self._sut.to_original_ids([2, 0]).tolist(),
+                         [70000, 10])
+        self.assertEqual(
+            self._sut.from_original_ids([1000, 11, 70000]).tolist(),
+            [1, -1, 2])
+        twice = self._sut.compacted()
+        self.assertEqual(twice.original_ids.tolist(), [10, 1000, 70000])
+
+    def test_writer_applies_the_inverse_map(self):
+        self.assertEqual(_round_trip(self._sut).edges.tolist(),
+                         parse_arrays(SPARSE).edges.tolist())
+        self.assertEqual(_round_trip(self._sut, relabel=False).edges.tolist(),
+                         self._sut.edges.tolist())
+
+    def test_relabelled_node_count_covers_the_original_ids(self):
+        sut = SteinlibArrays(num_nodes=3, edges=[[1, 2, 4]],
+                             terminals=[0], original_ids=[10, 100, 200])
+        stream = io.StringIO()
+        write_stp(sut, stream)
+        self.assertIn('Nodes 200\n', stream.getvalue())
+        stream.seek(0)
+        loaded = parse_arrays(stream)
+        self.assertEqual(loaded.num_nodes, 200)
+        self.assertEqual(loaded.id_bound, 201)
+        self.assertEqual(loaded.edges.tolist(), [[100, 200, 4]])
+        self.assertEqual(loaded.compacted().original_ids.tolist(),
+                         [10, 100, 200])
+        self.assertEqual(_round_trip(sut, relabel=False).num_nodes, 3)
+
+    def test_maximum_degrees_follow_their_nodes(self):
+        lines = ('33D32945 STP File, STP Format Version 1.0',
+                 'SECTION Graph', 'E 1 3 1', 'END',
+                 'SECTION MaximumDegrees', 'MD 5', 'MD 6', 'MD 7', 'END',
+                 'EOF')
+        sut = parse_arrays(lines, compact=True)
+        self.assertEqual(sut.maximum_degrees.tolist(), [5, 7])
+        self.assertEqual(_round_trip(sut).maximum_degrees.tolist(),
+                         [5, 0, 7])